@@ -193,64 +193,74 @@ async function loadAllUsers() {
   } catch (error) {}
 }
 
-async function loadAllListings() {
+const LISTINGS_PER_PAGE = 20;
+let listingsPage = 1;
+
+async function loadAllListings(page = 1) {
     const pendingContainer = document.getElementById("pending-listings-container");
     const allContainer = document.getElementById("all-listings-container");
-    
-    // Đặt trạng thái loading (chỉ cho container "Tất cả")
+    const pagination = document.getElementById("all-listings-pagination");
+    listingsPage = page;
+
+    // Đặt trạng thái loading
     allContainer.innerHTML = '<p class="text-gray-500">Đang tải tin đăng...</p>';
-    // Container "Chờ duyệt" sẽ được xử lý riêng
     pendingContainer.innerHTML = '<p class="text-gray-500">Đang tải...</p>';
 
     // 1. Lấy giá trị bộ lọc
     const typeFilter = document.getElementById("listing-type-filter")?.value;
     const statusFilter = document.getElementById("listing-status-filter")?.value;
 
-    // 2. Xây dựng query params
-    const params = new URLSearchParams();
+    // 2. Xây dựng query params (lọc + phân trang phía server; "Tất cả" = mọi trạng thái trừ chờ duyệt)
+    const params = new URLSearchParams({ page, per_page: LISTINGS_PER_PAGE });
     if (typeFilter) params.append("listing_type", typeFilter);
-    if (statusFilter) params.append("status", statusFilter);
-    const queryString = params.toString();
-
-    // 3. Tạo endpoint (ĐÃ SỬA URL, bỏ /admin thừa)
-    const endpoint = `/admin/admin/listings${queryString ? `?${queryString}` : ""}`;
+    params.append("status", statusFilter || "available,sold,rejected");
 
     try {
-        const allListings = await apiRequest(endpoint); // Gọi API 1 lần
+        // Tin chờ duyệt lấy riêng, không phụ thuộc trang đang xem
+        const [pendingListings, result] = await Promise.all([
+            statusFilter ? Promise.resolve([]) : apiRequest("/admin/admin/listings/pending"),
+            apiRequest(`/admin/admin/listings?${params.toString()}`),
+        ]);
 
-        if (!allListings || !Array.isArray(allListings)) {
+        if (!result || !Array.isArray(result.items)) {
              throw new Error("Không nhận được dữ liệu tin đăng.");
         }
- 
-        const pendingListings = statusFilter ? [] : allListings.filter(l => l.status === "pending");
-        if (pendingListings.length > 0) {
-             pendingContainer.innerHTML = pendingListings.map(listing => 
-                renderListingCard(listing) // Gọi hàm render card
-             ).join("");
+
+        const pendingFiltered = (pendingListings || []).filter(l => !typeFilter || l.listing_type === typeFilter);
+        if (pendingFiltered.length > 0) {
+             pendingContainer.innerHTML = pendingFiltered.map(renderListingCard).join("");
         } else {
              pendingContainer.innerHTML = '<p class="text-gray-500">Không có tin đăng nào chờ duyệt.</p>';
         }
- 
-        const allListingsFiltered = allListings.filter(l => {
-            const statusOk = statusFilter ? l.status === statusFilter : l.status !== "pending";
-            const typeOk = typeFilter ? l.listing_type === typeFilter : true;
-            return statusOk && typeOk;
-        });
 
-        if (allListingsFiltered.length > 0) {
-            allContainer.innerHTML = allListingsFiltered.map(listing => 
-                renderListingCard(listing) // Gọi hàm render card
-            ).join("");
+        if (result.items.length > 0) {
+            allContainer.innerHTML = result.items.map(renderListingCard).join("");
         } else {
             allContainer.innerHTML = '<p class="text-gray-500">Không có tin đăng nào khớp bộ lọc.</p>';
         }
+        renderListingsPagination(pagination, result);
 
     } catch (error) {
         console.error("Lỗi khi tải listings:", error);
         pendingContainer.innerHTML = '<p class="text-red-500">Lỗi tải dữ liệu.</p>';
         allContainer.innerHTML = '<p class="text-red-500">Lỗi tải dữ liệu.</p>';
-    } finally {
+        if (pagination) pagination.innerHTML = "";
+    }
+}
+
+function renderListingsPagination(container, result) {
+    if (!container) return;
+    if (result.pages <= 1) {
+        container.innerHTML = result.total ? `<span class="text-sm text-gray-500">${result.total} tin đăng</span>` : "";
+        return;
     }
+    const button = (label, page, disabled) => `
+        <button onclick="loadAllListings(${page})" ${disabled ? "disabled" : ""}
+            class="px-3 py-1 rounded border text-sm ${disabled ? "text-gray-400 cursor-not-allowed" : "hover:bg-gray-100"}">${label}</button>`;
+    container.innerHTML = `
+        ${button("&laquo; Trước", result.page - 1, result.page <= 1)}
+        <span class="text-sm text-gray-600">Trang ${result.page}/${result.pages} (${result.total} tin đăng)</span>
+        ${button("Sau &raquo;", result.page + 1, result.page >= result.pages)}`;
 }
 
 // --- THÊM HÀM HELPER NÀY (Để render card Listing) ---
@@ -446,7 +456,7 @@ async function updateListingStatus(listingId, newStatus) {
         { status: newStatus }
       );
       showToast("Cập nhật trạng thái tin đăng thành công.");
-      loadAllListings(); // Refresh both lists
+      loadAllListings(listingsPage); // Refresh both lists
     } catch (error) {}
   }
 }
@@ -457,7 +467,7 @@ async function deleteListing(listingId) {
       // Endpoint này thuộc listing_controller
       await apiRequest(`/admin/admin/listings/${listingId}`, "DELETE");
       showToast("Xóa tin đăng thành công.");
-      loadAllListings();
+      loadAllListings(listingsPage);
     } catch (error) {}
   }
 }
@@ -2509,8 +2509,9 @@ function pollPaymentStatus(
 ) {
   return new Promise(async (resolve, reject) => {
     try {
+      // Long-poll: server giữ request tới khi trạng thái rời 'initiated' (hoặc hết 10s)
       const response = await apiRequest(
-        `/transaction/api/transactions/${transactionId}/payment-status`,
+        `/transaction/api/transactions/${transactionId}/payment-status?wait=10&since=initiated`,
         "GET"
       );
 
@@ -2523,11 +2524,12 @@ function pollPaymentStatus(
               new Error("Kiểm tra trạng thái quá lâu. Vui lòng tải lại trang.")
             );
           } else {
+            // 'initiated': server đã chờ sẵn nên hỏi lại ngay; trạng thái khác thì giữ nhịp 2s như cũ
             setTimeout(() => {
               pollPaymentStatus(transactionId, startTime, maxWaitTime)
                 .then(resolve)
                 .catch(reject);
-            }, 2000);
+            }, response.status === "initiated" ? 0 : 2000);
           }
         }
       } else {
@@ -7,6 +7,7 @@ docker-compose exec user-service flask db upgrade
 
 echo "=== 2. KHOI TAO LISTING SERVICE ==="
 docker-compose exec listing-service flask db init
+docker-compose exec listing-service flask search-reindex
 docker-compose exec listing-service flask db migrate -m "Initial listing service tables"
 docker-compose exec listing-service flask db upgrade
 
@@ -3,6 +3,7 @@ from functools import wraps
 from flask import Blueprint, jsonify, request, current_app
 from flask_jwt_extended import jwt_required, get_jwt, get_jwt_identity, verify_jwt_in_request
 import requests
+from urllib.parse import urlencode
 import os
 import logging
 
@@ -328,18 +329,19 @@ def get_user_bank_info(user_id):
 @admin_bp.route("/listings", methods=["GET"])
 @admin_required()
 def get_all_listings():
-    """Lấy tất cả listing từ Listing Service (có lọc)."""
-    status = request.args.get('status')
-    listing_type = request.args.get('type')
-    
-    params = {}
-    if status:
-        params['status'] = status
+    """
+    Lấy listing theo trang từ Listing Service (lọc, sắp xếp, phân trang phía Listing Service).
+    Trả về {"items", "total", "page", "per_page", "pages"}; mặc định trang 1.
+    """
+    params = {'page': request.args.get('page') or 1}
+    for key in ('status', 'seller_id', 'q', 'sort', 'per_page'):
+        if request.args.get(key):
+            params[key] = request.args.get(key)
+    listing_type = request.args.get('type') or request.args.get('listing_type')
     if listing_type:
         params['type'] = listing_type
 
-    # Cần 1 hàm helper mới để build query string
-    query_string = "&".join(f"{key}={value}" for key, value in params.items())
+    query_string = urlencode(params)
     endpoint = f"/listings"
     if query_string:
         endpoint += f"?{query_string}"
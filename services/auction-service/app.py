@@ -6,14 +6,18 @@ from flask_migrate import Migrate
 from flask_cors import CORS
 from dotenv import load_dotenv
 from flask_jwt_extended import JWTManager
+import redis
 
 load_dotenv()
 
 db = SQLAlchemy()
 jwt = JWTManager()
 migrate = Migrate(version_table='alembic_version_auctions')
+redis_client = None
 
 from models.auction import Auction
+from models.bid import Bid
+from models.auction_outbox import AuctionOutbox
 
 def create_app(): 
     app = Flask(__name__)
@@ -26,6 +30,17 @@ def create_app():
     db.init_app(app)
     migrate.init_app(app, db)
     jwt.init_app(app)
+
+    global redis_client
+    redis_url = os.getenv("REDIS_URL", "redis://redis:6379")
+    try:
+        client = redis.from_url(redis_url, decode_responses=True, socket_timeout=0.5, socket_connect_timeout=0.5)
+        client.ping()
+        redis_client = client
+        print(">>> Auction Service: Successfully connected to Redis.")
+    except redis.exceptions.RedisError as e:
+        redis_client = None
+        print(f">>> Auction Service: Could not connect to Redis, live bid events stay in-process: {e}")
  
     from controllers.auction_controller import auction_bp
     from controllers.internal_controller import internal_bp
@@ -25,6 +25,17 @@ celery_app.conf.beat_schedule = {
         'task': 'tasks.run_auction_tasks',  
         'schedule': crontab(minute='*'), # (SỬA) Dùng crontab(minute='*') cho chuẩn
     },
+    # Gửi các kết quả đấu giá còn tồn trong auction_outbox (bản ghi lỗi đang chờ backoff)
+    'relay-auction-outbox': {
+        'task': 'tasks.relay_auction_outbox',
+        'schedule': float(os.environ.get('AUCTION_OUTBOX_RELAY_INTERVAL', 10)),
+    },
+    # Ghi lượt đặt giá của các phiên hot (Redis) xuống Postgres
+    'flush-hot-auctions': {
+        'task': 'tasks.flush_hot_auctions',
+        'schedule': float(os.environ.get('AUCTION_HOT_FLUSH_INTERVAL', 1)),
+        'options': {'expires': 5},
+    },
 }
 celery_app.conf.timezone = 'UTC'
  
@@ -1,9 +1,14 @@
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, jsonify, request, Response
 from flask_jwt_extended import jwt_required, get_jwt_identity, get_jwt
-from services.auction_service import AuctionService  
+from services.auction_service import (
+    AuctionService, BID_ACCEPTED, BID_TOO_LOW, BID_ALREADY_LEADING, BID_NOT_FOUND, BID_ENDED, BID_ERROR,
+    DEFAULT_BID_PAGE_SIZE, MAX_BID_PAGE_SIZE
+)
+from services.event_service import AuctionEventService
+from services.enrichment_service import EnrichmentService
+from services.hot_auction_service import HotAuctionService
 from functools import wraps
 from dateutil import parser
-import requests  
 import logging   
 import os
 import sys
@@ -16,33 +21,23 @@ VIETNAM_TZ = pytz.timezone("Asia/Ho_Chi_Minh")
 auction_bp = Blueprint('auction_api', __name__, url_prefix='/api')
 logger = logging.getLogger(__name__)
 
-LISTING_SERVICE_URL = os.environ.get('LISTING_SERVICE_URL', 'http://listing-service:5001')
-USER_SERVICE_URL = os.environ.get('USER_SERVICE_URL', 'http://user-service:5000')
-REQUEST_TIMEOUT = 1
+# Số vehicle/battery ID tối đa trong một request /check-status/bulk
+MAX_BULK_RESOURCES = 5000
+
+# HTTP status cho các lượt đặt giá bị từ chối (mặc định 400)
+BID_ERROR_STATUS = {
+    BID_NOT_FOUND: 404,
+    BID_TOO_LOW: 409,
+    BID_ALREADY_LEADING: 409,
+    BID_ENDED: 409,
+    BID_ERROR: 500,
+}
 
 
 def get_user_info_by_id(user_id: int): 
     if not user_id:
         return None 
-    url = f"{USER_SERVICE_URL}/api/info/{user_id}"  
-    try:
-        response = requests.get(url, timeout=REQUEST_TIMEOUT)
-        if response.status_code == 200: 
-            user_data_list = response.json()
-            if user_data_list and isinstance(user_data_list, list) and len(user_data_list) > 0:
-                 return user_data_list[0] 
-            else:
-                 logger.warning(f"User Service returned empty or invalid data for user ID {user_id} at {url}")
-                 return None
-        elif response.status_code == 404:
-             logger.warning(f"User not found in User Service for ID {user_id} at {url}")
-             return None  
-        else: 
-            logger.warning(f"User Service returned status {response.status_code} for user ID {user_id} at {url}")
-            return None
-    except requests.exceptions.RequestException as e: 
-        logger.error(f"Failed to connect to User Service at {url} for user info: {e}")
-        return None
+    return EnrichmentService.get('user', user_id)
 
 @auction_bp.route('/filter', methods=['GET'])
 def filter_auctions_by_type(): 
@@ -54,6 +49,8 @@ def filter_auctions_by_type():
         if auction_type and auction_type not in ['vehicle', 'battery']:
              return jsonify({"error": "Invalid auction_type. Must be 'vehicle' or 'battery'."}), 400 
         auctions = AuctionService.filter_auctions(filters) 
+        # Gọi song song một lần cho mọi xe/pin chưa có trong cache; vòng lặp bên dưới chỉ đọc cache
+        EnrichmentService.prefetch_auctions(auctions, users=False)
         enriched_auctions = []
         for auction in auctions:
             auction_data = serialize_auction(auction)
@@ -99,31 +96,11 @@ def admin_required():
 
 def get_and_serialize_vehicle_by_id(vehicle_id: int): 
     if not vehicle_id: return None 
-    url = f"{LISTING_SERVICE_URL}/api/vehicles/{vehicle_id}" 
-    try:
-        response = requests.get(url, timeout=REQUEST_TIMEOUT)
-        if response.status_code == 200: 
-            return response.json() 
-        else: 
-            logger.warning(f"Listing Service returned status {response.status_code} for vehicle ID {vehicle_id} at {url}")
-            return None
-    except requests.exceptions.RequestException as e: 
-         logger.error(f"Failed to connect to Listing Service at {url} for vehicle details: {e}")
-         return None
+    return EnrichmentService.get('vehicle', vehicle_id)
 
 def get_and_serialize_battery_by_id(battery_id: int): 
-     if not battery_id: return None
-     url = f"{LISTING_SERVICE_URL}/api/batteries/{battery_id}"
-     try:
-        response = requests.get(url, timeout=REQUEST_TIMEOUT)
-        if response.status_code == 200: 
-             return response.json()
-        else: 
-             logger.warning(f"Listing Service returned status {response.status_code} for battery ID {battery_id} at {url}")
-             return None
-     except requests.exceptions.RequestException as e: 
-          logger.error(f"Failed to connect to Listing Service at {url} for battery details: {e}")
-          return None
+    if not battery_id: return None
+    return EnrichmentService.get('battery', battery_id)
  
 def serialize_auction(auction): 
     if not auction: 
@@ -144,11 +121,21 @@ def serialize_auction(auction):
         'winning_bidder_id': auction.winning_bidder_id  
     }
  
+def _with_hot_state(auction, auction_data):
+    """Phiên ở chế độ hot: giá/người dẫn đầu mới nhất nằm trên Redis (DB chậm tối đa một chu kỳ ghi)."""
+    if getattr(auction, 'is_hot', False):
+        state = HotAuctionService.current_state(auction.auction_id)
+        if state:
+            auction_data['current_bid'] = str(state[0])
+            auction_data['winning_bidder_id'] = state[1]
+    return auction_data
+
 def _package_auction_details(auction): 
     if not auction:
         return jsonify({"error": "Auction not found"}), 404
         
-    auction_data = serialize_auction(auction)  
+    EnrichmentService.prefetch_auctions([auction])
+    auction_data = _with_hot_state(auction, serialize_auction(auction))
     if auction_data.get('auction_type') == 'vehicle' and auction_data.get('vehicle_id'):
         auction_data['vehicle_details'] = get_and_serialize_vehicle_by_id(auction_data['vehicle_id'])
     elif auction_data.get('auction_type') == 'battery' and auction_data.get('battery_id'):
@@ -182,6 +169,61 @@ def check_status_auction_status(resource_type, resource_id):
     is_auctioned_status = AuctionService.check_status_if_resource_is_auctioned(resource_type, resource_id) 
     return jsonify({"auction_status_resource": is_auctioned_status}), 200
 
+def _parse_resource_ids(values):
+    """List ID (int hoặc chuỗi số) -> set[int]; None nếu sai định dạng."""
+    if not isinstance(values, list):
+        return None
+    try:
+        return {int(v) for v in values}
+    except (TypeError, ValueError):
+        return None
+
+@auction_bp.route('/check-status/bulk', methods=['POST'])
+def check_status_bulk():
+    """
+    Kiểm tra trạng thái đấu giá của nhiều tài nguyên trong một request (tối đa MAX_BULK_RESOURCES ID).
+    Body (gọn): {"vehicle_ids": [1, 2], "battery_ids": [5]}
+    hoặc:       {"resources": [{"resource_type": "vehicle", "resource_id": 1}, ...]}
+    Trả về: {"vehicle": {"1": "started"}, "battery": {}} (chỉ gồm tài nguyên đã có đấu giá).
+    """
+    data = request.get_json(silent=True) or {}
+    resources = data.get('resources')
+    if resources is None and ('vehicle_ids' in data or 'battery_ids' in data):
+        vehicle_ids = _parse_resource_ids(data.get('vehicle_ids', []))
+        battery_ids = _parse_resource_ids(data.get('battery_ids', []))
+        if vehicle_ids is None or battery_ids is None:
+            return jsonify({"error": "'vehicle_ids' and 'battery_ids' must be lists of integers"}), 400
+        if len(vehicle_ids) + len(battery_ids) > MAX_BULK_RESOURCES:
+            return jsonify({"error": f"Too many resources (max {MAX_BULK_RESOURCES})"}), 413
+    else:
+        if not isinstance(resources, list):
+            return jsonify({"error": "Missing 'resources' list (or 'vehicle_ids'/'battery_ids') in request body"}), 400
+        if len(resources) > MAX_BULK_RESOURCES:
+            return jsonify({"error": f"Too many resources (max {MAX_BULK_RESOURCES})"}), 413
+
+        vehicle_ids = set()
+        battery_ids = set()
+        for item in resources:
+            if not isinstance(item, dict):
+                return jsonify({"error": "Each resource must be an object"}), 400
+            resource_type = item.get('resource_type')
+            try:
+                resource_id = int(item.get('resource_id'))
+            except (TypeError, ValueError):
+                return jsonify({"error": "Invalid resource_id"}), 400
+            if resource_type == 'vehicle':
+                vehicle_ids.add(resource_id)
+            elif resource_type == 'battery':
+                battery_ids.add(resource_id)
+            else:
+                return jsonify({"error": "Invalid resource type"}), 400
+
+    statuses = AuctionService.get_resources_auction_status(vehicle_ids, battery_ids)
+    return jsonify({
+        resource_type: {str(resource_id): status for resource_id, status in mapping.items()}
+        for resource_type, mapping in statuses.items()
+    }), 200
+
 # ============================================
 # === AUCTION API - PUBLIC ENDPOINTS ===
 # ============================================
@@ -189,6 +231,7 @@ def check_status_auction_status(resource_type, resource_id):
 @auction_bp.route('/', methods=['GET'])
 def get_active_auctions(): 
     auctions = AuctionService.get_all_active_auctions()
+    EnrichmentService.prefetch_auctions(auctions)
     enriched_auctions = []
     for auction in auctions:
         auction_data = serialize_auction(auction) 
@@ -344,15 +387,63 @@ def place_bid(auction_id):
         return jsonify({"error": "'bid_amount' must be a valid number"}), 400
 
     try:   
-        auction, message = AuctionService.place_bid(auction_id, current_user_id, bid_amount)
-        if not auction: 
-            return jsonify({"error": message}), 400  
-
-        return jsonify({"message": message, "auction": serialize_auction(auction)}), 200
+        outcome, auction, message = AuctionService.submit_bid(auction_id, current_user_id, bid_amount)
+        if outcome != BID_ACCEPTED:
+            response = {"error": message, "outcome": outcome}
+            if auction:
+                response["current_bid"] = str(auction.current_bid)
+            return jsonify(response), BID_ERROR_STATUS.get(outcome, 400)
+
+        return jsonify({"message": message, "outcome": outcome, "auction": serialize_auction(auction)}), 200
     except Exception as e:  
          logger.error(f"Error placing bid on auction {auction_id}: {e}", exc_info=True)
          return jsonify({"error": "An internal error occurred."}), 500
 
+def serialize_bid(bid):
+    local_created_at = bid.created_at.astimezone(VIETNAM_TZ) if bid.created_at else None
+    return {
+        'bid_id': bid.bid_id,
+        'auction_id': bid.auction_id,
+        'bidder_id': bid.bidder_id,
+        'amount': str(bid.amount),
+        'created_at': local_created_at.isoformat() if local_created_at else None
+    }
+
+@auction_bp.route('/auctions/<int:auction_id>/bids', methods=['GET'])
+def get_auction_bids(auction_id):
+    """
+    Bảng giá (lịch sử đặt giá) của phiên, giá cao nhất trước.
+    Query params: limit (mặc định 20, tối đa 100), cursor (next_cursor của trang trước).
+    """
+    if not AuctionService.get_auction_by_id(auction_id):
+        return jsonify({"error": "Auction not found"}), 404
+    try:
+        limit = max(1, min(int(request.args.get('limit', DEFAULT_BID_PAGE_SIZE)), MAX_BID_PAGE_SIZE))
+        bids, next_cursor = AuctionService.get_bids_page(auction_id, limit, request.args.get('cursor'))
+    except ValueError:
+        return jsonify({"error": "Invalid 'limit' or 'cursor'"}), 400
+    return jsonify({
+        "items": [serialize_bid(b) for b in bids],
+        "next_cursor": next_cursor,
+        "limit": limit
+    }), 200
+
+@auction_bp.route('/auctions/<int:auction_id>/stream', methods=['GET'])
+def stream_auction_events(auction_id):
+    """
+    Server-Sent Events: 'snapshot' (trạng thái hiện tại) rồi 'bid' / 'status' mỗi khi có thay đổi.
+    Thay cho việc client poll lại GET /api/<id> liên tục.
+    """
+    auction = AuctionService.get_auction_by_id(auction_id)
+    if not auction:
+        return jsonify({"error": "Auction not found"}), 404
+    initial = _with_hot_state(auction, AuctionEventService.auction_payload(auction))
+    return Response(
+        AuctionEventService.stream(auction_id, initial),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
 # ============================================
 # === AUCTION API - "MY" ENDPOINTS ===
 # ============================================
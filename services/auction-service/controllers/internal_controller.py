@@ -3,6 +3,7 @@ from flask import Blueprint, jsonify, request, current_app
 import os
 import logging 
 from services.auction_service import AuctionService 
+from services.outbox_service import AuctionOutboxService
 from .auction_controller import serialize_auction  
 
 internal_bp = Blueprint('internal_api', __name__, url_prefix='/internal')
@@ -91,4 +92,25 @@ def internal_delete_auction(auction_id):
     """Admin service gọi để xóa auction.""" 
     success, message = AuctionService.delete_auction(auction_id, user_id=None, user_role='admin')  
     if not success: return jsonify(error=message), 404  
-    return jsonify(message=message), 200
\ No newline at end of file
+    return jsonify(message=message), 200
+
+
+@internal_bp.route('/outbox', methods=['GET'])
+@internal_api_key_required()
+def internal_outbox_stats():
+    """Dashboard outbox: số kết quả đang chờ / đã gửi / lỗi và độ trễ gửi NiFi."""
+    try:
+        failed_limit = min(max(int(request.args.get('failed_limit', 20)), 1), 100)
+    except ValueError:
+        return jsonify(error="failed_limit phải là số nguyên"), 400
+    return jsonify(AuctionOutboxService.get_stats(failed_limit)), 200
+
+
+@internal_bp.route('/outbox/<int:outbox_id>/retry', methods=['POST'])
+@internal_api_key_required()
+def internal_retry_outbox(outbox_id):
+    """Admin gửi lại một kết quả đã bị đánh dấu 'failed'."""
+    entry, message = AuctionOutboxService.retry(outbox_id)
+    if not entry:
+        return jsonify(error=message), 400
+    return jsonify(message=message, entry=AuctionOutboxService.serialize(entry)), 200
@@ -0,0 +1,15 @@
+# Cấu hình gunicorn cho auction-service.
+# Worker gevent: mỗi kết nối (kể cả stream SSE /api/auctions/<id>/stream) là một greenlet,
+# nên một tiến trình giữ được hàng nghìn client đang chờ sự kiện mà không cần thread riêng.
+import os
+
+bind = "0.0.0.0:5002"
+worker_class = "gevent"
+workers = int(os.getenv("GUNICORN_WORKERS", 2))
+worker_connections = int(os.getenv("GUNICORN_WORKER_CONNECTIONS", 2000))
+
+
+def post_fork(server, worker):
+    # psycopg2 là thư viện C: cần patch để truy vấn Postgres nhường greenlet khác thay vì chặn cả worker
+    from psycogreen.gevent import patch_psycopg
+    patch_psycopg()
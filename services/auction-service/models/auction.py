@@ -3,6 +3,23 @@ from datetime import datetime, timezone
 
 class Auction(db.Model):
     __tablename__ = 'auctions'
+    __table_args__ = (
+        # Reconciler của scheduler chỉ quét các phiên đang chờ/đang chạy theo mốc thời gian
+        db.Index('ix_auctions_active_end_time', 'auction_status', 'end_time',
+                 postgresql_where=db.text("auction_status IN ('prepare', 'started')")),
+        db.Index('ix_auctions_prepare_start_time', 'start_time',
+                 postgresql_where=db.text("auction_status = 'prepare'")),
+        # Mỗi xe/pin chỉ được nằm trong MỘT phiên chưa kết thúc; chặn cả hai request tạo đồng thời
+        db.Index('ux_auctions_active_vehicle', 'vehicle_id', unique=True,
+                 postgresql_where=db.text("auction_status IN ('pending', 'prepare', 'started')"),
+                 sqlite_where=db.text("auction_status IN ('pending', 'prepare', 'started')")),
+        db.Index('ux_auctions_active_battery', 'battery_id', unique=True,
+                 postgresql_where=db.text("auction_status IN ('pending', 'prepare', 'started')"),
+                 sqlite_where=db.text("auction_status IN ('pending', 'prepare', 'started')")),
+        # Tra cứu trạng thái theo tài nguyên (kể cả phiên đã kết thúc), mới nhất theo auction_id
+        db.Index('ix_auctions_vehicle_id', 'vehicle_id', 'auction_id'),
+        db.Index('ix_auctions_battery_id', 'battery_id', 'auction_id'),
+    )
 
     auction_id = db.Column(db.Integer, primary_key=True)
     bidder_id = db.Column(db.Integer, nullable=False)
@@ -17,4 +34,10 @@ class Auction(db.Model):
     start_time = db.Column(db.DateTime, nullable=False)
     end_time = db.Column(db.DateTime, nullable=False)
     current_bid = db.Column(db.Numeric(10, 2), nullable=False)
-    winning_bidder_id = db.Column(db.Integer, nullable=True)
\ No newline at end of file
+    winning_bidder_id = db.Column(db.Integer, nullable=True)
+    # Phiên đang nhận giá trên Redis (HotAuctionService); đường đặt giá qua DB bị chặn
+    is_hot = db.Column(db.Boolean, nullable=False, default=False, server_default=db.false())
+    # seq (trên Redis) của lượt đặt giá hot cuối cùng đã ghi xuống bảng bids; flush bỏ qua seq <= giá trị này
+    hot_bid_seq = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+
+    bids = db.relationship('Bid', back_populates='auction', cascade='all, delete-orphan', passive_deletes=True)
\ No newline at end of file
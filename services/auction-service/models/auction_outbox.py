@@ -0,0 +1,34 @@
+from app import db
+from datetime import datetime, timezone
+
+class AuctionOutbox(db.Model):
+    """
+    Outbox kết quả đấu giá: ghi CÙNG transaction với việc chuyển phiên sang 'ended',
+    relay worker sẽ gửi tới NiFi sau (at-least-once, thử lại có backoff).
+    """
+    __tablename__ = 'auction_outbox'
+
+    outbox_id = db.Column(db.Integer, primary_key=True)
+    auction_id = db.Column(db.Integer, db.ForeignKey('auctions.auction_id', ondelete='CASCADE'), nullable=False)
+    event_type = db.Column(db.String(50), nullable=False, default='auction_result')
+    # Bên nhận dùng key này để bỏ qua bản gửi trùng
+    idempotency_key = db.Column(db.String(100), nullable=False, unique=True)
+    payload = db.Column(db.JSON, nullable=False)
+    status = db.Column(
+        db.Enum('pending', 'delivered', 'failed', name='auction_outbox_status_enum'),
+        nullable=False,
+        default='pending'
+    )
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime, nullable=False, default=lambda: datetime.now(timezone.utc))
+    last_error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=lambda: datetime.now(timezone.utc))
+    delivered_at = db.Column(db.DateTime, nullable=True)
+
+    def __repr__(self):
+        return f"<AuctionOutbox {self.outbox_id} auction={self.auction_id} status={self.status}>"
+
+
+# Relay lấy các bản ghi đến hạn: WHERE status = 'pending' AND next_attempt_at <= now ORDER BY next_attempt_at
+db.Index('ix_auction_outbox_pending', AuctionOutbox.next_attempt_at,
+         postgresql_where=db.text("status = 'pending'"))
@@ -0,0 +1,21 @@
+from app import db
+from datetime import datetime, timezone
+
+class Bid(db.Model):
+    """Lịch sử đặt giá (chỉ thêm, không sửa): mỗi lượt đặt giá thành công là một dòng."""
+    __tablename__ = 'bids'
+
+    bid_id = db.Column(db.Integer, primary_key=True)
+    auction_id = db.Column(db.Integer, db.ForeignKey('auctions.auction_id', ondelete='CASCADE'), nullable=False)
+    bidder_id = db.Column(db.Integer, nullable=False)
+    amount = db.Column(db.Numeric(10, 2), nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False, default=lambda: datetime.now(timezone.utc))
+
+    auction = db.relationship('Auction', back_populates='bids')
+
+    def __repr__(self):
+        return f"<Bid {self.bid_id} auction={self.auction_id} amount={self.amount}>"
+
+
+# Bảng giá của một phiên: WHERE auction_id = ... ORDER BY amount DESC, bid_id DESC LIMIT n
+db.Index('ix_bids_auction_amount', Bid.auction_id, Bid.amount.desc(), Bid.bid_id.desc())
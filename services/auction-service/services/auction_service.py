@@ -1,9 +1,17 @@
 from datetime import datetime, timezone, timedelta
 from dateutil import parser
 import sys, traceback
-from sqlalchemy import or_, and_
+from sqlalchemy import or_, and_, update, exists
+from sqlalchemy.exc import IntegrityError
+from decimal import Decimal, InvalidOperation
+import base64
 from app import db
 from models.auction import Auction
+from models.bid import Bid
+from services.event_service import AuctionEventService
+from services.scheduler_service import AuctionScheduler
+from services.outbox_service import AuctionOutboxService
+from services.hot_auction_service import HotAuctionService, HOT_MODE_ENABLED
 import logging
 import pytz
 import os
@@ -14,6 +22,30 @@ VIETNAM_TZ = pytz.timezone('Asia/Ho_Chi_Minh')
 ALLOWED_START_HOURS = [2, 4, 6, 8, 10, 12, 14, 16, 18, 20, 22]
 TRANSACTION_SERVICE_URL = os.environ.get('TRANSACTION_SERVICE_URL', 'http://transaction-service:5003')
 REQUEST_TIMEOUT = 1
+DEFAULT_BID_PAGE_SIZE = 20
+MAX_BID_PAGE_SIZE = 100
+
+# Một xe/pin chỉ được nằm trong một phiên chưa kết thúc (ràng buộc bởi partial unique index)
+ACTIVE_AUCTION_STATUSES = ('pending', 'prepare', 'started')
+_RESOURCE_COLUMNS = {
+    'vehicle': Auction.vehicle_id,
+    'battery': Auction.battery_id,
+}
+DUPLICATE_AUCTION_MESSAGES = {
+    'vehicle': "Xe này đã có trong một phiên đấu giá khác.",
+    'battery': "Pin này đã có trong một phiên đấu giá khác.",
+}
+
+# Kết quả của AuctionService.submit_bid
+BID_ACCEPTED = 'accepted'
+BID_TOO_LOW = 'too_low'
+BID_ALREADY_LEADING = 'already_leading'
+BID_OWN_AUCTION = 'own_auction'
+BID_NOT_OPEN = 'not_open'
+BID_ENDED = 'ended'
+BID_NOT_FOUND = 'not_found'
+BID_INVALID_AMOUNT = 'invalid_amount'
+BID_ERROR = 'error'
 
 logger = logging.getLogger(__name__)
 
@@ -50,19 +82,14 @@ class AuctionService:
             if auction_type == 'vehicle':
                 if not vehicle_id:
                     return None, "Loại đấu giá 'vehicle' yêu cầu vehicle_id."
-                if Auction.query.filter_by(vehicle_id=vehicle_id, auction_status='pending').first() or \
-                   Auction.query.filter_by(vehicle_id=vehicle_id, auction_status='prepare').first() or \
-                   Auction.query.filter_by(vehicle_id=vehicle_id, auction_status='started').first():
-                    return None, "Xe này đã có trong một phiên đấu giá khác."
             elif auction_type == 'battery':
                 if not battery_id:
                     return None, "Loại đấu giá 'battery' yêu cầu battery_id."
-                if Auction.query.filter_by(battery_id=battery_id, auction_status='pending').first() or \
-                   Auction.query.filter_by(battery_id=battery_id, auction_status='prepare').first() or \
-                   Auction.query.filter_by(battery_id=battery_id, auction_status='started').first():
-                   return None, "Pin này đã có trong một phiên đấu giá khác."
             else:
                  return None, "Loại đấu giá không hợp lệ." 
+            resource_id = vehicle_id if auction_type == 'vehicle' else battery_id
+            if AuctionService.has_active_auction(auction_type, resource_id):
+                return None, DUPLICATE_AUCTION_MESSAGES[auction_type]
             if float(data['current_bid']) >= 100000000 or float(data['current_bid'])<=0:
                 return None, "Giá bắt đầu đấu giá phải trong khoảng 0 đến 100 triệu"
             start_time_input = data['start_time']
@@ -97,7 +124,12 @@ class AuctionService:
             )
 
             db.session.add(new_auction)
-            db.session.commit()
+            try:
+                db.session.commit()
+            except IntegrityError:
+                # Hai request tạo cùng lúc: partial unique index chặn bản thứ hai
+                db.session.rollback()
+                return None, DUPLICATE_AUCTION_MESSAGES[auction_type]
             db.session.refresh(new_auction)
             return new_auction, "Tạo phiên đấu giá thành công, đang chờ duyệt."
 
@@ -162,6 +194,7 @@ class AuctionService:
 
             db.session.commit()
             db.session.refresh(auction)
+            AuctionScheduler.schedule(auction)
             return auction, "Cập nhật phiên đấu giá thành công."
 
         except Exception as e:
@@ -280,38 +313,155 @@ class AuctionService:
 
     @staticmethod
     def place_bid(auction_id, bidder_id, bid_amount):
-        try:
-            auction = db.session.get(Auction, auction_id)
-            if not auction:
-                return None, "Không tìm thấy phiên đấu giá." 
-            if auction.auction_status != 'started':
-                return None, f"Phiên đấu giá hiện không ở trạng thái 'started' (trạng thái: {auction.auction_status})." 
-
-            current_time_utc = datetime.now(timezone.utc)
-            end_time_utc = to_utc(auction.end_time) 
-            start_time_utc = to_utc(auction.start_time) 
-            if end_time_utc <= current_time_utc: 
-                return None, "Phiên đấu giá đã kết thúc."
-            if start_time_utc > current_time_utc: 
-                return None, "Phiên đấu giá chưa bắt đầu."
-            if bid_amount <= auction.current_bid:
-                return None, f"Giá đặt phải lớn hơn giá hiện tại ({auction.current_bid})."
-            if bidder_id == auction.bidder_id:  
-                return None, "Bạn không thể đặt giá cho phiên đấu giá của chính mình."
-            if bidder_id == auction.winning_bidder_id:  
-                return None, "Bạn đang là người đấu giá cao nhất."
- 
-            auction.current_bid = bid_amount
-            auction.winning_bidder_id = bidder_id 
-
-            db.session.commit()
-            db.session.refresh(auction)
-            return auction, f"Đặt giá thành công. Giá hiện tại mới: {bid_amount}."
+        """Giữ chữ ký cũ (auction, message); xem submit_bid để biết kết quả chi tiết."""
+        outcome, auction, message = AuctionService.submit_bid(auction_id, bidder_id, bid_amount)
+        return (auction if outcome == BID_ACCEPTED else None), message
 
+    @staticmethod
+    def submit_bid(auction_id, bidder_id, bid_amount):
+        """
+        Đặt giá bằng một câu UPDATE compare-and-set:
+            UPDATE auctions SET current_bid = :amount, winning_bidder_id = :bidder
+            WHERE auction_id = :id AND auction_status = 'started' AND <đang trong giờ>
+              AND current_bid < :amount AND <không phải chủ phiên / người đang dẫn đầu>
+        Postgres khóa dòng trong lúc UPDATE và đánh giá lại WHERE trên phiên bản mới nhất,
+        nên hai lượt đặt giá đồng thời không thể ghi đè nhau (không mất cập nhật), và không
+        cần SELECT ... FOR UPDATE giữ khóa qua nhiều round-trip.
+        Phiên ở chế độ hot (is_hot) được xử lý trên Redis bởi HotAuctionService; UPDATE bên dưới
+        loại trừ các phiên này. Tắt AUCTION_HOT_MODE thì không gọi Redis trước UPDATE; phiên còn
+        is_hot (bật từ trước) vẫn được chuyển sang Redis ở _rejected_bid.
+        Trả về (outcome, auction, message); outcome là một trong các hằng BID_*.
+        """
+        try:
+            amount = Decimal(str(bid_amount)).quantize(Decimal('0.01'))
+        except (InvalidOperation, ValueError):
+            return BID_INVALID_AMOUNT, None, "Giá đặt không hợp lệ."
+        if amount <= 0:
+            return BID_INVALID_AMOUNT, None, "Giá đặt không hợp lệ."
+
+        now = datetime.now(timezone.utc)
+        if HOT_MODE_ENABLED:
+            hot = HotAuctionService.try_bid(auction_id, bidder_id, amount, now)
+            if hot is not None:
+                return AuctionService._hot_bid_result(*hot, bidder_id, amount, now)
+        try:
+            result = db.session.execute(
+                update(Auction)
+                .where(
+                    Auction.auction_id == auction_id,
+                    Auction.auction_status == 'started',
+                    Auction.start_time <= now,
+                    Auction.end_time > now,
+                    Auction.current_bid < amount,
+                    Auction.bidder_id != bidder_id,
+                    or_(Auction.winning_bidder_id.is_(None), Auction.winning_bidder_id != bidder_id),
+                    Auction.is_hot.is_(False)
+                )
+                .values(current_bid=amount, winning_bidder_id=bidder_id)
+                .execution_options(synchronize_session=False)
+            )
+            if result.rowcount == 1:
+                # Ghi lịch sử trong cùng transaction với UPDATE
+                bid = Bid(auction_id=auction_id, bidder_id=bidder_id, amount=amount, created_at=now)
+                db.session.add(bid)
+                db.session.commit()
+                auction = db.session.get(Auction, auction_id, populate_existing=True)
+                payload = AuctionEventService.auction_payload(auction)
+                payload.update({'bid_id': bid.bid_id, 'bidder_id': bidder_id, 'amount': str(amount), 'created_at': now.isoformat()})
+                AuctionEventService.publish(auction_id, 'bid', payload)
+                if HotAuctionService.should_activate(auction, now):
+                    HotAuctionService.activate(auction_id)
+                return BID_ACCEPTED, auction, f"Đặt giá thành công. Giá hiện tại mới: {amount}."
+            db.session.rollback()
         except Exception as e:
             db.session.rollback()
             logger.error(f"Lỗi khi đặt giá cho đấu giá {auction_id}: {e}", exc_info=True)
-            return None, f"Lỗi máy chủ nội bộ: {str(e)}"
+            return BID_ERROR, None, f"Lỗi máy chủ nội bộ: {str(e)}"
+
+        # UPDATE không khớp dòng nào -> đọc lại để trả về lý do chính xác
+        return AuctionService._rejected_bid(auction_id, bidder_id, amount, now)
+
+    @staticmethod
+    def _hot_bid_result(outcome, auction, bidder_id, amount, now):
+        """Kết quả đặt giá trên Redis -> (outcome, auction, message) giống đường DB."""
+        if outcome != BID_ACCEPTED:
+            return AuctionService._rejection(outcome, auction)
+        payload = AuctionEventService.auction_payload(auction)
+        payload.update({'bid_id': None, 'bid_seq': auction.bid_seq, 'bidder_id': bidder_id,
+                        'amount': str(amount), 'created_at': now.isoformat()})
+        AuctionEventService.publish(auction.auction_id, 'bid', payload)
+        return BID_ACCEPTED, auction, f"Đặt giá thành công. Giá hiện tại mới: {amount}."
+
+    @staticmethod
+    def _rejection(outcome, auction):
+        messages = {
+            BID_NOT_OPEN: "Phiên đấu giá chưa bắt đầu hoặc không ở trạng thái 'started'.",
+            BID_ENDED: "Phiên đấu giá đã kết thúc.",
+            BID_OWN_AUCTION: "Bạn không thể đặt giá cho phiên đấu giá của chính mình.",
+            BID_ALREADY_LEADING: "Bạn đang là người đấu giá cao nhất.",
+            BID_TOO_LOW: f"Giá đặt phải lớn hơn giá hiện tại ({auction.current_bid}).",
+        }
+        return outcome, auction, messages.get(outcome, "Không thể đặt giá.")
+
+    @staticmethod
+    def _rejected_bid(auction_id, bidder_id, amount, now):
+        auction = db.session.get(Auction, auction_id, populate_existing=True)
+        if not auction:
+            return BID_NOT_FOUND, None, "Không tìm thấy phiên đấu giá."
+        if auction.is_hot and auction.auction_status == 'started':
+            # Phiên hot nhưng Redis không có state (Redis khởi động lại / nạp lỗi): nạp lại từ DB rồi thử lại
+            hot = HotAuctionService.try_bid(auction_id, bidder_id, amount, now) if HotAuctionService.load(auction) else None
+            if hot is None:
+                return BID_ERROR, auction, "Hệ thống đặt giá tạm thời gián đoạn, vui lòng thử lại."
+            return AuctionService._hot_bid_result(*hot, bidder_id, amount, now)
+        if auction.auction_status != 'started':
+            return BID_NOT_OPEN, auction, f"Phiên đấu giá hiện không ở trạng thái 'started' (trạng thái: {auction.auction_status})."
+        if to_utc(auction.end_time) <= now:
+            return BID_ENDED, auction, "Phiên đấu giá đã kết thúc."
+        if to_utc(auction.start_time) > now:
+            return BID_NOT_OPEN, auction, "Phiên đấu giá chưa bắt đầu."
+        if bidder_id == auction.bidder_id:
+            return BID_OWN_AUCTION, auction, "Bạn không thể đặt giá cho phiên đấu giá của chính mình."
+        if bidder_id == auction.winning_bidder_id:
+            return BID_ALREADY_LEADING, auction, "Bạn đang là người đấu giá cao nhất."
+        # Còn lại: giá không cao hơn giá hiện tại (có thể vừa bị người khác vượt trong lúc gửi)
+        return BID_TOO_LOW, auction, f"Giá đặt phải lớn hơn giá hiện tại ({auction.current_bid})."
+
+    # --- BID HISTORY ---
+    @staticmethod
+    def encode_bid_cursor(bid):
+        raw = f"{bid.amount}|{bid.bid_id}"
+        return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+    @staticmethod
+    def decode_bid_cursor(cursor):
+        """Giải mã cursor thành (amount, bid_id). Raise ValueError nếu cursor không hợp lệ."""
+        try:
+            raw = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8')
+            amount, bid_id = raw.rsplit('|', 1)
+            return Decimal(amount), int(bid_id)
+        except Exception:
+            raise ValueError("Invalid cursor.")
+
+    @staticmethod
+    def get_bids_page(auction_id, limit, cursor=None):
+        """
+        Bảng giá của phiên đấu giá: giá cao nhất trước, phân trang keyset theo (amount, bid_id)
+        nên chỉ đọc đúng `limit` dòng trên index ix_bids_auction_amount. Trả về (bids, next_cursor).
+        """
+        query = Bid.query.filter(Bid.auction_id == auction_id)
+        if cursor:
+            amount, bid_id = AuctionService.decode_bid_cursor(cursor)
+            query = query.filter(or_(
+                Bid.amount < amount,
+                and_(Bid.amount == amount, Bid.bid_id < bid_id)
+            ))
+        bids = query.order_by(Bid.amount.desc(), Bid.bid_id.desc()).limit(limit + 1).all()
+        next_cursor = None
+        if len(bids) > limit:
+            bids = bids[:limit]
+            next_cursor = AuctionService.encode_bid_cursor(bids[-1])
+        return bids, next_cursor
 
     @staticmethod
     def filter_auctions(filters: dict): 
@@ -367,12 +517,20 @@ class AuctionService:
             if not auction.winning_bidder_id:
                 return None, "No winning bid found."
 
+            if auction.is_hot:
+                # Ghi nốt các lượt đặt giá đang nằm trên Redis trước khi kết thúc
+                if HotAuctionService.close([auction_id]):
+                    return None, "Chưa ghi xong các lượt đặt giá gần nhất, vui lòng thử lại."
+                db.session.refresh(auction)
+
             if to_utc(auction.end_time) > datetime.now(timezone.utc):
                 auction.end_time = datetime.now(timezone.utc)
 
             auction.auction_status = 'ended'
+            auction.is_hot = False
 
             db.session.commit()
+            HotAuctionService.discard([auction_id])
             db.session.refresh(auction)
 
             winner_name = str(auction.winning_bidder_id) if auction.winning_bidder_id else "Unknown"
@@ -402,6 +560,8 @@ class AuctionService:
                 count += 1
             
             db.session.commit()
+            for auction in auctions_to_start:
+                AuctionEventService.publish_auction(auction)
             logger.info(f"Service: Auto-started {count} auctions.")
             return count
 
@@ -410,18 +570,113 @@ class AuctionService:
             logger.error(f"Lỗi khi tự động bắt đầu đấu giá (service): {e}", exc_info=True)
             return -1
 
+    @staticmethod
+    def start_auction_if_due(auction_id, expected_start=None):
+        """
+        Task hẹn giờ: chuyển prepare -> started bằng UPDATE có điều kiện (chạy lặp lại vô hại).
+        expected_start: mốc lúc đặt hẹn; nếu phiên đã đổi giờ thì bỏ qua. Trả về True nếu đã bắt đầu.
+        """
+        now = datetime.now(timezone.utc)
+        conditions = [
+            Auction.auction_id == auction_id,
+            Auction.auction_status == 'prepare',
+            Auction.start_time <= now,
+            Auction.end_time > now
+        ]
+        if expected_start is not None:
+            conditions.append(Auction.start_time == expected_start)
+        try:
+            result = db.session.execute(
+                update(Auction).where(*conditions).values(auction_status='started')
+                .execution_options(synchronize_session=False)
+            )
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Lỗi khi bắt đầu đấu giá {auction_id}: {e}", exc_info=True)
+            return False
+        if result.rowcount != 1:
+            return False
+        auction = db.session.get(Auction, auction_id, populate_existing=True)
+        AuctionEventService.publish_auction(auction)
+        logger.info(f"Service: Đã bắt đầu auction {auction_id} đúng giờ.")
+        return True
+
+    @staticmethod
+    def get_auction_to_finalize(auction_id, expected_end=None):
+        """Task hẹn giờ: trả về phiên nếu đang 'started' và đã tới giờ kết thúc (đúng mốc đã hẹn)."""
+        query = Auction.query.filter(
+            Auction.auction_id == auction_id,
+            Auction.auction_status == 'started',
+            Auction.end_time <= datetime.now(timezone.utc)
+        )
+        if expected_end is not None:
+            query = query.filter(Auction.end_time == expected_end)
+        return query.first()
+
     @staticmethod
     def auto_finalize_auctions(): 
         logger.warning("AuctionService.auto_finalize_auctions() đã bị VÔ HIỆU HÓA và được thay thế bằng tasks.py (NiFi).")
         return 0 
 
     @staticmethod
-    def get_auctions_to_finalize(): 
+    def get_auctions_to_finalize(limit=None): 
         current_time = datetime.now(timezone.utc)
-        return Auction.query.filter(
+        query = Auction.query.filter(
             Auction.auction_status == 'started',  
             Auction.end_time <= current_time
-        ).all()
+        ).order_by(Auction.end_time.asc(), Auction.auction_id.asc())
+        if limit:
+            query = query.limit(limit)
+        return query.all()
+
+    @staticmethod
+    def finalize_auctions(auction_ids):
+        """
+        Chuyển nhiều phiên 'started' sang 'ended' bằng MỘT câu UPDATE và, trong CÙNG transaction,
+        ghi kết quả của các phiên có người thắng vào auction_outbox (relay sẽ gửi NiFi sau).
+        Phiên đã được tiến trình khác kết thúc thì bỏ qua. Trả về (số phiên đã kết thúc, số bản ghi outbox).
+        """
+        if not auction_ids:
+            return 0, 0
+        # Phiên hot: ghi nốt lượt đặt giá từ Redis; phiên chưa ghi được để lần quét sau
+        conditions = [Auction.auction_status == 'started']
+        try:
+            postponed = HotAuctionService.close(auction_ids)
+        except Exception as e:
+            # Không rõ phiên hot nào đã ghi xong: lượt này chỉ kết thúc các phiên không hot
+            db.session.rollback()
+            logger.error(f"Lỗi khi đóng các phiên hot trong {auction_ids}: {e}", exc_info=True)
+            postponed = set()
+            conditions.append(Auction.is_hot.is_(False))
+        auction_ids = [a for a in auction_ids if a not in postponed]
+        if not auction_ids:
+            return 0, 0
+        try:
+            ended = db.session.execute(
+                update(Auction)
+                .where(Auction.auction_id.in_(auction_ids), *conditions)
+                .values(auction_status='ended', is_hot=False)
+                .returning(Auction.auction_id, Auction.bidder_id, Auction.winning_bidder_id, Auction.current_bid)
+                .execution_options(synchronize_session=False)
+            ).all()
+            winners = [row for row in ended if row.winning_bidder_id]
+            for row in winners:
+                AuctionOutboxService.enqueue_result(row)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Lỗi khi kết thúc hàng loạt {len(auction_ids)} auction: {e}", exc_info=True)
+            return 0, 0
+        if ended:
+            HotAuctionService.discard([row.auction_id for row in ended])
+            auctions = Auction.query.populate_existing().filter(
+                Auction.auction_id.in_([row.auction_id for row in ended])
+            ).all()
+            for auction in auctions:
+                AuctionEventService.publish_auction(auction)
+        logger.info(f"Service: Đã kết thúc {len(ended)} auction, {len(winners)} kết quả chờ gửi NiFi.")
+        return len(ended), len(winners)
 
     @staticmethod
     def update_auction_status(auction_id, new_status): 
@@ -430,6 +685,7 @@ class AuctionService:
             if auction:
                 auction.auction_status = new_status
                 db.session.commit()
+                AuctionEventService.publish_auction(auction)
                 logger.info(f"Service: Cập nhật auction {auction_id} sang trạng thái {new_status}.")
                 return auction, "Cập nhật trạng thái thành công."
             logger.warning(f"Service: Không tìm thấy auction {auction_id} để cập nhật status.")
@@ -464,6 +720,7 @@ class AuctionService:
 
             db.session.commit()
             db.session.refresh(auction)
+            AuctionScheduler.schedule(auction)
             return auction, message
 
         except Exception as e:
@@ -472,24 +729,27 @@ class AuctionService:
             traceback.print_exc(file=sys.stderr)
             return None, f"An internal error occurred: {str(e)}"
 
+    @staticmethod
+    def has_active_auction(resource_type, resource_id):
+        """
+        Tài nguyên có đang ở một phiên chưa kết thúc (pending/prepare/started) không.
+        Một truy vấn EXISTS, dùng partial unique index ux_auctions_active_vehicle/battery.
+        """
+        column = _RESOURCE_COLUMNS.get(resource_type)
+        if column is None or resource_id is None:
+            return False
+        return db.session.query(
+            exists().where(column == resource_id, Auction.auction_status.in_(ACTIVE_AUCTION_STATUSES))
+        ).scalar()
+
     @staticmethod
     def check_if_resource_is_auctioned(resource_type, resource_id) :
+        """Tài nguyên đã từng được đưa lên đấu giá chưa (mọi trạng thái)."""
         try: 
-            filter_condition = None
-            if resource_type == 'vehicle':
-                filter_condition = (Auction.vehicle_id == resource_id)
-            elif resource_type == 'battery':
-                filter_condition = (Auction.battery_id == resource_id)
-            else:
+            column = _RESOURCE_COLUMNS.get(resource_type)
+            if column is None:
                 return False 
-            active_statuses = ['pending', 'prepare', 'started', 'ended', 'rejected'] 
-            auction = db.session.query(Auction).filter(
-                and_(
-                    filter_condition, 
-                    Auction.auction_status.in_(active_statuses)
-                )
-            ).first()
-            return auction is not None
+            return db.session.query(exists().where(column == resource_id)).scalar()
                     
         except Exception as e:
             logger.error(f"Error checking auction status for {resource_type} ID {resource_id}: {e}")
@@ -518,6 +778,37 @@ class AuctionService:
             logger.error(f"Error checking auction status for {resource_type} ID {resource_id}: {e}")
             return None
 
+    @staticmethod
+    def get_resources_auction_status(vehicle_ids, battery_ids):
+        """
+        Trả về trạng thái đấu giá của nhiều vehicle/battery bằng một truy vấn duy nhất
+        (BitmapOr trên ix_auctions_vehicle_id / ix_auctions_battery_id).
+        """
+        result = {'vehicle': {}, 'battery': {}}
+        vehicle_ids = set(vehicle_ids or [])
+        battery_ids = set(battery_ids or [])
+        conditions = []
+        if vehicle_ids:
+            conditions.append(Auction.vehicle_id.in_(vehicle_ids))
+        if battery_ids:
+            conditions.append(Auction.battery_id.in_(battery_ids))
+        if not conditions:
+            return result
+        try:
+            rows = db.session.query(
+                Auction.vehicle_id, Auction.battery_id, Auction.auction_status
+            ).filter(or_(*conditions)).order_by(Auction.auction_id.asc()).all()
+            # Auction mới nhất (auction_id lớn nhất) ghi đè các auction cũ của cùng tài nguyên.
+            for vehicle_id, battery_id, auction_status in rows:
+                if vehicle_id is not None and vehicle_id in vehicle_ids:
+                    result['vehicle'][vehicle_id] = auction_status
+                if battery_id is not None and battery_id in battery_ids:
+                    result['battery'][battery_id] = auction_status
+            return result
+        except Exception as e:
+            logger.error(f"Error checking bulk auction status: {e}")
+            return result
+
     @staticmethod
     def get_absolutely_all_auctions(): 
         return Auction.query.order_by(Auction.start_time.desc()).all()
@@ -0,0 +1,182 @@
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+import os
+import threading
+import time
+import logging
+import requests
+
+logger = logging.getLogger(__name__)
+
+LISTING_SERVICE_URL = os.environ.get('LISTING_SERVICE_URL', 'http://listing-service:5001')
+USER_SERVICE_URL = os.environ.get('USER_SERVICE_URL', 'http://user-service:5000')
+REQUEST_TIMEOUT = 1
+ENRICH_CACHE_TTL = int(os.getenv('AUCTION_ENRICH_CACHE_TTL', 60))  # giây
+# Không tìm thấy / lỗi: cache ngắn để không gọi lại liên tục nhưng sớm thấy dữ liệu mới
+ENRICH_NEGATIVE_TTL = 5
+ENRICH_CACHE_MAX_ENTRIES = int(os.getenv('AUCTION_ENRICH_CACHE_MAX_ENTRIES', 5000))
+ENRICH_WORKERS = int(os.getenv('AUCTION_ENRICH_WORKERS', 8))
+
+_MISSING = object()
+
+_session = requests.Session()
+_session.mount('http://', HTTPAdapter(pool_connections=2, pool_maxsize=ENRICH_WORKERS))
+_executor = ThreadPoolExecutor(max_workers=ENRICH_WORKERS, thread_name_prefix='auction-enrich')
+
+
+class _TTLCache:
+    """Cache LRU có TTL trong tiến trình; lưu được cả giá trị None (kết quả âm)."""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return _MISSING
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                return _MISSING
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+def _fetch_vehicle(vehicle_id):
+    url = f"{LISTING_SERVICE_URL}/api/vehicles/{vehicle_id}"
+    try:
+        response = _session.get(url, timeout=REQUEST_TIMEOUT)
+        if response.status_code == 200:
+            return response.json()
+        logger.warning(f"Listing Service returned status {response.status_code} for vehicle ID {vehicle_id} at {url}")
+        return None
+    except (requests.exceptions.RequestException, ValueError) as e:
+        logger.error(f"Failed to connect to Listing Service at {url} for vehicle details: {e}")
+        return None
+
+
+def _fetch_battery(battery_id):
+    url = f"{LISTING_SERVICE_URL}/api/batteries/{battery_id}"
+    try:
+        response = _session.get(url, timeout=REQUEST_TIMEOUT)
+        if response.status_code == 200:
+            return response.json()
+        logger.warning(f"Listing Service returned status {response.status_code} for battery ID {battery_id} at {url}")
+        return None
+    except (requests.exceptions.RequestException, ValueError) as e:
+        logger.error(f"Failed to connect to Listing Service at {url} for battery details: {e}")
+        return None
+
+
+def _fetch_user(user_id):
+    url = f"{USER_SERVICE_URL}/api/info/{user_id}"
+    try:
+        response = _session.get(url, timeout=REQUEST_TIMEOUT)
+        if response.status_code == 200:
+            user_data_list = response.json()
+            if user_data_list and isinstance(user_data_list, list):
+                return user_data_list[0]
+            logger.warning(f"User Service returned empty or invalid data for user ID {user_id} at {url}")
+            return None
+        if response.status_code == 404:
+            logger.warning(f"User not found in User Service for ID {user_id} at {url}")
+        else:
+            logger.warning(f"User Service returned status {response.status_code} for user ID {user_id} at {url}")
+        return None
+    except (requests.exceptions.RequestException, ValueError) as e:
+        logger.error(f"Failed to connect to User Service at {url} for user info: {e}")
+        return None
+
+
+_FETCHERS = {
+    'vehicle': _fetch_vehicle,
+    'battery': _fetch_battery,
+    'user': _fetch_user,
+}
+
+
+class EnrichmentService:
+    """
+    Thông tin bổ sung cho phiên đấu giá (chi tiết xe/pin từ listing-service, username từ user-service).
+    - Cache TTL theo (loại, id) trong tiến trình (AUCTION_ENRICH_CACHE_TTL).
+    - Gộp request: nhiều request cùng cần một id chỉ tạo MỘT lần gọi HTTP đang bay.
+    - get_many(): các id chưa có trong cache được gọi song song (tối đa AUCTION_ENRICH_WORKERS),
+      nên trang danh sách đấu giá chỉ tốn khoảng một "vòng" gọi mạng thay vì N lần tuần tự.
+    """
+    _cache = _TTLCache(ENRICH_CACHE_MAX_ENTRIES)
+    _inflight = {}
+    _lock = threading.Lock()
+
+    @staticmethod
+    def get(kind, resource_id):
+        if not resource_id:
+            return None
+        return EnrichmentService.get_many([(kind, resource_id)]).get((kind, resource_id))
+
+    @staticmethod
+    def get_many(keys):
+        """keys: iterable (kind, id). Trả về dict {(kind, id): dữ liệu hoặc None}."""
+        results = {}
+        pending = {}
+        for key in dict.fromkeys(k for k in keys if k[1]):
+            cached = EnrichmentService._cache.get(key)
+            if cached is not _MISSING:
+                results[key] = cached
+            else:
+                pending[key] = EnrichmentService._future_for(key)
+        for key, future in pending.items():
+            try:
+                results[key] = future.result(timeout=REQUEST_TIMEOUT * 3)
+            except Exception as e:
+                logger.warning(f"Không lấy được {key[0]} {key[1]}: {e}")
+                results[key] = None
+        return results
+
+    @staticmethod
+    def prefetch_auctions(auctions, users=True):
+        """Nạp trước (song song) chi tiết xe/pin và người bán/người thắng của một danh sách phiên."""
+        keys = []
+        for auction in auctions:
+            if auction.auction_type == 'vehicle' and auction.vehicle_id:
+                keys.append(('vehicle', auction.vehicle_id))
+            elif auction.auction_type == 'battery' and auction.battery_id:
+                keys.append(('battery', auction.battery_id))
+            if users:
+                keys.append(('user', auction.bidder_id))
+                keys.append(('user', auction.winning_bidder_id))
+        return EnrichmentService.get_many(keys)
+
+    @staticmethod
+    def _future_for(key):
+        with EnrichmentService._lock:
+            future = EnrichmentService._inflight.get(key)
+            if future is None:
+                future = _executor.submit(EnrichmentService._load, key)
+                EnrichmentService._inflight[key] = future
+            return future
+
+    @staticmethod
+    def _load(key):
+        kind, resource_id = key
+        try:
+            value = _FETCHERS[kind](resource_id)
+            EnrichmentService._cache.set(key, value, ENRICH_CACHE_TTL if value is not None else ENRICH_NEGATIVE_TTL)
+            return value
+        finally:
+            with EnrichmentService._lock:
+                EnrichmentService._inflight.pop(key, None)
@@ -0,0 +1,154 @@
+from collections import defaultdict
+import json
+import os
+import queue
+import threading
+import time
+import logging
+import redis
+
+logger = logging.getLogger(__name__)
+
+CHANNEL_PREFIX = 'auction-events'
+HEARTBEAT_SECONDS = int(os.getenv('AUCTION_STREAM_HEARTBEAT', 15))
+SUBSCRIBER_QUEUE_SIZE = 100
+RECONNECT_DELAY = 2
+
+
+def _channel(auction_id):
+    return f"{CHANNEL_PREFIX}:{auction_id}"
+
+
+class AuctionEventService:
+    """
+    Phát sự kiện đấu giá (bid/status) qua Redis pub/sub và fan-out tới các kết nối SSE.
+    Mỗi tiến trình chỉ giữ MỘT kết nối psubscribe 'auction-events:*' (một thread nền);
+    mỗi client SSE chỉ là một hàng đợi nhỏ trong bộ nhớ. Chạy gunicorn với worker gevent
+    thì mỗi kết nối là một greenlet, nên giữ hàng nghìn client rảnh không tốn thread.
+    Không có Redis: sự kiện được phát trực tiếp trong tiến trình (chỉ dùng khi dev).
+    """
+    _subscribers = defaultdict(set)
+    _lock = threading.Lock()
+    _listener = None
+
+    @staticmethod
+    def _redis():
+        from app import redis_client
+        return redis_client
+
+    # --- PUBLISH ---
+    @staticmethod
+    def publish(auction_id, event, data):
+        """Gọi SAU khi commit. Lỗi Redis chỉ được log, không làm hỏng nghiệp vụ đặt giá."""
+        message = json.dumps({'event': event, 'data': data}, ensure_ascii=False, default=str)
+        client = AuctionEventService._redis()
+        if client is None:
+            AuctionEventService._dispatch(auction_id, message)
+            return
+        try:
+            client.publish(_channel(auction_id), message)
+        except redis.exceptions.RedisError as e:
+            logger.warning(f"Không publish được sự kiện {event} của auction {auction_id}: {e}")
+
+    @staticmethod
+    def publish_auction(auction, event='status'):
+        AuctionEventService.publish(auction.auction_id, event, AuctionEventService.auction_payload(auction))
+
+    @staticmethod
+    def auction_payload(auction):
+        return {
+            'auction_id': auction.auction_id,
+            'auction_status': auction.auction_status,
+            'current_bid': str(auction.current_bid),
+            'winning_bidder_id': auction.winning_bidder_id,
+        }
+
+    # --- SUBSCRIBE ---
+    @staticmethod
+    def subscribe(auction_id):
+        AuctionEventService._ensure_listener()
+        q = queue.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        with AuctionEventService._lock:
+            AuctionEventService._subscribers[auction_id].add(q)
+        return q
+
+    @staticmethod
+    def unsubscribe(auction_id, q):
+        with AuctionEventService._lock:
+            subscribers = AuctionEventService._subscribers.get(auction_id)
+            if subscribers is not None:
+                subscribers.discard(q)
+                if not subscribers:
+                    del AuctionEventService._subscribers[auction_id]
+
+    @staticmethod
+    def _dispatch(auction_id, message):
+        with AuctionEventService._lock:
+            subscribers = list(AuctionEventService._subscribers.get(auction_id, ()))
+        for q in subscribers:
+            try:
+                q.put_nowait(message)
+            except queue.Full:
+                # Client đọc chậm: bỏ sự kiện cũ nhất, giữ sự kiện mới nhất
+                try:
+                    q.get_nowait()
+                    q.put_nowait(message)
+                except (queue.Empty, queue.Full):
+                    pass
+
+    @staticmethod
+    def _ensure_listener():
+        if AuctionEventService._redis() is None:
+            return
+        with AuctionEventService._lock:
+            listener = AuctionEventService._listener
+            if listener is not None and listener.is_alive():
+                return
+            listener = threading.Thread(target=AuctionEventService._listen, name='auction-events', daemon=True)
+            AuctionEventService._listener = listener
+        listener.start()
+
+    @staticmethod
+    def _listen():
+        redis_url = os.getenv("REDIS_URL", "redis://redis:6379")
+        while True:
+            try:
+                # Kết nối riêng không có socket_timeout: pubsub chờ chặn lâu dài
+                pubsub = redis.from_url(redis_url, decode_responses=True).pubsub(ignore_subscribe_messages=True)
+                pubsub.psubscribe(f"{CHANNEL_PREFIX}:*")
+                for item in pubsub.listen():
+                    try:
+                        auction_id = int(item['channel'].rsplit(':', 1)[1])
+                    except (KeyError, ValueError):
+                        continue
+                    AuctionEventService._dispatch(auction_id, item['data'])
+            except redis.exceptions.RedisError as e:
+                logger.warning(f"Mất kết nối pub/sub sự kiện đấu giá, thử lại sau {RECONNECT_DELAY}s: {e}")
+                time.sleep(RECONNECT_DELAY)
+
+    # --- SSE ---
+    @staticmethod
+    def stream(auction_id, initial=None):
+        """
+        Generator SSE: gửi trạng thái hiện tại (nếu có), sau đó là từng sự kiện;
+        comment keep-alive mỗi HEARTBEAT_SECONDS để proxy không cắt kết nối rảnh.
+        """
+        q = AuctionEventService.subscribe(auction_id)
+        try:
+            yield "retry: 3000\n\n"
+            if initial is not None:
+                yield AuctionEventService._format('snapshot', initial)
+            while True:
+                try:
+                    message = q.get(timeout=HEARTBEAT_SECONDS)
+                except queue.Empty:
+                    yield ": keep-alive\n\n"
+                    continue
+                payload = json.loads(message)
+                yield AuctionEventService._format(payload['event'], payload['data'])
+        finally:
+            AuctionEventService.unsubscribe(auction_id, q)
+
+    @staticmethod
+    def _format(event, data):
+        return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
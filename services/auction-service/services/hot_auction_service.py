@@ -0,0 +1,399 @@
+from app import db
+from models.auction import Auction
+from models.bid import Bid
+from datetime import datetime, timezone
+from decimal import Decimal
+from sqlalchemy import update
+from types import SimpleNamespace
+import os
+import logging
+import redis
+
+logger = logging.getLogger(__name__)
+
+# Chế độ "hot": bật bằng AUCTION_HOT_MODE=true. Phiên 'started' còn dưới AUCTION_HOT_WINDOW_SECONDS
+# sẽ được chuyển sang nhận giá trên Redis ở lượt đặt giá thành công kế tiếp.
+HOT_MODE_ENABLED = os.getenv('AUCTION_HOT_MODE', 'false').lower() in ('1', 'true', 'yes')
+HOT_WINDOW_SECONDS = int(os.getenv('AUCTION_HOT_WINDOW_SECONDS', 300))
+HOT_KEY_PREFIX = 'auction-hot'
+DIRTY_KEY = f"{HOT_KEY_PREFIX}:dirty"
+# Key trên Redis tự hết hạn sau giờ kết thúc một khoảng (finalize thường xóa sớm hơn)
+KEY_GRACE_MS = 3600 * 1000
+
+# KEYS: state, bids, dirty | ARGV: bidder_id, amount_cents, now_ms, auction_id, key_grace_ms
+# Trả về {outcome, các cặp field/value của state}; 'miss' nếu phiên không ở chế độ hot.
+_BID_SCRIPT = """
+local s = redis.call('HMGET', KEYS[1], 'status', 'start_ms', 'end_ms', 'seller', 'leader', 'bid_cents')
+if not s[1] then return {'miss'} end
+local outcome = 'accepted'
+local now = tonumber(ARGV[3])
+if s[1] == 'closed' or now >= tonumber(s[3]) then outcome = 'ended'
+elseif s[1] ~= 'started' or now < tonumber(s[2]) then outcome = 'not_open'
+elseif ARGV[1] == s[4] then outcome = 'own_auction'
+elseif ARGV[1] == s[5] then outcome = 'already_leading'
+elseif tonumber(ARGV[2]) <= tonumber(s[6]) then outcome = 'too_low'
+end
+if outcome == 'accepted' then
+  local seq = redis.call('HINCRBY', KEYS[1], 'seq', 1)
+  redis.call('HSET', KEYS[1], 'bid_cents', ARGV[2], 'leader', ARGV[1])
+  redis.call('RPUSH', KEYS[2], seq .. '|' .. ARGV[1] .. '|' .. ARGV[2] .. '|' .. ARGV[3])
+  redis.call('PEXPIREAT', KEYS[2], tonumber(s[3]) + tonumber(ARGV[5]))
+  redis.call('SADD', KEYS[3], ARGV[4])
+end
+local result = {outcome}
+local state = redis.call('HGETALL', KEYS[1])
+for i = 1, #state do result[#result + 1] = state[i] end
+return result
+"""
+
+# KEYS: state | ARGV: field/value... ; chỉ nạp khi chưa có (state trên Redis luôn mới hơn DB)
+_LOAD_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 1 then return 0 end
+redis.call('HSET', KEYS[1], unpack(ARGV, 2))
+redis.call('PEXPIREAT', KEYS[1], tonumber(ARGV[1]))
+return 1
+"""
+
+# KEYS: bids, processing, dirty | ARGV: auction_id
+# Chuyển list chờ sang list "processing" và trả về nội dung; list processing còn từ lần ghi trước
+# (lỗi DB / worker chết trước khi ack) thì trả lại nó. Không có gì để ghi thì bỏ khỏi dirty.
+_CLAIM_SCRIPT = """
+if redis.call('EXISTS', KEYS[2]) == 0 then
+  if redis.call('EXISTS', KEYS[1]) == 0 then
+    redis.call('SREM', KEYS[3], ARGV[1])
+    return {}
+  end
+  redis.call('RENAME', KEYS[1], KEYS[2])
+end
+return redis.call('LRANGE', KEYS[2], 0, -1)
+"""
+
+# KEYS: processing, bids, dirty | ARGV: auction_id ; gọi SAU khi DB đã commit
+_ACK_SCRIPT = """
+redis.call('DEL', KEYS[1])
+if redis.call('EXISTS', KEYS[2]) == 0 then redis.call('SREM', KEYS[3], ARGV[1]) end
+return 1
+"""
+
+# KEYS: state ; dừng nhận giá (không tạo hash nếu đã mất)
+_CLOSE_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 1 then redis.call('HSET', KEYS[1], 'status', 'closed') end
+return 1
+"""
+
+_scripts = {}
+
+
+def _state_key(auction_id):
+    return f"{HOT_KEY_PREFIX}:{auction_id}"
+
+
+def _bids_key(auction_id):
+    return f"{HOT_KEY_PREFIX}:{auction_id}:bids"
+
+
+def _processing_key(auction_id):
+    return f"{HOT_KEY_PREFIX}:{auction_id}:processing"
+
+
+def _to_ms(dt):
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return int(dt.timestamp() * 1000)
+
+
+def _from_ms(ms):
+    return datetime.fromtimestamp(int(ms) / 1000, tz=timezone.utc)
+
+
+def _to_cents(amount):
+    return int(Decimal(str(amount)) * 100)
+
+
+def _from_cents(cents):
+    return (Decimal(int(cents)) / 100).quantize(Decimal('0.01'))
+
+
+class HotAuctionService:
+    """
+    Chế độ "hot" cho những phút cuối của phiên đấu giá.
+    - activate(): đánh dấu auctions.is_hot (UPDATE có điều kiện, khóa dòng nên không lẫn với
+      lượt đặt giá qua DB đang chạy) rồi nạp giá/người dẫn đầu hiện tại vào một hash Redis.
+      Từ đó đường đặt giá qua DB bị chặn (điều kiện is_hot = false).
+    - try_bid(): một script Lua kiểm tra và cập nhật giá nguyên tử trên Redis, ghi lượt đặt giá
+      vào list chờ và đánh dấu phiên "dirty". Không có round-trip tới DB.
+    - flush(): write-behind; khóa dòng auctions (FOR UPDATE) rồi ghi các lượt đặt giá chờ vào bảng
+      bids và cập nhật auctions. Lượt đặt giá chỉ bị xóa khỏi Redis SAU khi commit; ghi lại một lô
+      đã ghi (worker chết trước khi xóa) bị bỏ qua nhờ auctions.hot_bid_seq.
+    - finalize_auctions() gọi close() để ghi nốt trước khi chuyển phiên sang 'ended'.
+    """
+
+    @staticmethod
+    def _redis():
+        from app import redis_client
+        return redis_client
+
+    @staticmethod
+    def _script(name, source):
+        client = HotAuctionService._redis()
+        if client is None:
+            return None
+        script = _scripts.get((id(client), name))
+        if script is None:
+            script = client.register_script(source)
+            _scripts[(id(client), name)] = script
+        return script
+
+    # --- ACTIVATE ---
+    @staticmethod
+    def should_activate(auction, now):
+        if not HOT_MODE_ENABLED or HotAuctionService._redis() is None:
+            return False
+        end_time = auction.end_time if auction.end_time.tzinfo else auction.end_time.replace(tzinfo=timezone.utc)
+        return auction.auction_status == 'started' and (end_time - now).total_seconds() <= HOT_WINDOW_SECONDS
+
+    @staticmethod
+    def activate(auction_id):
+        """Chuyển phiên sang chế độ hot. Trả về True nếu phiên đang ở chế độ hot sau lời gọi."""
+        try:
+            row = db.session.execute(
+                update(Auction)
+                .where(Auction.auction_id == auction_id, Auction.auction_status == 'started',
+                       Auction.is_hot.is_(False))
+                .values(is_hot=True)
+                .returning(*HotAuctionService._state_columns())
+                .execution_options(synchronize_session=False)
+            ).first()
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Không chuyển được auction {auction_id} sang chế độ hot: {e}", exc_info=True)
+            return False
+        if row is None:
+            return False
+        logger.info(f"Service: Auction {auction_id} chuyển sang chế độ hot (đặt giá trên Redis).")
+        return HotAuctionService.load(row)
+
+    @staticmethod
+    def _state_columns():
+        return (Auction.auction_id, Auction.auction_type, Auction.vehicle_id, Auction.battery_id,
+                Auction.auction_status, Auction.start_time, Auction.end_time, Auction.current_bid,
+                Auction.bidder_id, Auction.winning_bidder_id, Auction.hot_bid_seq)
+
+    @staticmethod
+    def load(auction):
+        """Nạp state của phiên (từ DB) vào Redis nếu Redis chưa có. Trả về False nếu Redis lỗi."""
+        script = HotAuctionService._script('load', _LOAD_SCRIPT)
+        if script is None:
+            return False
+        end_ms = _to_ms(auction.end_time)
+        fields = {
+            'status': auction.auction_status,
+            'start_ms': _to_ms(auction.start_time),
+            'end_ms': end_ms,
+            'seller': auction.bidder_id,
+            'leader': auction.winning_bidder_id or '',
+            'bid_cents': _to_cents(auction.current_bid),
+            # Tiếp tục từ seq đã ghi xuống DB (nạp lại sau khi Redis mất state)
+            'seq': auction.hot_bid_seq or 0,
+            'auction_type': auction.auction_type,
+            'vehicle_id': auction.vehicle_id or '',
+            'battery_id': auction.battery_id or '',
+        }
+        args = [end_ms + KEY_GRACE_MS]
+        for field, value in fields.items():
+            args.extend([field, value])
+        try:
+            script(keys=[_state_key(auction.auction_id)], args=args)
+            return True
+        except redis.exceptions.RedisError as e:
+            logger.warning(f"Không nạp được state hot của auction {auction.auction_id} vào Redis: {e}")
+            return False
+
+    # --- BID ---
+    @staticmethod
+    def try_bid(auction_id, bidder_id, amount, now):
+        """
+        Đặt giá trên Redis. Trả về (outcome, snapshot) với snapshot giống Auction (chỉ các trường
+        dùng để serialize), hoặc None nếu phiên không ở chế độ hot / Redis không dùng được.
+        """
+        script = HotAuctionService._script('bid', _BID_SCRIPT)
+        if script is None:
+            return None
+        try:
+            result = script(
+                keys=[_state_key(auction_id), _bids_key(auction_id), DIRTY_KEY],
+                args=[bidder_id, _to_cents(amount), _to_ms(now), auction_id, KEY_GRACE_MS]
+            )
+        except redis.exceptions.RedisError as e:
+            logger.warning(f"Redis lỗi khi đặt giá hot cho auction {auction_id}: {e}")
+            return None
+        outcome = result[0]
+        if outcome == 'miss':
+            return None
+        state = dict(zip(result[1::2], result[2::2]))
+        return outcome, HotAuctionService._snapshot(auction_id, state)
+
+    @staticmethod
+    def _snapshot(auction_id, state):
+        return SimpleNamespace(
+            auction_id=auction_id,
+            auction_type=state['auction_type'],
+            vehicle_id=int(state['vehicle_id']) if state.get('vehicle_id') else None,
+            battery_id=int(state['battery_id']) if state.get('battery_id') else None,
+            auction_status=state['status'],
+            start_time=_from_ms(state['start_ms']),
+            end_time=_from_ms(state['end_ms']),
+            current_bid=_from_cents(state['bid_cents']),
+            bidder_id=int(state['seller']),
+            winning_bidder_id=int(state['leader']) if state.get('leader') else None,
+            bid_seq=int(state.get('seq', 0)),
+        )
+
+    @staticmethod
+    def current_state(auction_id):
+        """(current_bid, winning_bidder_id) mới nhất trên Redis, hoặc None."""
+        client = HotAuctionService._redis()
+        if client is None:
+            return None
+        try:
+            bid_cents, leader = client.hmget(_state_key(auction_id), 'bid_cents', 'leader')
+        except redis.exceptions.RedisError:
+            return None
+        if bid_cents is None:
+            return None
+        return _from_cents(bid_cents), (int(leader) if leader else None)
+
+    # --- WRITE-BEHIND ---
+    @staticmethod
+    def flush_dirty():
+        """Ghi xuống DB mọi phiên hot có lượt đặt giá chưa ghi. Trả về số lượt đặt giá đã ghi."""
+        client = HotAuctionService._redis()
+        if client is None:
+            return 0
+        try:
+            auction_ids = [int(a) for a in client.smembers(DIRTY_KEY)]
+        except redis.exceptions.RedisError as e:
+            logger.warning(f"Redis lỗi khi đọc danh sách phiên hot cần ghi: {e}")
+            return 0
+        # Phiên đang bị khóa (close() / finalize đang ghi nốt) thì bỏ qua, không chờ
+        _, written = HotAuctionService.flush(auction_ids, skip_locked=True)
+        return written
+
+    @staticmethod
+    def flush(auction_ids, skip_locked=False):
+        """
+        Ghi các lượt đặt giá đang chờ của `auction_ids` trong MỘT transaction.
+        Dòng auctions được khóa FOR UPDATE TRƯỚC khi lấy lượt đặt giá từ Redis nên flush (beat) và
+        close() (finalize) của cùng một phiên không chạy xen nhau. Lượt đặt giá nằm ở list processing
+        cho tới khi commit xong mới bị xóa.
+        Trả về (set id đã ghi xong hoặc không có gì để ghi, số lượt đặt giá đã ghi).
+        """
+        claim = HotAuctionService._script('claim', _CLAIM_SCRIPT)
+        ack = HotAuctionService._script('ack', _ACK_SCRIPT)
+        if claim is None or not auction_ids:
+            return set(), 0
+
+        flushed = set()
+        claimed = []
+        written = 0
+        try:
+            rows = (
+                db.session.query(Auction.auction_id, Auction.auction_status, Auction.current_bid, Auction.hot_bid_seq)
+                .filter(Auction.auction_id.in_(auction_ids))
+                .order_by(Auction.auction_id)
+                .with_for_update(skip_locked=skip_locked)
+                .all()
+            )
+            for row in rows:
+                try:
+                    items = claim(keys=[_bids_key(row.auction_id), _processing_key(row.auction_id), DIRTY_KEY],
+                                  args=[row.auction_id])
+                except redis.exceptions.RedisError as e:
+                    logger.warning(f"Redis lỗi khi lấy lượt đặt giá hot của auction {row.auction_id}: {e}")
+                    continue
+                if not items:
+                    flushed.add(row.auction_id)
+                    continue
+                claimed.append(row.auction_id)
+
+                # Bỏ các lượt đã ghi ở lần flush trước (commit xong nhưng chưa kịp ack)
+                bids = [item.split('|') for item in items]
+                bids = [(int(seq), int(bidder_id), _from_cents(cents), ms)
+                        for seq, bidder_id, cents, ms in bids if int(seq) > (row.hot_bid_seq or 0)]
+                if not bids:
+                    continue
+                if row.auction_status != 'started':
+                    # close() luôn ghi nốt trước khi kết thúc phiên; tới đây là dữ liệu bất thường
+                    logger.error(f"Auction {row.auction_id} đã '{row.auction_status}', bỏ {len(bids)} lượt đặt giá hot: {items}")
+                    continue
+                for _, bidder_id, amount, ms in bids:
+                    db.session.add(Bid(auction_id=row.auction_id, bidder_id=bidder_id, amount=amount, created_at=_from_ms(ms)))
+                # Lượt cuối là giá cao nhất; chỉ ghi đè khi giá tăng và phiên vẫn 'started'
+                last_seq, leader, amount, _ = bids[-1]
+                values = {'hot_bid_seq': last_seq}
+                if amount > row.current_bid:
+                    values.update(current_bid=amount, winning_bidder_id=leader)
+                db.session.execute(
+                    update(Auction)
+                    .where(Auction.auction_id == row.auction_id, Auction.auction_status == 'started')
+                    .values(**values)
+                    .execution_options(synchronize_session=False)
+                )
+                written += len(bids)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            # List processing vẫn còn trên Redis và phiên vẫn trong dirty: lần flush sau ghi lại
+            logger.error(f"Lỗi khi ghi lượt đặt giá hot xuống DB, sẽ thử lại: {e}", exc_info=True)
+            return flushed, 0
+
+        for auction_id in claimed:
+            try:
+                ack(keys=[_processing_key(auction_id), _bids_key(auction_id), DIRTY_KEY], args=[auction_id])
+            except redis.exceptions.RedisError as e:
+                # Đã commit; lần flush sau đọc lại list processing và bỏ qua nhờ hot_bid_seq
+                logger.warning(f"Redis lỗi khi xóa lượt đặt giá hot đã ghi của auction {auction_id}: {e}")
+        return flushed | set(claimed), written
+
+    # --- FINALIZE ---
+    @staticmethod
+    def close(auction_ids):
+        """
+        Trước khi kết thúc các phiên: dừng nhận giá trên Redis và ghi nốt các lượt đặt giá chờ.
+        Trả về set id KHÔNG thể kết thúc lúc này (phiên hot nhưng chưa ghi xong) để lần quét sau thử lại.
+        """
+        hot_ids = [row[0] for row in db.session.query(Auction.auction_id).filter(
+            Auction.auction_id.in_(auction_ids), Auction.is_hot.is_(True)
+        ).all()] if auction_ids else []
+        if not hot_ids:
+            return set()
+        script = HotAuctionService._script('close', _CLOSE_SCRIPT)
+        if script is None:
+            logger.error(f"Không có Redis để ghi nốt các phiên hot {hot_ids}; hoãn kết thúc.")
+            return set(hot_ids)
+        closed, postponed = [], set()
+        for auction_id in hot_ids:
+            try:
+                script(keys=[_state_key(auction_id)])
+                closed.append(auction_id)
+            except redis.exceptions.RedisError as e:
+                # Chỉ hoãn phiên lỗi; các phiên còn lại vẫn kết thúc trong lượt này
+                logger.error(f"Redis lỗi khi đóng phiên hot {auction_id}: {e}")
+                postponed.add(auction_id)
+        if closed:
+            flushed, _ = HotAuctionService.flush(closed)
+            postponed |= set(closed) - flushed
+        return postponed
+
+    @staticmethod
+    def discard(auction_ids):
+        """Xóa state hot trên Redis sau khi phiên đã kết thúc trong DB."""
+        client = HotAuctionService._redis()
+        if client is None or not auction_ids:
+            return
+        try:
+            client.delete(*[_state_key(a) for a in auction_ids], *[_bids_key(a) for a in auction_ids],
+                          *[_processing_key(a) for a in auction_ids])
+        except redis.exceptions.RedisError as e:
+            logger.warning(f"Redis lỗi khi xóa state hot {auction_ids}: {e}")
@@ -0,0 +1,234 @@
+from app import db
+from models.auction_outbox import AuctionOutbox
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone, timedelta
+from requests.adapters import HTTPAdapter
+from sqlalchemy import func, update
+import os
+import random
+import logging
+import requests
+
+logger = logging.getLogger(__name__)
+
+NIFI_LISTENER_URL = os.environ.get('NIFI_LISTENER_URL') # http://nifi:8090/auction-result
+REQUEST_TIMEOUT = (2, 5)  # (connect, read)
+NIFI_CONCURRENCY = int(os.environ.get('NIFI_CONCURRENCY', 8))
+OUTBOX_BATCH_SIZE = int(os.environ.get('AUCTION_OUTBOX_BATCH_SIZE', 100))
+# Bản ghi đã được một relay nhận sẽ bị "giữ chỗ" trong khoảng này; relay chết giữa chừng
+# thì hết hạn giữ chỗ bản ghi tự đến hạn lại (at-least-once).
+OUTBOX_LEASE_SECONDS = 60
+OUTBOX_MAX_ATTEMPTS = int(os.environ.get('AUCTION_OUTBOX_MAX_ATTEMPTS', 10))
+OUTBOX_BACKOFF_BASE = 5      # giây; 5, 10, 20, ... tối đa OUTBOX_BACKOFF_MAX
+OUTBOX_BACKOFF_MAX = 30 * 60
+
+# Session dùng chung: giữ kết nối keep-alive tới NiFi thay vì mở kết nối mới cho mỗi bản ghi
+_nifi_session = requests.Session()
+_nifi_session.mount('http://', HTTPAdapter(pool_connections=1, pool_maxsize=NIFI_CONCURRENCY))
+_nifi_session.mount('https://', HTTPAdapter(pool_connections=1, pool_maxsize=NIFI_CONCURRENCY))
+
+
+def _backoff(attempts):
+    delay = min(OUTBOX_BACKOFF_BASE * (2 ** (attempts - 1)), OUTBOX_BACKOFF_MAX)
+    return timedelta(seconds=delay * random.uniform(0.8, 1.2))
+
+
+class AuctionOutboxService:
+    """
+    Transactional outbox cho kết quả đấu giá gửi NiFi.
+    - enqueue_result(): thêm bản ghi vào session hiện tại; caller commit cùng với việc đổi trạng thái phiên.
+    - relay_pending(): relay worker nhận một lô bản ghi đến hạn (FOR UPDATE SKIP LOCKED),
+      gửi song song kèm header Idempotency-Key, thành công thì 'delivered', lỗi thì hẹn lại
+      theo backoff; quá OUTBOX_MAX_ATTEMPTS lần thì 'failed' (chờ admin gửi lại).
+    """
+
+    @staticmethod
+    def idempotency_key(auction_id):
+        return f"auction-result:{auction_id}"
+
+    @staticmethod
+    def result_payload(auction):
+        return {
+            "auction_id": auction.auction_id,
+            "listing_id": None,
+            "seller_id": auction.bidder_id,
+            "buyer_id": auction.winning_bidder_id,
+            "final_price": float(auction.current_bid)
+        }
+
+    @staticmethod
+    def enqueue_result(auction):
+        """auction: đối tượng/row có auction_id, bidder_id, winning_bidder_id, current_bid. Không commit."""
+        db.session.add(AuctionOutbox(
+            auction_id=auction.auction_id,
+            event_type='auction_result',
+            idempotency_key=AuctionOutboxService.idempotency_key(auction.auction_id),
+            payload=AuctionOutboxService.result_payload(auction),
+        ))
+
+    # --- RELAY ---
+    @staticmethod
+    def claim_due(limit=OUTBOX_BATCH_SIZE):
+        """Nhận tối đa `limit` bản ghi đến hạn và giữ chỗ chúng OUTBOX_LEASE_SECONDS. Trả về list dict."""
+        now = datetime.now(timezone.utc)
+        try:
+            entries = (
+                AuctionOutbox.query
+                .filter(AuctionOutbox.status == 'pending', AuctionOutbox.next_attempt_at <= now)
+                .order_by(AuctionOutbox.next_attempt_at.asc())
+                .limit(limit)
+                .with_for_update(skip_locked=True)
+                .all()
+            )
+            claimed = []
+            for entry in entries:
+                entry.next_attempt_at = now + timedelta(seconds=OUTBOX_LEASE_SECONDS)
+                claimed.append({
+                    'outbox_id': entry.outbox_id,
+                    'idempotency_key': entry.idempotency_key,
+                    'payload': entry.payload,
+                    'attempts': entry.attempts,
+                })
+            db.session.commit()
+            return claimed
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Outbox: Lỗi khi nhận lô bản ghi cần gửi: {e}", exc_info=True)
+            return []
+
+    @staticmethod
+    def deliver(entry):
+        """Gửi một bản ghi tới NiFi (chạy trong thread pool, không đụng tới DB). Trả về (ok, error)."""
+        try:
+            response = _nifi_session.post(
+                NIFI_LISTENER_URL,
+                json=entry['payload'],
+                headers={'Idempotency-Key': entry['idempotency_key']},
+                timeout=REQUEST_TIMEOUT
+            )
+        except requests.exceptions.RequestException as e:
+            return False, f"Lỗi mạng: {e}"
+        if 200 <= response.status_code < 300:
+            return True, None
+        return False, f"HTTP {response.status_code}: {response.text[:200]}"
+
+    @staticmethod
+    def relay_pending(limit=OUTBOX_BATCH_SIZE):
+        """Gửi một lô bản ghi đến hạn. Trả về dict {'claimed', 'delivered', 'retrying', 'failed'}."""
+        result = {'claimed': 0, 'delivered': 0, 'retrying': 0, 'failed': 0}
+        if not NIFI_LISTENER_URL:
+            logger.error("Outbox: NIFI_LISTENER_URL chưa được cấu hình! Không thể gửi dữ liệu đến NiFi.")
+            return result
+        entries = AuctionOutboxService.claim_due(limit)
+        if not entries:
+            return result
+        result['claimed'] = len(entries)
+
+        with ThreadPoolExecutor(max_workers=min(NIFI_CONCURRENCY, len(entries))) as executor:
+            outcomes = list(executor.map(AuctionOutboxService.deliver, entries))
+
+        now = datetime.now(timezone.utc)
+        delivered_ids = [e['outbox_id'] for e, (ok, _) in zip(entries, outcomes) if ok]
+        try:
+            if delivered_ids:
+                db.session.execute(
+                    update(AuctionOutbox)
+                    .where(AuctionOutbox.outbox_id.in_(delivered_ids))
+                    .values(status='delivered', delivered_at=now, last_error=None,
+                            attempts=AuctionOutbox.attempts + 1)
+                    .execution_options(synchronize_session=False)
+                )
+                result['delivered'] = len(delivered_ids)
+
+            for entry, (ok, error) in zip(entries, outcomes):
+                if ok:
+                    continue
+                attempts = entry['attempts'] + 1
+                give_up = attempts >= OUTBOX_MAX_ATTEMPTS
+                db.session.execute(
+                    update(AuctionOutbox)
+                    .where(AuctionOutbox.outbox_id == entry['outbox_id'])
+                    .values(
+                        status='failed' if give_up else 'pending',
+                        attempts=attempts,
+                        next_attempt_at=now + _backoff(attempts),
+                        last_error=error
+                    )
+                    .execution_options(synchronize_session=False)
+                )
+                result['failed' if give_up else 'retrying'] += 1
+                logger.warning(f"Outbox: Gửi {entry['idempotency_key']} thất bại (lần {attempts}): {error}")
+            db.session.commit()
+        except Exception as e:
+            # Không ghi được kết quả: hết hạn giữ chỗ bản ghi sẽ được gửi lại (bên nhận bỏ trùng theo key)
+            db.session.rollback()
+            logger.error(f"Outbox: Lỗi khi ghi kết quả gửi: {e}", exc_info=True)
+        return result
+
+    # --- DASHBOARD ---
+    @staticmethod
+    def get_stats(failed_limit=20):
+        """Số bản ghi theo trạng thái, độ trễ của bản ghi pending cũ nhất và các bản ghi lỗi gần nhất."""
+        counts = dict(
+            db.session.query(AuctionOutbox.status, func.count(AuctionOutbox.outbox_id))
+            .group_by(AuctionOutbox.status).all()
+        )
+        oldest_pending = (
+            db.session.query(func.min(AuctionOutbox.created_at))
+            .filter(AuctionOutbox.status == 'pending').scalar()
+        )
+        lag_seconds = None
+        if oldest_pending is not None:
+            if oldest_pending.tzinfo is None:
+                oldest_pending = oldest_pending.replace(tzinfo=timezone.utc)
+            lag_seconds = round((datetime.now(timezone.utc) - oldest_pending).total_seconds(), 1)
+        failed = (
+            AuctionOutbox.query.filter(AuctionOutbox.status == 'failed')
+            .order_by(AuctionOutbox.outbox_id.desc()).limit(failed_limit).all()
+        )
+        retrying = (
+            db.session.query(func.count(AuctionOutbox.outbox_id))
+            .filter(AuctionOutbox.status == 'pending', AuctionOutbox.attempts > 0).scalar()
+        )
+        return {
+            'pending': counts.get('pending', 0),
+            'retrying': retrying,
+            'delivered': counts.get('delivered', 0),
+            'failed': counts.get('failed', 0),
+            'oldest_pending_age_seconds': lag_seconds,
+            'recent_failures': [AuctionOutboxService.serialize(e) for e in failed],
+        }
+
+    @staticmethod
+    def retry(outbox_id):
+        """Admin gửi lại một bản ghi 'failed'."""
+        entry = db.session.get(AuctionOutbox, outbox_id)
+        if not entry:
+            return None, "Không tìm thấy bản ghi outbox."
+        if entry.status != 'failed':
+            return None, f"Bản ghi đang ở trạng thái {entry.status}, không cần gửi lại."
+        try:
+            entry.status = 'pending'
+            entry.attempts = 0
+            entry.next_attempt_at = datetime.now(timezone.utc)
+            db.session.commit()
+            return entry, "Đã đưa bản ghi vào hàng đợi gửi lại."
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Outbox: Lỗi khi gửi lại bản ghi {outbox_id}: {e}", exc_info=True)
+            return None, f"Lỗi khi gửi lại bản ghi: {e}"
+
+    @staticmethod
+    def serialize(entry):
+        return {
+            'outbox_id': entry.outbox_id,
+            'auction_id': entry.auction_id,
+            'event_type': entry.event_type,
+            'idempotency_key': entry.idempotency_key,
+            'status': entry.status,
+            'attempts': entry.attempts,
+            'next_attempt_at': entry.next_attempt_at.isoformat() if entry.next_attempt_at else None,
+            'last_error': entry.last_error,
+            'created_at': entry.created_at.isoformat() if entry.created_at else None,
+            'delivered_at': entry.delivered_at.isoformat() if entry.delivered_at else None,
+        }
@@ -0,0 +1,111 @@
+from models.auction import Auction
+from celery import Celery
+from datetime import datetime, timezone, timedelta
+import os
+import logging
+import redis
+
+logger = logging.getLogger(__name__)
+
+# Chỉ đặt ETA task cho các mốc trong khoảng này; mốc xa hơn sẽ được reconciler (beat mỗi phút)
+# đặt khi tới gần. Phải nhỏ hơn visibility_timeout của broker Redis (mặc định 1 giờ),
+# nếu không task có ETA sẽ bị giao lại.
+SCHEDULE_HORIZON_SECONDS = int(os.getenv('AUCTION_SCHEDULE_HORIZON', 900))
+TIMER_KEY_PREFIX = 'auction-timer'
+
+START_TASK = 'tasks.start_auction'
+FINALIZE_TASK = 'tasks.finalize_auction'
+
+# Producer nhẹ, chỉ dùng để gửi task theo tên (không import celery_app/tasks để tránh dựng thêm Flask app).
+_producer = Celery(
+    'auction-scheduler',
+    broker=os.environ.get('CELERY_BROKER_URL', 'redis://redis:6379/0'),
+)
+
+
+def _as_utc(dt):
+    if dt.tzinfo is None:
+        return dt.replace(tzinfo=timezone.utc)
+    return dt.astimezone(timezone.utc)
+
+
+class AuctionScheduler:
+    """
+    Hẹn giờ chính xác cho việc bắt đầu / kết thúc phiên đấu giá bằng Celery ETA task.
+    Task mang theo mốc thời gian mong đợi; nếu phiên đã bị đổi giờ thì task cũ tự bỏ qua.
+    """
+
+    @staticmethod
+    def _redis():
+        from app import redis_client
+        return redis_client
+
+    @staticmethod
+    def schedule(auction):
+        """Đặt hẹn giờ cho phiên vừa được duyệt / đổi giờ (gọi SAU khi commit)."""
+        if auction.auction_status == 'prepare':
+            AuctionScheduler.schedule_timer(START_TASK, auction.auction_id, auction.start_time)
+        if auction.auction_status in ('prepare', 'started'):
+            AuctionScheduler.schedule_timer(FINALIZE_TASK, auction.auction_id, auction.end_time)
+
+    @staticmethod
+    def schedule_timer(task_name, auction_id, when):
+        """
+        Gửi ETA task nếu mốc nằm trong SCHEDULE_HORIZON_SECONDS. Trả về True nếu đã gửi.
+        Mỗi (task, auction, mốc) chỉ được gửi một lần nhờ khóa SET NX trên Redis.
+        """
+        when = _as_utc(when)
+        now = datetime.now(timezone.utc)
+        if when - now > timedelta(seconds=SCHEDULE_HORIZON_SECONDS):
+            return False
+
+        client = AuctionScheduler._redis()
+        key = f"{TIMER_KEY_PREFIX}:{task_name}:{auction_id}:{int(when.timestamp())}"
+        locked = False
+        if client is not None:
+            try:
+                if not client.set(key, 1, nx=True, ex=SCHEDULE_HORIZON_SECONDS * 2):
+                    return False
+                locked = True
+            except redis.exceptions.RedisError as e:
+                logger.warning(f"Không kiểm tra được khóa hẹn giờ {key}: {e}")
+
+        try:
+            _producer.send_task(task_name, args=[auction_id, when.isoformat()], eta=max(when, now), retry=False)
+            logger.info(f"Scheduler: Hẹn {task_name} cho auction {auction_id} lúc {when.isoformat()}.")
+            return True
+        except Exception as e:
+            # Broker lỗi: nhả khóa để lần gọi sau (reconciler / lần duyệt kế tiếp) gửi lại ngay
+            logger.warning(f"Scheduler: Không gửi được {task_name} cho auction {auction_id}: {e}")
+            if locked:
+                try:
+                    client.delete(key)
+                except redis.exceptions.RedisError as re:
+                    logger.warning(f"Không nhả được khóa hẹn giờ {key}: {re}")
+            return False
+
+    @staticmethod
+    def schedule_upcoming():
+        """
+        Reconciler: hẹn giờ cho các phiên có mốc bắt đầu/kết thúc sắp tới (trong horizon).
+        Dùng các partial index ix_auctions_prepare_start_time / ix_auctions_active_end_time.
+        """
+        now = datetime.now(timezone.utc)
+        horizon = now + timedelta(seconds=SCHEDULE_HORIZON_SECONDS)
+        scheduled = 0
+        starting = Auction.query.with_entities(Auction.auction_id, Auction.start_time).filter(
+            Auction.auction_status == 'prepare',
+            Auction.start_time > now,
+            Auction.start_time <= horizon
+        ).all()
+        for auction_id, start_time in starting:
+            scheduled += AuctionScheduler.schedule_timer(START_TASK, auction_id, start_time)
+
+        ending = Auction.query.with_entities(Auction.auction_id, Auction.end_time).filter(
+            Auction.auction_status.in_(['prepare', 'started']),
+            Auction.end_time > now,
+            Auction.end_time <= horizon
+        ).all()
+        for auction_id, end_time in ending:
+            scheduled += AuctionScheduler.schedule_timer(FINALIZE_TASK, auction_id, end_time)
+        return scheduled
@@ -1,17 +1,94 @@
 from celery_app import celery_app
 from services.auction_service import AuctionService
+from services.scheduler_service import AuctionScheduler
+from services.outbox_service import AuctionOutboxService, OUTBOX_BATCH_SIZE
+from services.hot_auction_service import HotAuctionService
+from datetime import datetime, timezone
+from dateutil import parser
 import logging
-import requests
 import os
 
 logger = logging.getLogger(__name__)
 
-# Đọc URL của NiFi (Luồng 1)
-NIFI_LISTENER_URL = os.environ.get('NIFI_LISTENER_URL') # http://nifi:8090/auction-result
-REQUEST_TIMEOUT = 5
+# Số phiên tối đa được kết thúc trong một lần quét; phần còn lại lấy ở lần quét kế tiếp.
+FINALIZE_BATCH_SIZE = int(os.environ.get('AUCTION_FINALIZE_BATCH_SIZE', 500))
+
+
+def _finalize_auctions(auctions):
+    """
+    Kết thúc các phiên đã tới giờ (một UPDATE) và ghi kết quả vào outbox cùng transaction;
+    việc gửi NiFi do relay_auction_outbox đảm nhận nên lần quét không phải chờ mạng.
+    Trả về số phiên đã kết thúc.
+    """
+    ended_count, queued_count = AuctionService.finalize_auctions([a.auction_id for a in auctions])
+    if queued_count:
+        relay_auction_outbox.delay()
+    return ended_count
+
+
+def _seconds_until(expected):
+    return (expected - datetime.now(timezone.utc)).total_seconds()
+
+
+@celery_app.task(name='tasks.start_auction', bind=True, max_retries=3)
+def start_auction(self, auction_id, expected_start):
+    """ETA task: bắt đầu phiên đúng start_time (được hẹn bởi AuctionScheduler)."""
+    expected = parser.isoparse(expected_start)
+    remaining = _seconds_until(expected)
+    if remaining > 0:
+        # Worker nhận task sớm vài ms (lệch đồng hồ): chờ đúng mốc
+        raise self.retry(countdown=remaining)
+    return AuctionService.start_auction_if_due(auction_id, expected)
+
+
+@celery_app.task(name='tasks.finalize_auction', bind=True, max_retries=3)
+def finalize_auction(self, auction_id, expected_end):
+    """ETA task: kết thúc phiên đúng end_time; kết quả được gửi NiFi qua outbox."""
+    expected = parser.isoparse(expected_end)
+    remaining = _seconds_until(expected)
+    if remaining > 0:
+        raise self.retry(countdown=remaining)
+    auction = AuctionService.get_auction_to_finalize(auction_id, expected)
+    if not auction:
+        return False
+    return _finalize_auctions([auction]) == 1
+
+
+@celery_app.task(name='tasks.relay_auction_outbox')
+def relay_auction_outbox():
+    """
+    Relay outbox: gửi các kết quả đấu giá đang chờ tới NiFi theo lô cho tới khi hết bản ghi đến hạn.
+    Chạy định kỳ bởi beat và được kích hoạt ngay khi có phiên vừa kết thúc.
+    """
+    totals = {'claimed': 0, 'delivered': 0, 'retrying': 0, 'failed': 0}
+    while True:
+        result = AuctionOutboxService.relay_pending()
+        for key in totals:
+            totals[key] += result[key]
+        # Hết bản ghi đến hạn, hoặc NiFi đang lỗi (để backoff xử lý, không quay vòng liên tục)
+        if result['claimed'] < OUTBOX_BATCH_SIZE or not result['delivered']:
+            break
+    if totals['claimed']:
+        logger.info(f"Celery Task: Outbox relay: {totals}")
+    return totals
+
+
+@celery_app.task(name='tasks.flush_hot_auctions')
+def flush_hot_auctions():
+    """Write-behind: ghi các lượt đặt giá của phiên hot từ Redis xuống Postgres."""
+    written = HotAuctionService.flush_dirty()
+    if written:
+        logger.info(f"Celery Task: Đã ghi {written} lượt đặt giá hot xuống DB.")
+    return written
+
 
 @celery_app.task(name='tasks.run_auction_tasks')
 def run_auction_tasks():
+    """
+    Reconciler (beat mỗi phút): các phiên bình thường đã được bắt đầu/kết thúc đúng giờ bởi
+    ETA task; lần quét này chỉ bắt các phiên bị lỡ (worker/broker lỗi) và hẹn giờ cho các
+    phiên sắp tới mốc.
+    """
     
     # --- PHẦN 1: TỰ ĐỘNG BẮT ĐẦU (An toàn) ---
     logger.info("Celery Task: Đang chạy auto_start_auctions...")
@@ -20,67 +97,27 @@ def run_auction_tasks():
         logger.info(f"Celery Task: Đã bắt đầu {started_count} phiên đấu giá.")
     except Exception as e:
         logger.error(f"Celery Task: Lỗi khi chạy auto_start_auctions: {e}", exc_info=True)
+
+    # --- HẸN GIỜ CHO CÁC PHIÊN SẮP TỚI MỐC (ETA task) ---
+    try:
+        scheduled = AuctionScheduler.schedule_upcoming()
+        logger.info(f"Celery Task: Đã hẹn giờ {scheduled} mốc bắt đầu/kết thúc sắp tới.")
+    except Exception as e:
+        logger.error(f"Celery Task: Lỗi khi hẹn giờ các phiên sắp tới: {e}", exc_info=True)
     
     
-    # --- PHẦN 2: TỰ ĐỘNG KẾT THÚC (Gọi NiFi) ---
-    logger.info("Celery Task: Đang chạy auto_finalize_auctions (Gửi đến NiFi)...")
-
-    if not NIFI_LISTENER_URL:
-        logger.error("Celery Task: NIFI_LISTENER_URL chưa được cấu hình! Không thể gửi dữ liệu đến NiFi.")
-        return "Lỗi: NIFI_LISTENER_URL chưa được cấu hình."
-        
+    # --- PHẦN 2: TỰ ĐỘNG KẾT THÚC (ghi outbox, relay gửi NiFi) ---
+    logger.info("Celery Task: Đang chạy auto_finalize_auctions...")
     try:
         # 1. Lấy danh sách auction đã đến giờ kết thúc
-        ended_auctions = AuctionService.get_auctions_to_finalize()
+        ended_auctions = AuctionService.get_auctions_to_finalize(limit=FINALIZE_BATCH_SIZE)
         if not ended_auctions:
             logger.info("Celery Task: Không có phiên đấu giá nào cần kết thúc.")
             return "Không có phiên đấu giá để kết thúc."
 
-        logger.info(f"Celery Task: Tìm thấy {len(ended_auctions)} phiên đấu giá. Đang gửi đến NiFi...")
-        
-        success_count = 0
-        fail_count = 0
-
-        for auction in ended_auctions:
-            try:
-                # Nếu không có người thắng, chỉ cần đóng lại
-                if not auction.winning_bidder_id:
-                    logger.info(f"Celery Task: Đóng phiên đấu giá {auction.auction_id} (không có người thắng).")
-                    AuctionService.update_auction_status(auction.auction_id, 'ended')
-                    success_count += 1
-                    continue # Sang phiên đấu giá tiếp theo
-
-                # Nếu có người thắng, chuẩn bị payload để gửi NiFi
-                payload = {
-                    "auction_id": auction.auction_id,
-                    "listing_id": None, 
-                    "seller_id": auction.bidder_id,
-                    "buyer_id": auction.winning_bidder_id,
-                    "final_price": float(auction.current_bid)
-                }
-                
-                # 2. Gửi payload đến NiFi ListenHTTP (cổng 8090)
-                response = requests.post(
-                    NIFI_LISTENER_URL,
-                    json=payload,
-                    timeout=REQUEST_TIMEOUT
-                )
-                
-                if 200 <= response.status_code < 300:
-                    logger.info(f"Celery Task: Đã gửi thành công auction {auction.auction_id} đến NiFi.")
-                    # 3. Cập nhật trạng thái 'ended' CHỈ KHI NiFi đã nhận
-                    AuctionService.update_auction_status(auction.auction_id, 'ended')
-                    success_count += 1
-                else:
-                    logger.error(f"Celery Task: Gửi auction {auction.auction_id} đến NiFi thất bại. Status: {response.status_code}")
-                    fail_count += 1
-            
-            except requests.exceptions.RequestException as e:
-                logger.error(f"Celery Task: Lỗi mạng khi gửi auction {auction.auction_id} đến NiFi: {e}")
-                fail_count += 1
-                
-        logger.info(f"Celery Task: Hoàn tất tác vụ kết thúc. Thành công: {success_count}, Thất bại (chưa gửi): {fail_count}.")
+        ended_count = _finalize_auctions(ended_auctions)
+        logger.info(f"Celery Task: Đã kết thúc {ended_count}/{len(ended_auctions)} phiên đấu giá (kết quả gửi NiFi qua outbox).")
         
     except Exception as e:
         logger.error(f"Celery Task: Lỗi nghiêm trọng trong phần auto_finalize_auctions: {e}", exc_info=True)
-        return "Lỗi nghiêm trọng"
\ No newline at end of file
+        return "Lỗi nghiêm trọng"
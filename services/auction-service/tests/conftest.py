@@ -0,0 +1,80 @@
+import os
+import sys
+
+import pytest
+
+SERVICE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SERVICE_DIR)
+
+# Không dùng Redis / chế độ hot khi test: sự kiện đặt giá phát trong tiến trình
+os.environ.setdefault('REDIS_URL', 'redis://127.0.0.1:1')
+os.environ['AUCTION_HOT_MODE'] = 'false'
+
+
+@pytest.fixture
+def app(tmp_path):
+    """
+    App với DB riêng cho mỗi test. Mặc định SQLite (file, để nhiều thread dùng chung);
+    đặt TEST_DATABASE_URL=postgresql://... để chạy trên Postgres như môi trường thật.
+    """
+    os.environ['DATABASE_URL'] = os.getenv('TEST_DATABASE_URL') or f"sqlite:///{tmp_path / 'auction_test.db'}"
+    from app import create_app, db
+
+    app = create_app()
+    if app.config['SQLALCHEMY_DATABASE_URI'].startswith('sqlite'):
+        app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {'connect_args': {'timeout': 30}}
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+class _StubReceiver:
+    """
+    HTTP stub đóng vai NiFi ListenHTTP, chạy trên thread riêng (werkzeug, port 0).
+    `responses`: list (status, delay giây) trả lần lượt cho từng request; hết list thì trả `default`.
+    `requests`: các request đã nhận (json, Idempotency-Key).
+    """
+
+    def __init__(self):
+        import threading
+        from werkzeug.serving import make_server
+        from werkzeug.wrappers import Request, Response
+
+        self.responses = []
+        self.default = (200, 0)
+        self.requests = []
+        self._lock = threading.Lock()
+
+        @Request.application
+        def application(request):
+            import time
+            with self._lock:
+                self.requests.append({'json': request.get_json(silent=True),
+                                      'idempotency_key': request.headers.get('Idempotency-Key')})
+                status, delay = self.responses.pop(0) if self.responses else self.default
+            if delay:
+                time.sleep(delay)
+            return Response('ok' if status < 300 else 'stub error', status=status)
+
+        self._server = make_server('127.0.0.1', 0, application, threaded=True)
+        self.url = f"http://127.0.0.1:{self._server.server_port}/auction-result"
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+
+    def close(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+@pytest.fixture
+def nifi_stub(monkeypatch):
+    """Stub NiFi cục bộ; outbox relay được trỏ tới nó với read timeout ngắn."""
+    import services.outbox_service as outbox_service
+
+    stub = _StubReceiver()
+    monkeypatch.setattr(outbox_service, 'NIFI_LISTENER_URL', stub.url)
+    monkeypatch.setattr(outbox_service, 'REQUEST_TIMEOUT', (1, 0.3))
+    yield stub
+    stub.close()
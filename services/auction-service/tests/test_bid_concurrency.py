@@ -0,0 +1,90 @@
+import itertools
+import os
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app import db
+from models.auction import Auction
+from models.bid import Bid
+from services.auction_service import AuctionService, BID_ACCEPTED
+
+THREADS = 16
+BIDS_PER_THREAD = 25
+# Ngưỡng tối thiểu cho một phiên nóng trên Postgres (khóa dòng); SQLite khóa cả file nên không đo được
+MIN_BIDS_PER_SECOND = float(os.environ.get('TEST_MIN_BIDS_PER_SECOND', '200'))
+
+pytestmark = pytest.mark.skipif(
+    not os.environ.get('TEST_DATABASE_URL', '').startswith('postgresql'),
+    reason="Cần TEST_DATABASE_URL trỏ tới Postgres để kiểm tra khóa dòng và thông lượng"
+)
+
+
+def _started_auction():
+    now = datetime.now(timezone.utc)
+    auction = Auction(
+        bidder_id=1, vehicle_id=5, auction_type='vehicle', auction_status='started',
+        start_time=now - timedelta(minutes=1), end_time=now + timedelta(hours=1), current_bid=10
+    )
+    db.session.add(auction)
+    db.session.commit()
+    return auction.auction_id
+
+
+def test_concurrent_bids_lose_no_updates(app):
+    """Nhiều thread đặt giá cùng lúc trên MỘT phiên: giá cuối = giá cao nhất được chấp nhận, không mất lượt nào."""
+    auction_id = _started_auction()
+    accepted = []
+    outcomes = {}
+    errors = []
+    lock = threading.Lock()
+    start = threading.Barrier(THREADS)
+    # Giá tăng dần dùng chung giữa các thread: phần lớn lượt đặt giá tranh nhau ghi cùng một dòng
+    amounts = itertools.count(11)
+
+    def bidder(bidder_id):
+        try:
+            with app.app_context():
+                start.wait()
+                for _ in range(BIDS_PER_THREAD):
+                    with lock:
+                        amount = next(amounts)
+                    outcome, _, _ = AuctionService.submit_bid(auction_id, bidder_id, amount)
+                    with lock:
+                        outcomes[outcome] = outcomes.get(outcome, 0) + 1
+                        if outcome == BID_ACCEPTED:
+                            accepted.append(amount)
+                db.session.remove()
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=bidder, args=(bidder_id,)) for bidder_id in range(2, 2 + THREADS)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    assert not errors
+    assert sum(outcomes.values()) == THREADS * BIDS_PER_THREAD
+    assert 'error' not in outcomes, outcomes
+    assert accepted
+
+    db.session.expire_all()
+    auction = db.session.get(Auction, auction_id)
+    bids = Bid.query.filter_by(auction_id=auction_id).order_by(Bid.bid_id).all()
+
+    assert auction.current_bid == max(accepted)
+    assert len(bids) == len(accepted)
+    assert sorted(float(b.amount) for b in bids) == sorted(float(a) for a in accepted)
+    # Mỗi lượt được chấp nhận phải cao hơn lượt trước đó: không có lượt nào ghi đè giá cao hơn
+    history = [b.amount for b in bids]
+    assert history == sorted(history) and len(set(history)) == len(history)
+    assert auction.winning_bidder_id == bids[-1].bidder_id
+
+    throughput = THREADS * BIDS_PER_THREAD / elapsed
+    assert throughput >= MIN_BIDS_PER_SECOND, f"{throughput:.0f} bids/s < {MIN_BIDS_PER_SECOND:.0f}"
+
@@ -0,0 +1,45 @@
+from datetime import datetime, timedelta, timezone
+
+import redis
+
+from app import db
+from models.auction import Auction
+from services.auction_service import AuctionService, BID_ACCEPTED
+from services.hot_auction_service import HotAuctionService
+
+
+def _auction(vehicle_id, ended=False, is_hot=False):
+    now = datetime.now(timezone.utc)
+    auction = Auction(
+        bidder_id=1, vehicle_id=vehicle_id, auction_type='vehicle', auction_status='started', is_hot=is_hot,
+        start_time=now - timedelta(hours=1), end_time=now - timedelta(seconds=1) if ended else now + timedelta(hours=1),
+        current_bid=100, winning_bidder_id=2
+    )
+    db.session.add(auction)
+    db.session.commit()
+    return auction.auction_id
+
+
+def test_bid_skips_redis_when_hot_mode_is_off(app, monkeypatch):
+    def no_redis(*args, **kwargs):
+        raise AssertionError("Không được gọi Redis khi tắt hot mode")
+
+    monkeypatch.setattr(HotAuctionService, 'try_bid', no_redis)
+    auction_id = _auction(1)
+    outcome, auction, _ = AuctionService.submit_bid(auction_id, 3, 150)
+    assert outcome == BID_ACCEPTED and auction.current_bid == 150
+
+
+def test_finalize_keeps_going_when_closing_hot_auctions_fails(app, monkeypatch):
+    def broken_close(auction_ids):
+        raise redis.exceptions.ConnectionError("redis down")
+
+    monkeypatch.setattr(HotAuctionService, 'close', broken_close)
+    cold = [_auction(10, ended=True), _auction(11, ended=True)]
+    hot = _auction(12, ended=True, is_hot=True)
+
+    # Phiên thường vẫn kết thúc; phiên hot chờ lượt quét sau
+    assert AuctionService.finalize_auctions(cold + [hot]) == (2, 2)
+    db.session.expire_all()
+    assert {a: db.session.get(Auction, a).auction_status for a in cold + [hot]} == {
+        cold[0]: 'ended', cold[1]: 'ended', hot: 'started'}
@@ -0,0 +1,110 @@
+from datetime import datetime, timedelta, timezone
+
+import services.outbox_service as outbox_service
+from app import db
+from models.auction import Auction
+from models.auction_outbox import AuctionOutbox
+from services.auction_service import AuctionService
+from services.outbox_service import AuctionOutboxService
+
+
+def _ended_auctions(count, with_winner=True):
+    now = datetime.now(timezone.utc)
+    ids = []
+    for i in range(count):
+        auction = Auction(
+            bidder_id=1, vehicle_id=100 + len(ids) + (0 if with_winner else 1000), auction_type='vehicle',
+            auction_status='started', start_time=now - timedelta(hours=1), end_time=now - timedelta(seconds=1),
+            current_bid=1000 + i, winning_bidder_id=(50 + i) if with_winner else None
+        )
+        db.session.add(auction)
+        db.session.flush()
+        ids.append(auction.auction_id)
+    db.session.commit()
+    return ids
+
+
+def _make_due():
+    """Bỏ qua backoff: mọi bản ghi pending đến hạn ngay."""
+    AuctionOutbox.query.filter_by(status='pending').update({'next_attempt_at': datetime.now(timezone.utc) - timedelta(seconds=1)})
+    db.session.commit()
+
+
+def test_finalize_writes_outbox_and_relay_delivers(app, nifi_stub):
+    winners = _ended_auctions(12)
+    no_winner = _ended_auctions(3, with_winner=False)
+
+    assert AuctionService.finalize_auctions(winners + no_winner) == (15, 12)
+    # Chạy lại (tiến trình khác đã kết thúc các phiên này): không kết thúc lại, không ghi outbox trùng
+    assert AuctionService.finalize_auctions(winners + no_winner) == (0, 0)
+    assert {a.auction_status for a in Auction.query.all()} == {'ended'}
+
+    result = AuctionOutboxService.relay_pending()
+    assert result == {'claimed': 12, 'delivered': 12, 'retrying': 0, 'failed': 0}
+
+    received = {r['idempotency_key']: r['json'] for r in nifi_stub.requests}
+    assert set(received) == {AuctionOutboxService.idempotency_key(a) for a in winners}
+    first = received[AuctionOutboxService.idempotency_key(winners[0])]
+    assert first['buyer_id'] == 50 and first['final_price'] == 1000.0
+
+    db.session.expire_all()
+    rows = AuctionOutbox.query.all()
+    assert {r.status for r in rows} == {'delivered'}
+    assert all(r.attempts == 1 and r.delivered_at is not None for r in rows)
+    # Không còn gì đến hạn
+    assert AuctionOutboxService.relay_pending()['claimed'] == 0
+
+
+def test_relay_retries_on_5xx_then_delivers(app, nifi_stub):
+    auction_id = _ended_auctions(1)[0]
+    AuctionService.finalize_auctions([auction_id])
+
+    nifi_stub.responses = [(503, 0)]
+    assert AuctionOutboxService.relay_pending() == {'claimed': 1, 'delivered': 0, 'retrying': 1, 'failed': 0}
+    db.session.expire_all()
+    entry = AuctionOutbox.query.one()
+    assert entry.status == 'pending' and entry.attempts == 1 and 'HTTP 503' in entry.last_error
+    next_attempt = entry.next_attempt_at.replace(tzinfo=timezone.utc)
+    assert next_attempt > datetime.now(timezone.utc)
+    # Đang backoff: chưa gửi lại
+    assert AuctionOutboxService.relay_pending()['claimed'] == 0
+
+    _make_due()
+    assert AuctionOutboxService.relay_pending()['delivered'] == 1
+    db.session.expire_all()
+    entry = AuctionOutbox.query.one()
+    assert entry.status == 'delivered' and entry.attempts == 2 and entry.last_error is None
+    # Cả hai lần gửi cùng Idempotency-Key để NiFi bỏ trùng
+    assert [r['idempotency_key'] for r in nifi_stub.requests] == [entry.idempotency_key] * 2
+
+
+def test_relay_treats_timeout_as_retryable(app, nifi_stub):
+    auction_id = _ended_auctions(1)[0]
+    AuctionService.finalize_auctions([auction_id])
+
+    nifi_stub.responses = [(200, 1.0)]  # chậm hơn read timeout 0.3s
+    assert AuctionOutboxService.relay_pending()['retrying'] == 1
+    db.session.expire_all()
+    entry = AuctionOutbox.query.one()
+    assert entry.status == 'pending' and entry.last_error.startswith('Lỗi mạng')
+
+
+def test_relay_marks_failed_after_max_attempts(app, nifi_stub, monkeypatch):
+    monkeypatch.setattr(outbox_service, 'OUTBOX_MAX_ATTEMPTS', 2)
+    auction_id = _ended_auctions(1)[0]
+    AuctionService.finalize_auctions([auction_id])
+    nifi_stub.default = (500, 0)
+
+    assert AuctionOutboxService.relay_pending()['retrying'] == 1
+    _make_due()
+    assert AuctionOutboxService.relay_pending()['failed'] == 1
+    db.session.expire_all()
+    entry = AuctionOutbox.query.one()
+    assert entry.status == 'failed' and entry.attempts == 2
+    _make_due()
+    assert AuctionOutboxService.relay_pending()['claimed'] == 0
+
+    # Admin gửi lại sau khi NiFi hoạt động trở lại
+    nifi_stub.default = (200, 0)
+    AuctionOutboxService.retry(entry.outbox_id)
+    assert AuctionOutboxService.relay_pending()['delivered'] == 1
@@ -6,12 +6,14 @@ from flask_migrate import Migrate
 from flask_cors import CORS
 from dotenv import load_dotenv
 from flask_jwt_extended import JWTManager
+import redis
 
 load_dotenv()
 
 db = SQLAlchemy()
 migrate = Migrate(version_table='alembic_version_listings')
 jwt = JWTManager()
+redis_client = None
  
 from models.vehicle import Vehicle
 from models.battery import Battery
@@ -33,11 +35,74 @@ def create_app():
     migrate.init_app(app, db)
     jwt.init_app(app)
 
+    global redis_client
+    redis_url = os.getenv("REDIS_URL", "redis://redis:6379")
+    try:
+        client = redis.from_url(redis_url, socket_timeout=0.2, socket_connect_timeout=0.2)
+        client.ping()
+        redis_client = client
+        print(">>> Listing Service: Successfully connected to Redis.")
+    except redis.exceptions.RedisError as e:
+        redis_client = None
+        print(f">>> Listing Service: Could not connect to Redis, using in-process cache: {e}")
+
+    from services.image_service import ImageService
+    ImageService.init_app(app)
+
     from controllers.listing_controller import api_bp
     from controllers.internal_controller import internal_bp
     app.register_blueprint(api_bp)
     app.register_blueprint(internal_bp)
 
+    @app.cli.command("search-reindex")
+    def search_reindex_command():
+        """Tạo extension pg_trgm và tính lại search_vector cho các tin đăng đã có."""
+        from sqlalchemy import inspect
+        from services.search_service import SearchService
+
+        SearchService.ensure_extensions()
+        if not inspect(db.engine).has_table('listings'):
+            print("Bảng listings chưa tồn tại, bỏ qua reindex (chạy lại sau 'flask db upgrade').")
+            return
+        count = SearchService.reindex_all()
+        print(f"Đã reindex search_vector cho {count} tin đăng.")
+
+    @app.cli.command("image-renditions")
+    def image_renditions_command():
+        """Tạo bản thu nhỏ (thumb/medium) cho các ảnh tin đăng được upload trước khi có pipeline ảnh."""
+        from services.image_service import ImageService
+
+        count = ImageService.backfill_renditions(app.config['UPLOAD_FOLDER'])
+        print(f"Đã tạo bản thu nhỏ cho {count} ảnh.")
+
+    @app.cli.command("image-gc")
+    def image_gc_command():
+        """Xóa file ảnh không còn tin đăng nào tham chiếu (chạy định kỳ, vd. cron mỗi giờ)."""
+        from services.image_service import ImageService
+
+        count = ImageService.sweep_unreferenced(app.config['UPLOAD_FOLDER'])
+        print(f"Đã xóa {count} file ảnh không còn được dùng.")
+
+    @app.cli.command("listings-backfill-created-at")
+    def listings_backfill_created_at_command():
+        """Điền created_at cho tin đăng cũ còn NULL (chạy trước khi upgrade cột sang NOT NULL)."""
+        from sqlalchemy import inspect
+        from services.listing_service import ListingService
+
+        if not inspect(db.engine).has_table('listings'):
+            print("Bảng listings chưa tồn tại, không cần backfill.")
+            return
+        count = ListingService.backfill_created_at()
+        print(f"Đã điền created_at cho {count} tin đăng.")
+
+    @app.cli.command("watchers-recount")
+    def watchers_recount_command():
+        """Tính lại watcher_count của mọi tin đăng từ bảng watchlist."""
+        from services.listing_service import ListingService
+
+        count = ListingService.recount_watchers()
+        print(f"Đã cập nhật watcher_count cho {count} tin đăng.")
+
     @app.errorhandler(500)
     def handle_internal_server_error(e):
         traceback.print_exc()
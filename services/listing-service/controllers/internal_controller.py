@@ -4,6 +4,7 @@ from flask import Blueprint, jsonify, request, current_app
 import os
 import logging 
 from services.listing_service import ListingService 
+from services.cache_service import CacheService
 from .listing_controller import serialize_listing  
 
 internal_bp = Blueprint('internal_api', __name__, url_prefix='/internal')
@@ -37,22 +38,34 @@ def internal_api_key_required():
 @internal_bp.route("/listings", methods=["GET"])
 @internal_api_key_required()
 def internal_get_all_listings():
-    """Admin service gọi để lấy tất cả listing (có lọc)."""
-    status = request.args.get('status')
-    listing_type = request.args.get('type') 
-    
-    listings = ListingService.get_absolutely_all_listings()
+    """
+    Admin service gọi để lấy listing theo trang (có lọc).
+    Query params: status (một hoặc nhiều, cách nhau dấu phẩy), type (hoặc listing_type), seller_id, q,
+    sort (newest|oldest|price_asc|price_desc), page (mặc định 1), per_page (mặc định 20, tối đa 100).
+    Trả về {"items", "total", "page", "per_page", "pages"}.
+    """
+    filters = {
+        'status': request.args.get('status'),
+        'listing_type': request.args.get('type') or request.args.get('listing_type'),
+        'seller_id': request.args.get('seller_id'),
+        'q': request.args.get('q'),
+    }
+    sort = request.args.get('sort') or 'newest'
 
     try:
-        if status:
-            listings = [l for l in listings if l.status == status]
-        if listing_type: 
-            listings = [l for l in listings if l.listing_type == listing_type]
-    except AttributeError:
-         logger.error("Lỗi khi lọc listing: đối tượng thiếu 'status' hoặc 'listing_type'.")
-         pass
+        page = max(1, int(request.args.get('page', 1)))
+        per_page = ListingService.normalize_page_size(request.args.get('per_page'))
+        listings, total = ListingService.get_admin_listings_page(filters, page, per_page, sort)
+    except ValueError as e:
+        return jsonify(error=str(e)), 400
 
-    return jsonify([serialize_listing(l) for l in listings]), 200
+    return jsonify({
+        "items": [serialize_listing(l) for l in listings],
+        "total": total,
+        "page": page,
+        "per_page": per_page,
+        "pages": (total + per_page - 1) // per_page
+    }), 200
 
 
 @internal_bp.route("/listings/pending", methods=["GET"])
@@ -81,4 +94,10 @@ def internal_delete_listing(listing_id):
     success, message = ListingService.delete_listing(listing_id)  
 
     if not success: return jsonify(error=message), 404  
-    return jsonify(message=message), 200
\ No newline at end of file
+    return jsonify(message=message), 200
+
+@internal_bp.route('/metrics/cache', methods=['GET'])
+@internal_api_key_required()
+def internal_cache_metrics():
+    """Tỉ lệ hit/miss của read-through cache (tổng và theo từng namespace)."""
+    return jsonify(CacheService.get_metrics()), 200
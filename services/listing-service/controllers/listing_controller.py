@@ -1,19 +1,22 @@
-from flask import Blueprint, jsonify, request, current_app
+from flask import Blueprint, jsonify, request, current_app, Response, stream_with_context
 from flask_jwt_extended import jwt_required, get_jwt_identity, get_jwt, verify_jwt_in_request
 from services.listing_service import ListingService
 from services.vehicle_service import VehicleService
 from services.battery_service import BatteryService
 from services.comparison_service import ComparisonService
+from services.facet_service import FacetService
+from services.feature_service import FeatureService
+from services.cache_service import CacheService
+from services.image_service import ImageService
 from models.listing_image import ListingImage
 from models.listing import Listing
 from models.watchlist import WatchList
-from werkzeug.utils import secure_filename
 from functools import wraps
 from app import db
-import uuid
 import os
 import requests
 import logging
+import json
 from flask_jwt_extended.exceptions import NoAuthorizationError, InvalidHeaderError
   
 logger = logging.getLogger(__name__)
@@ -21,6 +24,9 @@ api_bp = Blueprint('api', __name__, url_prefix='/api')
 AUCTION_SERVICE_URL = os.environ.get('AUCTION_SERVICE_URL', 'http://auction-service:5002')
 TRANSACTION_SERVICE_URL = os.environ.get('TRANSACTION_SERVICE_URL', 'http://transaction-service:5003')
 REQUEST_TIMEOUT = 1
+# Không vượt quá MAX_BULK_RESOURCES của auction-service (5000)
+AUCTION_STATUS_CHUNK_SIZE = 2000
+STREAM_BATCH_SIZE = 50
 
 
 def service_or_user_required(): 
@@ -38,45 +44,39 @@ def service_or_user_required():
                 return jsonify({"error": f"Unauthorized: Yêu cầu thiếu JWT hợp lệ hoặc Service Token. Lỗi: {str(e)}"}), 401
         return decorator
     return wrapper
-def is_auctioned(resource_type, resource_id):  
-    if not resource_id or resource_id <= 0:
-        return False 
-    url = f"{AUCTION_SERVICE_URL}/api/check/{resource_type}/{resource_id}" 
-    try:
-        response = requests.get(url, timeout=REQUEST_TIMEOUT) 
-        if response.status_code == 200:
-            data = response.json() 
-            return data.get('is_auctioned', False) 
-        elif response.status_code == 404:
-            return False 
-        logger.warning(
-            f"Auction Service returned status {response.status_code} "
-            f"for {resource_type} ID {resource_id}: {response.text}"
-        )
-        return False 
-    except requests.exceptions.RequestException as e:
-        logger.error(f"Failed to connect or request Auction Service (Resource ID: {resource_id}): {e}")
-        return False
-    
-def auction_status(resource_type, resource_id):  
-    if not resource_id or resource_id <= 0:
-        return { "auction_status_resource": None}
-    url = f"{AUCTION_SERVICE_URL}/api/check-status/{resource_type}/{resource_id}" 
-    try:
-        response = requests.get(url, timeout=REQUEST_TIMEOUT) 
-        if response.status_code == 200:
-            data = response.json() 
-            return { "auction_status_resource": data.get("auction_status_resource")}
-        elif response.status_code == 404:
-            return { "auction_status_resource": None}
-        logger.warning(
-            f"Auction Service returned status {response.status_code} "
-            f"for {resource_type} ID {resource_id}: {response.text}"
-        )
-        return { "auction_status_resource": None}
-    except requests.exceptions.RequestException as e:
-        logger.error(f"Failed to connect or request Auction Service (Resource ID: {resource_id}): {e}")
-        return { "auction_status_resource": None}
+def get_auction_statuses(resources):
+    """
+    Lấy trạng thái đấu giá của nhiều (resource_type, resource_id) bằng một request
+    (chia lô AUCTION_STATUS_CHUNK_SIZE nếu quá nhiều).
+    Trả về dict {(resource_type, resource_id): auction_status}; tài nguyên chưa có đấu giá không có trong dict.
+    """
+    resources = {(resource_type, resource_id) for resource_type, resource_id in resources if resource_id and resource_id > 0}
+    statuses = {}
+    if not resources:
+        return statuses
+    url = f"{AUCTION_SERVICE_URL}/api/check-status/bulk"
+    resources = sorted(resources)
+    for offset in range(0, len(resources), AUCTION_STATUS_CHUNK_SIZE):
+        chunk = resources[offset:offset + AUCTION_STATUS_CHUNK_SIZE]
+        payload = {
+            "vehicle_ids": [resource_id for resource_type, resource_id in chunk if resource_type == 'vehicle'],
+            "battery_ids": [resource_id for resource_type, resource_id in chunk if resource_type == 'battery'],
+        }
+        try:
+            response = requests.post(url, json=payload, timeout=REQUEST_TIMEOUT)
+            if response.status_code == 200:
+                data = response.json()
+                for resource_type, mapping in data.items():
+                    for resource_id, status in mapping.items():
+                        statuses[(resource_type, int(resource_id))] = status
+                continue
+            logger.warning(
+                f"Auction Service returned status {response.status_code} "
+                f"for bulk status check ({len(chunk)} resources): {response.text}"
+            )
+        except (requests.exceptions.RequestException, ValueError) as e:
+            logger.error(f"Failed to connect or request Auction Service (bulk status, {len(chunk)} resources): {e}")
+    return statuses
 
 def has_active_transaction(listing_id: int): 
     if not listing_id or listing_id <= 0:
@@ -138,7 +138,7 @@ def _serialize_battery_basic(battery):
         'health_percent': battery.health_percent
     }
 
-def serialize_vehicle(vehicle):
+def serialize_vehicle(vehicle, auction_statuses=None):
     if not vehicle: return None 
     is_auctioned_status = None
     auction_status_resource = None
@@ -146,9 +146,10 @@ def serialize_vehicle(vehicle):
     if vehicle.listing :
         sale_status = vehicle.listing.status
     if not vehicle.listing:
-        is_auctioned_status = is_auctioned('vehicle', vehicle.vehicle_id)
-    if not vehicle.listing:
-        auction_status_resource = auction_status('vehicle', vehicle.vehicle_id)
+        if auction_statuses is None:
+            auction_statuses = get_auction_statuses([('vehicle', vehicle.vehicle_id)])
+        auction_status_resource = auction_statuses.get(('vehicle', vehicle.vehicle_id))
+        is_auctioned_status = auction_status_resource is not None
     return {
         'vehicle_id': vehicle.vehicle_id,
         'user_id': vehicle.user_id,
@@ -159,10 +160,10 @@ def serialize_vehicle(vehicle):
         'is_listed': vehicle.listing is not None,
         "listing_status": sale_status,
         "is_auctioned" : is_auctioned_status,
-        "auction_status_resource": auction_status_resource.get("auction_status_resource") if auction_status_resource else None
+        "auction_status_resource": auction_status_resource
     }
 
-def serialize_battery(battery):
+def serialize_battery(battery, auction_statuses=None):
     if not battery: return None 
     auction_status_resource = None
     is_auctioned_status = None
@@ -170,9 +171,10 @@ def serialize_battery(battery):
     if battery.listing:
         sale_status = battery.listing.status
     if not battery.listing:
-        is_auctioned_status = is_auctioned('battery', battery.battery_id)
-    if not battery.listing:
-        auction_status_resource = auction_status('battery', battery.battery_id)
+        if auction_statuses is None:
+            auction_statuses = get_auction_statuses([('battery', battery.battery_id)])
+        auction_status_resource = auction_statuses.get(('battery', battery.battery_id))
+        is_auctioned_status = auction_status_resource is not None
 
     return {
         'battery_id': battery.battery_id,
@@ -183,11 +185,26 @@ def serialize_battery(battery):
         'is_listed': battery.listing is not None,
         "listing_status": sale_status,
         "is_auctioned" : is_auctioned_status,
-        "auction_status_resource": auction_status_resource.get("auction_status_resource") if auction_status_resource else None
+        "auction_status_resource": auction_status_resource
     }
 
+def serialize_vehicles(vehicles):
+    """Serialize nhiều xe, gom trạng thái đấu giá của các xe chưa đăng bán vào một request."""
+    auction_statuses = get_auction_statuses(
+        ('vehicle', v.vehicle_id) for v in vehicles if not v.listing
+    )
+    return [serialize_vehicle(v, auction_statuses) for v in vehicles]
+
+def serialize_batteries(batteries):
+    """Serialize nhiều pin, gom trạng thái đấu giá của các pin chưa đăng bán vào một request."""
+    auction_statuses = get_auction_statuses(
+        ('battery', b.battery_id) for b in batteries if not b.listing
+    )
+    return [serialize_battery(b, auction_statuses) for b in batteries]
+
 
-def serialize_listing(listing):
+def serialize_listing(listing, rendition='thumb'):
+    """rendition: bản ảnh trả về trong 'images' ('thumb' cho danh sách, 'medium' cho trang chi tiết)."""
     if not listing: return None
 
     vehicle_details = serialize_vehicle(listing.vehicle) if hasattr(listing, 'vehicle') and listing.vehicle else None
@@ -202,9 +219,11 @@ def serialize_listing(listing):
     'price': str(listing.price),
     'status': listing.status,
     'created_at': listing.created_at.isoformat() if listing.created_at else None,
+    'watcher_count': listing.watcher_count or 0,
     'vehicle_details': vehicle_details,
     'battery_details': battery_details,
-    'images': [img.image_url for img in listing.images] if hasattr(listing, 'images') and listing.images else []
+    'images': [ImageService.url_for(img, rendition) for img in listing.images] if hasattr(listing, 'images') and listing.images else [],
+    'original_images': [img.image_url for img in listing.images] if hasattr(listing, 'images') and listing.images else []
     }
 
 # ============================================
@@ -235,30 +254,9 @@ def add_image_vehicle(vehicle_id):
         return jsonify({"error": "No selected file"}), 400
         
     if file and allowed_file(file.filename): 
-        filename = secure_filename(file.filename)
-        unique_filename = str(uuid.uuid4()) + "_" + filename 
-        upload_folder = current_app.config['UPLOAD_FOLDER']
-        if not os.path.exists(upload_folder):
-            os.makedirs(upload_folder)
-
-        old_images = ListingImage.query.filter_by(listing_id=listing.listing_id).all()
-        for img in old_images:
-            old_file_path = os.path.join(upload_folder, os.path.basename(img.image_url))
-            if os.path.exists(old_file_path):
-                os.remove(old_file_path)
-            db.session.delete(img)
-        db.session.commit()
-
-        file_path = os.path.join(upload_folder, unique_filename)
-        file.save(file_path)
- 
-        image_url = f"/uploads/{unique_filename}"
-        new_image = ListingImage(listing_id=listing.listing_id, image_url=image_url)
-        db.session.add(new_image)
-        db.session.commit()
-        
+        new_image = ImageService.replace_listing_image(listing, file, current_app.config['UPLOAD_FOLDER'])
         return jsonify({
-            "message": "Image uploaded successfully", 
+            "message": "Image uploaded successfully",
             "image": {"image_id": new_image.image_id, "image_url": new_image.image_url}
         }), 201
     
@@ -282,28 +280,7 @@ def add_image_battery_(battery_id):
         return jsonify({"error": "No selected file"}), 400
         
     if file and allowed_file(file.filename): 
-        filename = secure_filename(file.filename)
-        unique_filename = str(uuid.uuid4()) + "_" + filename 
-        upload_folder = current_app.config['UPLOAD_FOLDER']
-        if not os.path.exists(upload_folder):
-            os.makedirs(upload_folder)
-
-        old_images = ListingImage.query.filter_by(listing_id=listing.listing_id).all()
-        for img in old_images:
-            old_file_path = os.path.join(upload_folder, os.path.basename(img.image_url))
-            if os.path.exists(old_file_path):
-                os.remove(old_file_path)
-            db.session.delete(img)
-        db.session.commit()
-        
-        file_path = os.path.join(upload_folder, unique_filename)
-        file.save(file_path)
- 
-        image_url = f"/uploads/{unique_filename}"
-        new_image = ListingImage(listing_id=listing.listing_id, image_url=image_url)
-        db.session.add(new_image)
-        db.session.commit()
-
+        new_image = ImageService.replace_listing_image(listing, file, current_app.config['UPLOAD_FOLDER'])
         return jsonify({
             "message": "Image updated successfully",
             "image": {"image_id": new_image.image_id, "image_url": new_image.image_url}
@@ -317,7 +294,7 @@ def add_image_battery_(battery_id):
 def get_my_batteries():
     current_user_id = int(get_jwt_identity())
     batteries = BatteryService.get_batteries_by_user_id(current_user_id)
-    return jsonify([serialize_battery(b) for b in batteries]), 200
+    return jsonify(serialize_batteries(batteries)), 200
 
 @api_bp.route("/my-assets/batteries", methods=["POST"])
 @jwt_required()
@@ -349,7 +326,7 @@ def delete_my_battery(battery_id):
 def get_my_vehicles():
     current_user_id = int(get_jwt_identity())
     vehicles = VehicleService.get_vehicles_by_user_id(current_user_id)
-    return jsonify([serialize_vehicle(v) for v in vehicles]), 200
+    return jsonify(serialize_vehicles(vehicles)), 200
 
 @api_bp.route("/my-assets/vehicles", methods=["POST"])
 @jwt_required()
@@ -482,8 +459,19 @@ def add_to_watchlist():
 @jwt_required()
 def my_watchlist():
     current_user_id = int(get_jwt_identity())
-    watchlists = ListingService.get_watchlist(current_user_id)
-    return jsonify([serialize_listing(w) for w in watchlists]), 200
+    if not any(request.args.get(k) for k in ('limit', 'cursor')):
+        watchlists = ListingService.get_watchlist(current_user_id)
+        return jsonify([serialize_listing(w) for w in watchlists]), 200
+    try:
+        limit = ListingService.normalize_page_size(request.args.get('limit'))
+        listings, next_cursor = ListingService.get_watchlist_page(current_user_id, limit, request.args.get('cursor'))
+    except ValueError:
+        return jsonify({"error": "Invalid 'limit' or 'cursor'"}), 400
+    return jsonify({
+        "items": [serialize_listing(l) for l in listings],
+        "next_cursor": next_cursor,
+        "limit": limit
+    }), 200
 
 @api_bp.route("/watch-list/by-listing/<int:listing_id>", methods=['DELETE'])
 @jwt_required()
@@ -504,14 +492,84 @@ def delete_watchlist_by_listing(listing_id):
 # ============================================
 # === CÁC API CÔNG KHAI (PUBLIC) ===
 # ============================================
+def _is_paginated_request():
+    return any(request.args.get(k) for k in ('limit', 'cursor', 'stream'))
+
+def _stream_listing_page(page_query, limit):
+    """Stream một trang tin đăng dạng JSON, serialize từng dòng thay vì dựng cả mảng trong bộ nhớ."""
+    def generate():
+        yield '{"items": ['
+        count = 0
+        last_listing = None
+        next_cursor = None
+        for listing in page_query.yield_per(STREAM_BATCH_SIZE):
+            if count == limit:
+                next_cursor = ListingService.encode_cursor(last_listing)
+                break
+            if count:
+                yield ','
+            yield json.dumps(serialize_listing(listing), ensure_ascii=False)
+            last_listing = listing
+            count += 1
+        yield f'], "next_cursor": {json.dumps(next_cursor)}, "limit": {limit}}}'
+    return Response(stream_with_context(generate()), mimetype='application/json')
+
+def _is_stream_request():
+    return request.args.get('stream', '').lower() in ('1', 'true')
+
+def _page_params(ranked=False):
+    """
+    Phân trang keyset theo (created_at, listing_id); ranked=True: cursor của chế độ độ liên quan.
+    Query params: limit (tối đa MAX_PAGE_SIZE), cursor (next_cursor của trang trước), stream=true để stream JSON.
+    Raise ValueError nếu limit/cursor không hợp lệ.
+    """
+    limit = ListingService.normalize_page_size(request.args.get('limit'))
+    cursor = request.args.get('cursor')
+    if cursor:
+        if ranked:
+            ListingService.decode_rank_cursor(cursor)
+        else:
+            ListingService.decode_cursor(cursor)
+    return limit, cursor
+
+def _listing_page_payload(query, limit, cursor):
+    listings, next_cursor = ListingService.get_listings_page(query, limit, cursor)
+    return {
+        "items": [serialize_listing(l) for l in listings],
+        "next_cursor": next_cursor,
+        "limit": limit
+    }
+
+def _ranked_page_payload(query, q, limit, cursor):
+    """Chế độ tìm kiếm theo độ liên quan: next_cursor dùng lại với cùng q / bộ lọc để lấy trang sau."""
+    listings, next_cursor = ListingService.get_ranked_page(query, q, limit, cursor)
+    return {
+        "items": [serialize_listing(l) for l in listings],
+        "next_cursor": next_cursor,
+        "limit": limit
+    }
+
+def _cached_collection(name, loader):
+    """Read-through cache cho response danh sách công khai, key theo toàn bộ query string."""
+    key = CacheService.collection_key(name, sorted(request.args.items(multi=True)))
+    return CacheService.get_or_set(name, key, loader)
+
 @api_bp.route('/listings', methods=['GET'])
 def search_listings():
-    listings = ListingService.get_all_listings() 
-    return jsonify([serialize_listing(l) for l in listings]), 200
-
-@api_bp.route('/listings/filter', methods=['GET'])
-def filter_listings():
-    filters = {
+    if not _is_paginated_request():
+        payload = _cached_collection('listings', lambda: [serialize_listing(l) for l in ListingService.get_all_listings()])
+        return jsonify(payload), 200
+    try:
+        limit, cursor = _page_params()
+    except ValueError:
+        return jsonify({"error": "Invalid 'limit' or 'cursor'"}), 400
+    query = ListingService.get_available_listings_query()
+    if _is_stream_request():
+        return _stream_listing_page(ListingService.page_query(query, limit, cursor), limit)
+    return jsonify(_cached_collection('listings', lambda: _listing_page_payload(query, limit, cursor))), 200
+
+def _filters_from_request():
+    return {
         "listing_type": request.args.get("listing_type"),
         "title": request.args.get("title"),
         "min_price": request.args.get("min_price"),
@@ -528,19 +586,52 @@ def filter_listings():
         "capacity_max": request.args.get("capacity_max"),
         "health_min": request.args.get("health_min"),
         "health_max": request.args.get("health_max"),
+
+        "q": request.args.get("q"),
+        "sort": request.args.get("sort"),
     }
+
+@api_bp.route('/listings/filter', methods=['GET'])
+def filter_listings():
+    filters = _filters_from_request()
     try:
-        listings = ListingService.filter_listings(filters)
-        return jsonify([serialize_listing(l) for l in listings]), 200
+        if not _is_paginated_request():
+            payload = _cached_collection('filter', lambda: [serialize_listing(l) for l in ListingService.filter_listings(filters)])
+            return jsonify(payload), 200
+        ranked = ListingService.is_relevance_search(filters)
+        try:
+            limit, cursor = _page_params(ranked)
+        except ValueError:
+            return jsonify({"error": "Invalid 'limit' or 'cursor'"}), 400
+        query = ListingService.build_filter_query(filters)
+        if ranked:
+            return jsonify(_cached_collection('filter', lambda: _ranked_page_payload(query, filters["q"], limit, cursor))), 200
+        if _is_stream_request():
+            return _stream_listing_page(ListingService.page_query(query, limit, cursor), limit)
+        return jsonify(_cached_collection('filter', lambda: _listing_page_payload(query, limit, cursor))), 200
     except Exception as e:
         print("❌ Lỗi khi lọc listings:", e)
         return jsonify({"error": "Lỗi khi lọc dữ liệu", "message": str(e)}), 500
 
+@api_bp.route('/listings/facets', methods=['GET'])
+def get_listing_facets():
+    """Số lượng tin đăng theo brand, model, year, manufacturer và các khoảng giá/dung lượng/sức khỏe pin cho bộ lọc hiện tại."""
+    filters = _filters_from_request()
+    try:
+        facets = FacetService.get_facets(filters)
+    except ValueError as e:
+        return jsonify({"error": "Tham số lọc không hợp lệ", "message": str(e)}), 400
+    return jsonify(facets), 200
+
 @api_bp.route('/listings/<int:listing_id>', methods=['GET'])
 def get_listing_details(listing_id):
-    listing = ListingService.get_listing_by_id(listing_id)
-    if not listing: return jsonify({"error": "Listing not found"}), 404
-    return jsonify(serialize_listing(listing)), 200
+    data = CacheService.get_or_set(
+        'listing',
+        CacheService.listing_key(listing_id),
+        lambda: serialize_listing(ListingService.get_listing_by_id(listing_id), rendition='medium')
+    )
+    if not data: return jsonify({"error": "Listing not found"}), 404
+    return jsonify(data), 200
 
 @api_bp.route('/listings/vehicle/<int:vehicle_id>', methods=['GET'])
 def get_vehicle_details(vehicle_id):
@@ -650,7 +741,8 @@ def compare_listings():
     return jsonify({
         "message": message,
         "comparison_type": comparison_type, # 'vehicle' hoặc 'battery'
-        "items": data # List các object sản phẩm
+        "items": data, # List các object sản phẩm (kèm 'scores')
+        "scores_meta": FeatureService.get_meta(comparison_type)
     }), 200
 
 
@@ -2,6 +2,9 @@ from app import db
 
 class Battery(db.Model):
     __tablename__ = 'batteries'
+    __table_args__ = (
+        db.Index('ix_batteries_manufacturer_trgm', 'manufacturer', postgresql_using='gin', postgresql_ops={'manufacturer': 'gin_trgm_ops'}),
+    )
 
     battery_id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     user_id = db.Column(db.Integer, nullable=False) 
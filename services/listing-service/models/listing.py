@@ -1,8 +1,22 @@
 from app import db
 from datetime import datetime, timezone
+from sqlalchemy import event, func, inspect
+from sqlalchemy.dialects.postgresql import TSVECTOR
+
+# Cấu hình text search của Postgres; 'simple' không stem nên phù hợp với tiếng Việt.
+SEARCH_CONFIG = 'simple'
 
 class Listing(db.Model):
     __tablename__ = 'listings'
+    __table_args__ = (
+        # Phục vụ phân trang keyset: WHERE status = ... ORDER BY created_at DESC, listing_id DESC
+        db.Index('ix_listings_status_created_at_id', 'status', 'created_at', 'listing_id'),
+        # Trang admin: lọc theo loại/người bán, sắp xếp mới nhất trước
+        db.Index('ix_listings_type_created_at_id', 'listing_type', 'created_at', 'listing_id'),
+        db.Index('ix_listings_seller_id', 'seller_id'),
+        db.Index('ix_listings_search_vector', 'search_vector', postgresql_using='gin'),
+        db.Index('ix_listings_title_trgm', 'title', postgresql_using='gin', postgresql_ops={'title': 'gin_trgm_ops'}),
+    )
 
     listing_id = db.Column(db.Integer, primary_key=True)
     seller_id = db.Column(db.Integer, nullable=False)
@@ -13,7 +27,12 @@ class Listing(db.Model):
     description = db.Column(db.Text, nullable=True)
     price = db.Column(db.Numeric(10, 2), nullable=False)
     status = db.Column(db.Enum('available', 'sold', 'pending', 'rejected', name='listing_statuses'), default='pending', nullable=False)
-    created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+    # NOT NULL: là khóa phân trang keyset (created_at, listing_id); dữ liệu cũ điền bằng `flask listings-backfill-created-at`
+    created_at = db.Column(db.DateTime, nullable=False, default=lambda: datetime.now(timezone.utc), server_default=func.now())
+    # Số người đang theo dõi (cập nhật khi thêm/xóa watchlist), tránh COUNT trên bảng watchlist
+    watcher_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    # tsvector(title + description) trên Postgres; văn bản chữ thường trên SQLite (fallback).
+    search_vector = db.Column(TSVECTOR().with_variant(db.Text(), 'sqlite'), nullable=True)
  
     vehicle = db.relationship('Vehicle', back_populates='listing')
     battery = db.relationship('Battery', back_populates='listing')
@@ -24,3 +43,21 @@ class Listing(db.Model):
     def __repr__(self):
         return f"<Listing {self.title} (ID: {self.listing_id})>"
 
+
+def build_search_document(title, description):
+    return f"{title or ''} {description or ''}".strip()
+
+
+@event.listens_for(Listing, 'before_insert')
+@event.listens_for(Listing, 'before_update')
+def _sync_search_vector(mapper, connection, target):
+    """Giữ search_vector đồng bộ với title/description trong cùng câu lệnh INSERT/UPDATE."""
+    state = inspect(target)
+    if state.persistent and not (state.attrs.title.history.has_changes()
+                                 or state.attrs.description.history.has_changes()):
+        return
+    document = build_search_document(target.title, target.description)
+    if connection.dialect.name == 'postgresql':
+        target.search_vector = func.to_tsvector(SEARCH_CONFIG, document)
+    else:
+        target.search_vector = document.lower()
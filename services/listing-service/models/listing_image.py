@@ -6,6 +6,11 @@ class ListingImage(db.Model):
     image_id = db.Column(db.Integer, primary_key=True)
     listing_id = db.Column(db.Integer, db.ForeignKey('listings.listing_id'), nullable=False)
     image_url = db.Column(db.String(255), nullable=False)
+    # sha256 nội dung ảnh gốc; ảnh trùng nội dung dùng chung file và bản thu nhỏ
+    content_hash = db.Column(db.String(64), nullable=True, index=True)
+    # Bản thu nhỏ do ImageService tạo ở background (NULL khi chưa tạo xong)
+    thumbnail_url = db.Column(db.String(255), nullable=True)
+    medium_url = db.Column(db.String(255), nullable=True)
      
     listing = db.relationship('Listing', back_populates='images')
 
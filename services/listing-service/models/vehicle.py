@@ -2,6 +2,10 @@ from app import db
 
 class Vehicle(db.Model):
     __tablename__ = 'vehicles'
+    __table_args__ = (
+        db.Index('ix_vehicles_brand_trgm', 'brand', postgresql_using='gin', postgresql_ops={'brand': 'gin_trgm_ops'}),
+        db.Index('ix_vehicles_model_trgm', 'model', postgresql_using='gin', postgresql_ops={'model': 'gin_trgm_ops'}),
+    )
     vehicle_id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     user_id = db.Column(db.Integer, nullable=False)
     brand = db.Column(db.String(50), nullable=False)
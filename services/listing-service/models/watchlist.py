@@ -2,6 +2,10 @@ from app import db
 
 class WatchList(db.Model):
     __tablename__ = 'watchlist'
+    __table_args__ = (
+        # Mỗi người dùng chỉ theo dõi một tin đăng một lần; đồng thời phục vụ truy vấn theo user_id
+        db.Index('ux_watchlist_user_listing', 'user_id', 'listing_id', unique=True),
+    )
 
     watchlist_id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     user_id = db.Column(db.Integer, nullable=False)
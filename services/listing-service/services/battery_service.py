@@ -1,6 +1,8 @@
 from app import db
 from models.battery import Battery
+from sqlalchemy.orm import selectinload
 from services.listing_service import ListingService
+from services.cache_service import CacheService
  
 class BatteryService:
     @staticmethod
@@ -35,7 +37,7 @@ class BatteryService:
     def get_batteries_by_user_id(user_id):
         """Lấy tất cả pin trong kho của người dùng."""
         # Giả định model Battery có trường user_id
-        return Battery.query.filter_by(user_id=user_id).order_by(Battery.battery_id.desc()).all()
+        return Battery.query.options(selectinload(Battery.listing)).filter_by(user_id=user_id).order_by(Battery.battery_id.desc()).all()
 
     @staticmethod
     def update_battery(battery_id, user_id, data):
@@ -49,6 +51,8 @@ class BatteryService:
         battery.manufacturer = data.get('manufacturer', battery.manufacturer)
         
         db.session.commit()
+        if battery.listing:
+            CacheService.invalidate_listing(battery.listing.listing_id)
         return battery, "Battery updated successfully."
 
     @staticmethod
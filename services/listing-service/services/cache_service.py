@@ -0,0 +1,176 @@
+from collections import OrderedDict
+import hashlib
+import json
+import os
+import threading
+import time
+import logging
+import redis
+
+logger = logging.getLogger(__name__)
+
+CACHE_PREFIX = 'listing-cache'
+CACHE_TTL = int(os.getenv('LISTING_CACHE_TTL', 120))  # giây
+LOCAL_CACHE_MAX_ENTRIES = int(os.getenv('LISTING_LOCAL_CACHE_MAX_ENTRIES', 1024))
+# Fallback LRU trong tiến trình khi không có Redis. Invalidation (version) cũng chỉ nằm trong tiến trình,
+# nên CHỈ bật khi service chạy một tiến trình (dev / gunicorn 1 worker); mặc định tắt = không cache.
+LOCAL_CACHE_ENABLED = os.getenv('LISTING_LOCAL_CACHE', 'false').lower() in ('1', 'true', 'yes')
+VERSION_KEY = f"{CACHE_PREFIX}:version"
+
+
+class _LocalLRUCache:
+    """Cache LRU trong tiến trình, dùng khi không kết nối được Redis (chỉ đúng với một tiến trình)."""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class CacheService:
+    """
+    Read-through cache cho các API đọc tin đăng công khai.
+    - Chi tiết tin đăng: key theo listing_id, xóa trực tiếp khi tin đăng thay đổi.
+    - Danh sách/lọc/facet: key chứa số version chung; mỗi lần ghi tăng version
+      nên toàn bộ key cũ hết hiệu lực mà không cần SCAN/xóa từng key.
+    Dùng Redis nếu có (app.redis_client). Không có Redis thì không cache, trừ khi bật
+    LISTING_LOCAL_CACHE (LRU trong tiến trình, chỉ dùng khi chạy một tiến trình: các worker
+    khác không thấy invalidation nên sẽ trả dữ liệu cũ tới hết TTL).
+    """
+    _local = _LocalLRUCache(LOCAL_CACHE_MAX_ENTRIES)
+    _local_version = 0
+    _stats = {}
+    _stats_lock = threading.Lock()
+
+    @staticmethod
+    def _redis():
+        from app import redis_client
+        return redis_client
+
+    @staticmethod
+    def _record(namespace, outcome):
+        with CacheService._stats_lock:
+            stats = CacheService._stats.setdefault(namespace, {'hits': 0, 'misses': 0, 'errors': 0})
+            stats[outcome] += 1
+
+    # --- KEYS ---
+    @staticmethod
+    def _version():
+        client = CacheService._redis()
+        if client is not None:
+            try:
+                return int(client.get(VERSION_KEY) or 0)
+            except redis.exceptions.RedisError as e:
+                logger.warning(f"Redis lỗi khi đọc cache version: {e}")
+        return CacheService._local_version
+
+    @staticmethod
+    def listing_key(listing_id):
+        return f"{CACHE_PREFIX}:listing:{listing_id}"
+
+    @staticmethod
+    def collection_key(name, params):
+        """Key cho một response danh sách; params là các cặp (key, value) đã sắp xếp."""
+        digest = hashlib.sha1(json.dumps(params, ensure_ascii=False).encode('utf-8')).hexdigest()
+        return f"{CACHE_PREFIX}:v{CacheService._version()}:{name}:{digest}"
+
+    # --- READ / WRITE ---
+    @staticmethod
+    def get_or_set(namespace, key, loader, ttl=CACHE_TTL):
+        """Trả về giá trị đã cache; nếu chưa có thì gọi loader(), cache lại (trừ khi None) và trả về."""
+        client = CacheService._redis()
+        local = CacheService._local if client is None and LOCAL_CACHE_ENABLED else None
+        if client is None and local is None:
+            return loader()
+        if client is not None:
+            try:
+                cached = client.get(key)
+                if cached is not None:
+                    CacheService._record(namespace, 'hits')
+                    return json.loads(cached)
+            except redis.exceptions.RedisError as e:
+                # Redis lỗi: đọc thẳng DB, không ghi vào cache trong tiến trình
+                CacheService._record(namespace, 'errors')
+                logger.warning(f"Redis lỗi khi đọc cache {key}: {e}")
+                return loader()
+        else:
+            cached = local.get(key)
+            if cached is not None:
+                CacheService._record(namespace, 'hits')
+                return cached
+
+        CacheService._record(namespace, 'misses')
+        value = loader()
+        if value is None:
+            return None
+        if client is not None:
+            try:
+                client.set(key, json.dumps(value, ensure_ascii=False), ex=ttl)
+            except redis.exceptions.RedisError as e:
+                CacheService._record(namespace, 'errors')
+                logger.warning(f"Redis lỗi khi ghi cache {key}: {e}")
+        else:
+            local.set(key, value, ttl)
+        return value
+
+    # --- INVALIDATION ---
+    @staticmethod
+    def invalidate_listing(listing_id=None):
+        """Gọi sau khi commit một thay đổi ảnh hưởng tin đăng: xóa cache chi tiết và tăng version danh sách."""
+        CacheService._local_version += 1
+        if listing_id is not None:
+            CacheService._local.delete(CacheService.listing_key(listing_id))
+        client = CacheService._redis()
+        if client is None:
+            return
+        try:
+            pipe = client.pipeline()
+            if listing_id is not None:
+                pipe.delete(CacheService.listing_key(listing_id))
+            pipe.incr(VERSION_KEY)
+            pipe.execute()
+        except redis.exceptions.RedisError as e:
+            logger.warning(f"Redis lỗi khi invalidate cache listing {listing_id}: {e}")
+
+    # --- METRICS ---
+    @staticmethod
+    def get_metrics():
+        with CacheService._stats_lock:
+            namespaces = {name: dict(stats) for name, stats in CacheService._stats.items()}
+        total_hits = sum(s['hits'] for s in namespaces.values())
+        total_lookups = total_hits + sum(s['misses'] for s in namespaces.values())
+        for stats in namespaces.values():
+            lookups = stats['hits'] + stats['misses']
+            stats['hit_ratio'] = round(stats['hits'] / lookups, 4) if lookups else None
+        return {
+            "backend": "redis" if CacheService._redis() is not None else ("local" if LOCAL_CACHE_ENABLED else "disabled"),
+            "hit_ratio": round(total_hits / total_lookups, 4) if total_lookups else None,
+            "namespaces": namespaces
+        }
@@ -1,7 +1,9 @@
 from models.listing import Listing
 from models.vehicle import Vehicle
 from models.battery import Battery
-from sqlalchemy.orm import joinedload
+from services.listing_service import ListingService
+from services.image_service import ImageService
+from services.feature_service import FeatureService
 import logging
 
 logger = logging.getLogger(__name__)
@@ -18,11 +20,10 @@ class ComparisonService:
 
         try:
             # Truy vấn tất cả listing cùng lúc
-            # Dùng joinedload để Eager Load chi tiết xe/pin
+            # Eager Load chi tiết xe/pin và ảnh (dùng chung với ListingService)
             query = (
-                Listing.query
+                ListingService.with_details(Listing.query)
                 .filter(Listing.listing_id.in_(listing_ids))
-                .options(joinedload(Listing.vehicle), joinedload(Listing.battery), joinedload(Listing.images))
             )
             listings = query.all()
 
@@ -43,6 +44,11 @@ class ComparisonService:
                 ComparisonService._serialize_for_compare(l) for l in listings
             ]
 
+            # Chỉ số chuẩn hóa (giá/kWh, km/năm, percentile...) tra cứu từ ma trận trong bộ nhớ
+            scores = FeatureService.get_scores(first_type, listings)
+            for item, item_scores in zip(serialized_data, scores):
+                item['scores'] = item_scores
+
             return first_type, serialized_data, "Lấy dữ liệu so sánh thành công."
 
         except Exception as e:
@@ -79,7 +85,7 @@ class ComparisonService:
             'title': listing.title,
             'price': str(listing.price),
             'status': listing.status,
-            'images': [img.image_url for img in listing.images] if listing.images else [],
+            'images': [ImageService.url_for(img, 'thumb') for img in listing.images] if listing.images else [],
             'vehicle_details': vehicle_details,
             'battery_details': battery_details
         }
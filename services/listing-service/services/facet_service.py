@@ -0,0 +1,111 @@
+from app import db
+from models.listing import Listing
+from models.vehicle import Vehicle
+from models.battery import Battery
+from services.listing_service import ListingService
+from services.cache_service import CacheService
+from sqlalchemy import func, case
+import logging
+
+logger = logging.getLogger(__name__)
+
+FACET_CACHE_TTL = 60  # giây
+
+# Các mốc (cận dưới) của từng khoảng; khoảng cuối không có cận trên.
+PRICE_BUCKETS = [0, 5000000, 10000000, 20000000, 50000000]
+CAPACITY_BUCKETS = [0, 20, 40, 60, 80]
+HEALTH_BUCKETS = [0, 70, 80, 90]
+
+# Các filter so khớp không phân biệt hoa thường -> chuẩn hóa về chữ thường khi tạo cache key.
+CASE_INSENSITIVE_FILTERS = {'title', 'q', 'brand', 'model', 'manufacturer'}
+# 'sort' chỉ ảnh hưởng thứ tự, không ảnh hưởng số lượng.
+IGNORED_FILTERS = {'sort'}
+
+class FacetService:
+
+    @staticmethod
+    def normalize_filters(filters: dict):
+        """Bỏ filter rỗng, trim và hạ chữ thường để các bộ lọc tương đương dùng chung cache key."""
+        normalized = {}
+        for key, value in filters.items():
+            if key in IGNORED_FILTERS or value is None:
+                continue
+            value = str(value).strip()
+            if not value:
+                continue
+            normalized[key] = value.lower() if key in CASE_INSENSITIVE_FILTERS else value
+        return normalized
+
+    @staticmethod
+    def get_facets(filters: dict):
+        """Facet counts cho bộ lọc, cache theo filter đã chuẩn hóa trong FACET_CACHE_TTL giây."""
+        normalized = FacetService.normalize_filters(filters)
+        key = CacheService.collection_key('facets', sorted(normalized.items()))
+        return CacheService.get_or_set('facets', key, lambda: FacetService.compute_facets(normalized), ttl=FACET_CACHE_TTL)
+
+    @staticmethod
+    def _bucket_expression(column, edges):
+        whens = [(column < upper, FacetService._bucket_label(lower, upper)) for lower, upper in zip(edges, edges[1:])]
+        return case(*whens, else_=FacetService._bucket_label(edges[-1], None))
+
+    @staticmethod
+    def _bucket_label(lower, upper):
+        return f"{lower}-{upper}" if upper is not None else f"{lower}+"
+
+    @staticmethod
+    def _bucket_rows(column, edges, join_target, join_condition, listing_ids):
+        """Đếm theo khoảng; trả về đủ mọi khoảng (kể cả count = 0) theo thứ tự tăng dần."""
+        bucket = FacetService._bucket_expression(column, edges).label('bucket')
+        query = db.session.query(bucket, func.count()).select_from(Listing)
+        if join_target is not None:
+            query = query.join(join_target, join_condition)
+        counts = dict(query.filter(Listing.listing_id.in_(listing_ids)).group_by(bucket).all())
+        bounds = list(zip(edges, edges[1:] + [None]))
+        return [
+            {
+                "value": FacetService._bucket_label(lower, upper),
+                "min": lower,
+                "max": upper,
+                "count": counts.get(FacetService._bucket_label(lower, upper), 0)
+            }
+            for lower, upper in bounds
+        ]
+
+    @staticmethod
+    def _value_rows(column, join_target, join_condition, listing_ids):
+        rows = (
+            db.session.query(column, func.count())
+            .select_from(Listing)
+            .join(join_target, join_condition)
+            .filter(Listing.listing_id.in_(listing_ids))
+            .group_by(column)
+            .order_by(func.count().desc(), column.asc())
+            .all()
+        )
+        return [{"value": value, "count": count} for value, count in rows]
+
+    @staticmethod
+    def compute_facets(filters: dict):
+        """
+        Tính facet bằng các truy vấn GROUP BY trên tập listing_id lấy từ
+        ListingService.build_filter_query, nên số đếm luôn khớp với kết quả lọc.
+        """
+        listing_ids = ListingService.build_filter_query(filters, eager=False).with_entities(Listing.listing_id).subquery()
+        listing_ids = db.select(listing_ids.c.listing_id)
+
+        vehicle_join = (Vehicle, Listing.vehicle_id == Vehicle.vehicle_id)
+        battery_join = (Battery, Listing.battery_id == Battery.battery_id)
+
+        total = db.session.query(func.count()).select_from(Listing).filter(Listing.listing_id.in_(listing_ids)).scalar()
+        return {
+            "total": total,
+            "facets": {
+                "brand": FacetService._value_rows(Vehicle.brand, *vehicle_join, listing_ids),
+                "model": FacetService._value_rows(Vehicle.model, *vehicle_join, listing_ids),
+                "year": FacetService._value_rows(Vehicle.year, *vehicle_join, listing_ids),
+                "manufacturer": FacetService._value_rows(Battery.manufacturer, *battery_join, listing_ids),
+                "price": FacetService._bucket_rows(Listing.price, PRICE_BUCKETS, None, None, listing_ids),
+                "capacity_kwh": FacetService._bucket_rows(Battery.capacity_kwh, CAPACITY_BUCKETS, *battery_join, listing_ids),
+                "health_percent": FacetService._bucket_rows(Battery.health_percent, HEALTH_BUCKETS, *battery_join, listing_ids),
+            }
+        }
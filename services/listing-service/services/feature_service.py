@@ -0,0 +1,221 @@
+from app import db
+from models.listing import Listing
+from models.vehicle import Vehicle
+from models.battery import Battery
+from datetime import datetime, timezone
+import numpy as np
+import os
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+FEATURE_REFRESH_SECONDS = int(os.getenv('LISTING_FEATURE_REFRESH_SECONDS', 300))
+
+# Các chỉ số so sánh theo loại tin đăng (giá trị thấp hơn = "rẻ/tốt" hơn).
+FEATURES = {
+    'vehicle': ['price', 'mileage_per_year'],
+    'battery': ['price', 'price_per_kwh', 'price_per_health_kwh'],
+}
+# "Tin tương tự": cùng hãng xe / cùng nhà sản xuất pin.
+SIMILAR_BY = {
+    'vehicle': 'brand',
+    'battery': 'manufacturer',
+}
+
+_snapshot = None
+_snapshot_lock = threading.Lock()
+
+
+def _as_float_array(values):
+    return np.array([np.nan if v is None else float(v) for v in values], dtype=float)
+
+
+def _percentiles(sorted_columns, values):
+    """
+    Percentile (0-100) của từng giá trị so với cột đã sắp xếp tương ứng:
+    tỉ lệ tin đăng có giá trị nhỏ hơn (tính nửa số bằng nhau). NaN nếu thiếu dữ liệu.
+    values: ma trận (m, k); sorted_columns: list k mảng đã sắp xếp, không chứa NaN.
+    """
+    result = np.full(values.shape, np.nan)
+    for j, column in enumerate(sorted_columns):
+        if column.size == 0:
+            continue
+        v = values[:, j]
+        below = np.searchsorted(column, v, side='left')
+        not_above = np.searchsorted(column, v, side='right')
+        pct = (below + not_above) / 2.0 / column.size * 100.0
+        result[:, j] = np.where(np.isnan(v), np.nan, pct)
+    return result
+
+
+def _sorted_columns(matrix):
+    return [np.sort(matrix[:, j][~np.isnan(matrix[:, j])]) for j in range(matrix.shape[1])]
+
+
+class _TypeFeatures:
+    """Tập tham chiếu cho một loại tin đăng (vehicle/battery): các cột chỉ số đã sắp xếp, toàn bộ và theo nhóm."""
+
+    def __init__(self, listing_type, ids, groups, matrix):
+        self.listing_type = listing_type
+        self.ids = ids
+        self.sorted_columns = _sorted_columns(matrix)
+
+        self.group_sorted_columns = {}
+        for group in set(groups):
+            mask = np.array([g == group for g in groups], dtype=bool)
+            self.group_sorted_columns[group] = _sorted_columns(matrix[mask])
+
+
+class FeatureService:
+    """
+    Chỉ số so sánh đã chuẩn hóa cho tin đăng: giá/kWh, giá/kWh còn lại (theo % sức khỏe pin),
+    km/năm và percentile so với các tin đang bán cùng loại / tương tự.
+    Toàn bộ tin 'available' được nạp một lần vào ma trận NumPy trong bộ nhớ và làm mới
+    định kỳ (LISTING_FEATURE_REFRESH_SECONDS) làm tập tham chiếu cho percentile; chỉ số của
+    chính các tin đang so sánh thì tính từ dữ liệu hiện tại.
+    """
+
+    @staticmethod
+    def compute_features(listing_type, price, year=None, mileage=None, capacity_kwh=None, health_percent=None):
+        """Tính ma trận chỉ số thô (m, k) từ các mảng cột; thứ tự cột theo FEATURES[listing_type]."""
+        price = _as_float_array(price)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            if listing_type == 'vehicle':
+                # Xe đời năm nay tính là 1 năm sử dụng
+                age = np.maximum(datetime.now().year - _as_float_array(year), 1)
+                columns = [price, _as_float_array(mileage) / age]
+            else:
+                capacity = _as_float_array(capacity_kwh)
+                capacity[capacity <= 0] = np.nan
+                remaining = capacity * _as_float_array(health_percent) / 100.0
+                remaining[remaining <= 0] = np.nan
+                columns = [price, price / capacity, price / remaining]
+        return np.column_stack(columns)
+
+    @staticmethod
+    def build_snapshot():
+        """Nạp toàn bộ tin đăng đang bán bằng một truy vấn và dựng ma trận chỉ số cho từng loại."""
+        rows = (
+            db.session.query(
+                Listing.listing_id, Listing.listing_type, Listing.price,
+                Vehicle.brand, Vehicle.year, Vehicle.mileage,
+                Battery.manufacturer, Battery.capacity_kwh, Battery.health_percent
+            )
+            .outerjoin(Vehicle, Listing.vehicle_id == Vehicle.vehicle_id)
+            .outerjoin(Battery, Listing.battery_id == Battery.battery_id)
+            .filter(Listing.status == 'available')
+            .all()
+        )
+        by_type = {}
+        for listing_type in FEATURES:
+            typed = [r for r in rows if r.listing_type == listing_type]
+            if listing_type == 'vehicle':
+                matrix = FeatureService.compute_features(
+                    'vehicle', [r.price for r in typed],
+                    year=[r.year for r in typed], mileage=[r.mileage for r in typed]
+                )
+                groups = [(r.brand or '').strip().lower() for r in typed]
+            else:
+                matrix = FeatureService.compute_features(
+                    'battery', [r.price for r in typed],
+                    capacity_kwh=[r.capacity_kwh for r in typed], health_percent=[r.health_percent for r in typed]
+                )
+                groups = [(r.manufacturer or '').strip().lower() for r in typed]
+            matrix = matrix.reshape(len(typed), len(FEATURES[listing_type]))
+            by_type[listing_type] = _TypeFeatures(listing_type, [r.listing_id for r in typed], groups, matrix)
+        return {
+            'built_at': time.monotonic(),
+            'refreshed_at': datetime.now(timezone.utc).isoformat(),
+            'types': by_type,
+        }
+
+    @staticmethod
+    def get_snapshot():
+        """Trả về snapshot hiện tại; nếu đã cũ thì một request làm mới, các request khác dùng tạm bản cũ."""
+        global _snapshot
+        snapshot = _snapshot
+        if snapshot is not None and time.monotonic() - snapshot['built_at'] < FEATURE_REFRESH_SECONDS:
+            return snapshot
+        if not _snapshot_lock.acquire(blocking=snapshot is None):
+            return snapshot
+        try:
+            if _snapshot is None or time.monotonic() - _snapshot['built_at'] >= FEATURE_REFRESH_SECONDS:
+                _snapshot = FeatureService.build_snapshot()
+            return _snapshot
+        except Exception as e:
+            logger.error(f"Lỗi khi dựng ma trận chỉ số so sánh: {e}", exc_info=True)
+            return snapshot
+        finally:
+            _snapshot_lock.release()
+
+    @staticmethod
+    def get_scores(listing_type, listings):
+        """
+        Chỉ số chuẩn hóa cho các tin đăng cần so sánh, theo thứ tự `listings`.
+        Giá trị luôn tính từ giá / thông số HIỆN TẠI của tin đăng (cùng dữ liệu trả về trong item);
+        snapshot chỉ cung cấp các cột đã sắp xếp để xếp hạng percentile, nên snapshot cũ tối đa
+        LISTING_FEATURE_REFRESH_SECONDS chỉ làm lệch nhẹ percentile, không làm sai giá trị.
+        Trả về list các dict scores (None nếu chưa dựng được snapshot).
+        """
+        snapshot = FeatureService.get_snapshot()
+        if snapshot is None:
+            return [None] * len(listings)
+        features = snapshot['types'][listing_type]
+        names = FEATURES[listing_type]
+        similar_key = SIMILAR_BY[listing_type]
+
+        if listing_type == 'vehicle':
+            details = [l.vehicle for l in listings]
+            values = FeatureService.compute_features(
+                'vehicle', [l.price for l in listings],
+                year=[d.year if d else None for d in details], mileage=[d.mileage if d else None for d in details]
+            )
+        else:
+            details = [l.battery for l in listings]
+            values = FeatureService.compute_features(
+                'battery', [l.price for l in listings],
+                capacity_kwh=[d.capacity_kwh if d else None for d in details],
+                health_percent=[d.health_percent if d else None for d in details]
+            )
+        values = values.reshape(len(listings), len(names))
+        percentiles = _percentiles(features.sorted_columns, values)
+
+        similar = np.full(values.shape, np.nan)
+        positions_by_group = {}
+        for pos, detail in enumerate(details):
+            group = (getattr(detail, similar_key, None) or '').strip().lower() if detail else ''
+            positions_by_group.setdefault(group, []).append(pos)
+        for group, positions in positions_by_group.items():
+            columns = features.group_sorted_columns.get(group)
+            if columns is not None:
+                similar[positions] = _percentiles(columns, values[positions])
+
+        scores = []
+        for i in range(len(listings)):
+            scores.append({
+                name: {
+                    'value': FeatureService._round(values[i, j], 2),
+                    'percentile': FeatureService._round(percentiles[i, j], 1),
+                    'similar_percentile': FeatureService._round(similar[i, j], 1),
+                }
+                for j, name in enumerate(names)
+            })
+        return scores
+
+    @staticmethod
+    def get_meta(listing_type):
+        """Thông tin về tập dữ liệu dùng để tính percentile (thời điểm làm mới, số tin)."""
+        snapshot = FeatureService.get_snapshot()
+        if snapshot is None:
+            return None
+        return {
+            'refreshed_at': snapshot['refreshed_at'],
+            'sample_size': len(snapshot['types'][listing_type].ids),
+            'similar_by': SIMILAR_BY[listing_type],
+        }
+
+    @staticmethod
+    def _round(value, digits):
+        return None if np.isnan(value) else round(float(value), digits)
@@ -0,0 +1,251 @@
+from app import db
+from models.listing_image import ListingImage
+from services.cache_service import CacheService
+from concurrent.futures import ThreadPoolExecutor
+from werkzeug.utils import secure_filename
+from PIL import Image, ImageOps
+import hashlib
+import os
+import tempfile
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_CHUNK_SIZE = 64 * 1024
+IMAGE_WORKERS = int(os.getenv('LISTING_IMAGE_WORKERS', 2))
+# Kích thước tối đa (px) của từng bản thu nhỏ; giữ nguyên tỉ lệ ảnh.
+RENDITIONS = {
+    'thumb': (400, 300),
+    'medium': (1280, 960),
+}
+RENDITION_QUALITY = 82
+# File được ghi / dùng lại (upload trùng nội dung) trong khoảng này thì chưa xóa: upload đồng thời
+# của cùng nội dung có thể chưa commit ListingImage tham chiếu tới nó. `flask image-gc` dọn sau.
+IMAGE_GC_GRACE_SECONDS = int(os.getenv('LISTING_IMAGE_GC_GRACE_SECONDS', 300))
+
+_executor = ThreadPoolExecutor(max_workers=IMAGE_WORKERS, thread_name_prefix='listing-image')
+
+class ImageService:
+    """
+    Lưu ảnh tin đăng theo nội dung (sha256) và tạo bản thu nhỏ ở background.
+    - Ảnh gốc: uploads/<hash>.<ext>; ảnh trùng nội dung chỉ lưu một lần.
+    - Bản thu nhỏ: uploads/<hash>_<rendition>.jpg, tạo trong thread pool sau khi request đã trả về.
+    - File không còn được tham chiếu: xóa ở background nếu đã cũ, còn lại do `flask image-gc` dọn định kỳ.
+    """
+    _app = None
+
+    @staticmethod
+    def init_app(app):
+        """Gọi trong create_app: app dùng để mở app context cho các tác vụ background."""
+        ImageService._app = app
+
+    @staticmethod
+    def url_for(image, rendition=None):
+        """URL của bản thu nhỏ nếu đã tạo xong, nếu chưa thì dùng ảnh gốc."""
+        if rendition == 'thumb' and image.thumbnail_url:
+            return image.thumbnail_url
+        if rendition == 'medium' and image.medium_url:
+            return image.medium_url
+        return image.image_url
+
+    @staticmethod
+    def save_upload(file, upload_folder):
+        """
+        Ghi file upload xuống đĩa theo từng chunk, đồng thời tính sha256.
+        Trả về (content_hash, stored_filename).
+        """
+        os.makedirs(upload_folder, exist_ok=True)
+        ext = secure_filename(file.filename).rsplit('.', 1)[1].lower()
+        digest = hashlib.sha256()
+        fd, tmp_path = tempfile.mkstemp(dir=upload_folder, suffix='.part')
+        try:
+            with os.fdopen(fd, 'wb') as out:
+                while True:
+                    chunk = file.stream.read(UPLOAD_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    digest.update(chunk)
+                    out.write(chunk)
+            content_hash = digest.hexdigest()
+            stored_filename = f"{content_hash}.{ext}"
+            final_path = os.path.join(upload_folder, stored_filename)
+            if os.path.exists(final_path):
+                os.remove(tmp_path)
+                # Đánh dấu vừa được dùng để remove_unreferenced không xóa trước khi request này commit
+                ImageService._touch(final_path)
+            else:
+                os.replace(tmp_path, final_path)
+            return content_hash, stored_filename
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    @staticmethod
+    def replace_listing_image(listing, file, upload_folder):
+        """
+        Thay ảnh của tin đăng bằng file upload. Việc tạo bản thu nhỏ và dọn file cũ
+        được đẩy sang background. Trả về ListingImage mới.
+        """
+        content_hash, stored_filename = ImageService.save_upload(file, upload_folder)
+
+        old_images = ListingImage.query.filter_by(listing_id=listing.listing_id).all()
+        stale_urls = {img.image_url for img in old_images}
+        stale_urls |= {url for img in old_images for url in (img.thumbnail_url, img.medium_url) if url}
+        for img in old_images:
+            db.session.delete(img)
+
+        # Nội dung đã có sẵn (ảnh trùng) -> dùng lại bản thu nhỏ đã tạo
+        existing = (
+            ListingImage.query
+            .filter(ListingImage.content_hash == content_hash, ListingImage.thumbnail_url.isnot(None))
+            .first()
+        )
+        if existing:
+            for url in (existing.thumbnail_url, existing.medium_url):
+                ImageService._touch(os.path.join(upload_folder, os.path.basename(url)))
+        new_image = ListingImage(
+            listing_id=listing.listing_id,
+            image_url=f"/uploads/{stored_filename}",
+            content_hash=content_hash,
+            thumbnail_url=existing.thumbnail_url if existing else None,
+            medium_url=existing.medium_url if existing else None
+        )
+        db.session.add(new_image)
+        db.session.commit()
+        CacheService.invalidate_listing(listing.listing_id)
+
+        app = ImageService._app
+        if not existing:
+            _executor.submit(ImageService._run_in_app, app, ImageService.generate_renditions, content_hash, stored_filename, upload_folder)
+        stale_urls.discard(new_image.image_url)
+        stale_urls.discard(new_image.thumbnail_url)
+        stale_urls.discard(new_image.medium_url)
+        if stale_urls:
+            _executor.submit(ImageService._run_in_app, app, ImageService.remove_unreferenced, stale_urls, upload_folder)
+        return new_image
+
+    @staticmethod
+    def _run_in_app(app, fn, *args):
+        with app.app_context():
+            try:
+                fn(*args)
+            except Exception as e:
+                db.session.rollback()
+                logger.error(f"Lỗi xử lý ảnh ở background ({fn.__name__}): {e}", exc_info=True)
+            finally:
+                db.session.remove()
+
+    @staticmethod
+    def generate_renditions(content_hash, stored_filename, upload_folder):
+        """Tạo các bản thu nhỏ (JPEG) cho một ảnh gốc rồi cập nhật mọi ListingImage cùng nội dung."""
+        source_path = os.path.join(upload_folder, stored_filename)
+        urls = {}
+        with Image.open(source_path) as source:
+            source = ImageOps.exif_transpose(source)
+            if source.mode not in ('RGB', 'L'):
+                source = source.convert('RGB')
+            for name, size in RENDITIONS.items():
+                filename = f"{content_hash}_{name}.jpg"
+                path = os.path.join(upload_folder, filename)
+                if not os.path.exists(path):
+                    rendition = source.copy()
+                    rendition.thumbnail(size, Image.LANCZOS)
+                    tmp_path = f"{path}.part"
+                    rendition.save(tmp_path, 'JPEG', quality=RENDITION_QUALITY, optimize=True, progressive=True)
+                    os.replace(tmp_path, path)
+                urls[name] = f"/uploads/{filename}"
+
+        images = ListingImage.query.filter_by(content_hash=content_hash).all()
+        for img in images:
+            img.thumbnail_url = urls['thumb']
+            img.medium_url = urls['medium']
+        db.session.commit()
+        for listing_id in {img.listing_id for img in images}:
+            CacheService.invalidate_listing(listing_id)
+
+    @staticmethod
+    def _touch(path):
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+    @staticmethod
+    def _referenced_filenames(urls=None):
+        """Tên file đang được ListingImage tham chiếu (giới hạn trong urls nếu có)."""
+        in_use = set()
+        for column in (ListingImage.image_url, ListingImage.thumbnail_url, ListingImage.medium_url):
+            query = db.session.query(column).filter(column.isnot(None))
+            if urls is not None:
+                query = query.filter(column.in_(urls))
+            in_use |= {os.path.basename(row[0]) for row in query.all()}
+        return in_use
+
+    @staticmethod
+    def _remove_if_stale(path, now):
+        """Xóa file nếu đã cũ hơn IMAGE_GC_GRACE_SECONDS. Trả về True nếu đã xóa."""
+        try:
+            if now - os.path.getmtime(path) < IMAGE_GC_GRACE_SECONDS:
+                return False
+            os.remove(path)
+            return True
+        except FileNotFoundError:
+            return False
+
+    @staticmethod
+    def remove_unreferenced(urls, upload_folder):
+        """
+        Xóa các file ảnh không còn ListingImage nào tham chiếu (ảnh trùng nội dung có thể đang được dùng ở tin khác).
+        File mới ghi / vừa được dùng lại (trong IMAGE_GC_GRACE_SECONDS) được giữ lại cho `flask image-gc`.
+        """
+        in_use = ImageService._referenced_filenames(urls)
+        now = time.time()
+        for url in urls:
+            filename = os.path.basename(url)
+            if filename not in in_use:
+                ImageService._remove_if_stale(os.path.join(upload_folder, filename), now)
+
+    @staticmethod
+    def sweep_unreferenced(upload_folder):
+        """
+        Quét thư mục upload, xóa file ảnh (và file .part dở dang) không còn được tham chiếu
+        và đã cũ hơn IMAGE_GC_GRACE_SECONDS. Trả về số file đã xóa.
+        """
+        if not os.path.isdir(upload_folder):
+            return 0
+        in_use = ImageService._referenced_filenames()
+        now = time.time()
+        removed = 0
+        for entry in os.scandir(upload_folder):
+            if entry.name.startswith('.') or not entry.is_file() or entry.name in in_use:
+                continue
+            if ImageService._remove_if_stale(entry.path, now):
+                removed += 1
+        return removed
+
+    @staticmethod
+    def backfill_renditions(upload_folder):
+        """Tạo bản thu nhỏ cho các ảnh cũ (trước khi có pipeline). Trả về số ảnh đã xử lý."""
+        processed = 0
+        for img in ListingImage.query.filter(ListingImage.thumbnail_url.is_(None)).all():
+            stored_filename = os.path.basename(img.image_url)
+            path = os.path.join(upload_folder, stored_filename)
+            if not os.path.exists(path):
+                logger.warning(f"Bỏ qua ảnh {img.image_id}: không tìm thấy file {path}")
+                continue
+            if not img.content_hash:
+                digest = hashlib.sha256()
+                with open(path, 'rb') as f:
+                    for chunk in iter(lambda: f.read(UPLOAD_CHUNK_SIZE), b''):
+                        digest.update(chunk)
+                img.content_hash = digest.hexdigest()
+                db.session.commit()
+            try:
+                ImageService.generate_renditions(img.content_hash, stored_filename, upload_folder)
+                processed += 1
+            except Exception as e:
+                db.session.rollback()
+                logger.error(f"Không tạo được bản thu nhỏ cho ảnh {img.image_id}: {e}")
+        return processed
@@ -4,8 +4,26 @@ from models.vehicle import Vehicle
 from models.battery import Battery
 from models.listing_image import ListingImage
 from models.watchlist import WatchList
+from services.search_service import SearchService
+from services.cache_service import CacheService
 import traceback
-from sqlalchemy import and_, or_
+import base64
+from datetime import datetime, timezone
+from sqlalchemy import and_, or_, tuple_, func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import joinedload, selectinload
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+LISTING_STATUSES = ('available', 'sold', 'pending', 'rejected')
+LISTING_TYPES = ('vehicle', 'battery')
+ADMIN_SORTS = {
+    'newest': (Listing.created_at.desc(), Listing.listing_id.desc()),
+    'oldest': (Listing.created_at.asc(), Listing.listing_id.asc()),
+    'price_asc': (Listing.price.asc(), Listing.listing_id.asc()),
+    'price_desc': (Listing.price.desc(), Listing.listing_id.desc()),
+}
 
 class ListingService:
     # --- CORE LISTING FUNCTIONS ---
@@ -50,7 +68,8 @@ class ListingService:
             )
             db.session.add(new_listing)
             db.session.commit()
-            
+            CacheService.invalidate_listing(new_listing.listing_id)
+
             return new_listing, "Listing created successfully, awaiting approval."
         except Exception as e:
             db.session.rollback()
@@ -71,6 +90,7 @@ class ListingService:
         try: 
             db.session.delete(listing)
             db.session.commit()
+            CacheService.invalidate_listing(listing_id)
             return True, "Listing removed successfully."
         except Exception as e:
             db.session.rollback()
@@ -89,17 +109,42 @@ class ListingService:
         listing.price = data.get('price', listing.price)
         
         db.session.commit()
+        CacheService.invalidate_listing(listing_id)
         return listing, "Listing updated successfully."
 
+    # --- QUERY SHAPING ---
+    @staticmethod
+    def with_details(query):
+        """
+        Eager load vehicle, battery và images cho mọi đường đọc tin đăng,
+        để serialize_listing không phát sinh lazy-load SELECT cho từng dòng.
+        """
+        return query.options(
+            joinedload(Listing.vehicle).joinedload(Vehicle.listing),
+            joinedload(Listing.battery).joinedload(Battery.listing),
+            selectinload(Listing.images)
+        )
+
     # --- SEARCH & GET LISTING FUNCTIONS ---
     @staticmethod
     def get_all_listings():
         """Lấy tất cả tin đăng đã được duyệt (công khai)."""
-        return Listing.query.filter(Listing.status == 'available').order_by(Listing.created_at.desc()).all()
+        return ListingService.get_available_listings_query().order_by(Listing.created_at.desc()).all()
+
     @staticmethod
-    def filter_listings(filters: dict): 
-        
+    def get_available_listings_query():
+        """Query các tin đăng đã được duyệt (công khai), chưa sắp xếp."""
+        return ListingService.with_details(Listing.query).filter(Listing.status == 'available')
+
+    @staticmethod
+    def build_filter_query(filters: dict, eager=True):
+        """
+        Dựng query lọc tin đăng công khai (chưa sắp xếp/phân trang).
+        eager=False bỏ eager load, dùng khi chỉ cần tập listing_id (vd: đếm facet).
+        """
         query = Listing.query.filter(Listing.status == 'available')
+        if eager:
+            query = ListingService.with_details(query)
  
         if filters.get("listing_type"):
             query = query.filter(Listing.listing_type == filters["listing_type"])
@@ -112,6 +157,9 @@ class ListingService:
         if filters.get("title"):
             title = f"%{filters['title']}%"
             query = query.filter(Listing.title.ilike(title))
+
+        if filters.get("q"):
+            query = SearchService.apply_search(query, filters["q"])
  
         min_price = filters.get("min_price")
         max_price = filters.get("max_price")
@@ -144,12 +192,102 @@ class ListingService:
             if filters.get("health_max"):
                 query = query.filter(Battery.health_percent <= float(filters["health_max"]))
  
+        return query
+
+    @staticmethod
+    def filter_listings(filters: dict): 
+        query = ListingService.build_filter_query(filters)
+        if ListingService.is_relevance_search(filters):
+            return SearchService.apply_relevance_order(query, filters["q"]).all()
         query = query.order_by(Listing.created_at.desc()) 
         return query.all()
 
+    @staticmethod
+    def is_relevance_search(filters: dict):
+        """Có từ khóa 'q' và không yêu cầu sort=newest thì xếp theo độ liên quan."""
+        return bool(filters.get("q")) and (filters.get("sort") or "relevance") == "relevance"
+
+    @staticmethod
+    def get_ranked_page(query, q, limit, cursor=None):
+        """
+        Một trang tin đăng theo độ liên quan. Điểm số là biểu thức tính lại mỗi lần (số thực) nên
+        không dùng làm keyset; cursor mã hóa offset trong thứ tự (điểm, created_at, listing_id).
+        """
+        offset = ListingService.decode_rank_cursor(cursor) if cursor else 0
+        rows = SearchService.apply_relevance_order(query, q).offset(offset).limit(limit + 1).all()
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = ListingService.encode_rank_cursor(offset + limit)
+        return rows, next_cursor
+
+    @staticmethod
+    def encode_rank_cursor(offset):
+        return base64.urlsafe_b64encode(f"rank|{offset}".encode('utf-8')).decode('ascii')
+
+    @staticmethod
+    def decode_rank_cursor(cursor):
+        """Giải mã cursor của chế độ độ liên quan thành offset. Raise ValueError nếu cursor không hợp lệ."""
+        try:
+            prefix, offset = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8').split('|')
+            offset = int(offset)
+        except Exception:
+            raise ValueError("Invalid cursor.")
+        if prefix != 'rank' or offset < 0:
+            raise ValueError("Invalid cursor.")
+        return offset
+
+    # --- KEYSET PAGINATION ---
+    @staticmethod
+    def encode_cursor(listing):
+        """Mã hóa vị trí (created_at, listing_id) của tin đăng cuối trang thành cursor."""
+        raw = f"{listing.created_at.isoformat()}|{listing.listing_id}"
+        return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+    @staticmethod
+    def decode_cursor(cursor):
+        """Giải mã cursor thành (created_at, listing_id). Raise ValueError nếu cursor không hợp lệ."""
+        try:
+            raw = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8')
+            created_at, listing_id = raw.rsplit('|', 1)
+            return datetime.fromisoformat(created_at), int(listing_id)
+        except Exception:
+            raise ValueError("Invalid cursor.")
+
+    @staticmethod
+    def normalize_page_size(limit):
+        """Giới hạn kích thước trang trong khoảng [1, MAX_PAGE_SIZE]."""
+        if limit is None:
+            return DEFAULT_PAGE_SIZE
+        return max(1, min(int(limit), MAX_PAGE_SIZE))
+
+    @staticmethod
+    def page_query(query, limit, cursor=None):
+        """
+        Áp dụng sắp xếp (created_at, listing_id) giảm dần và điều kiện keyset sau cursor.
+        Lấy dư 1 dòng (limit + 1) để biết còn trang tiếp theo hay không.
+        """
+        query = query.order_by(Listing.created_at.desc(), Listing.listing_id.desc())
+        if cursor:
+            created_at, listing_id = ListingService.decode_cursor(cursor)
+            query = query.filter(
+                tuple_(Listing.created_at, Listing.listing_id) < tuple_(created_at, listing_id)
+            )
+        return query.limit(limit + 1)
+
+    @staticmethod
+    def get_listings_page(query, limit, cursor=None):
+        """Trả về (listings, next_cursor) cho một trang."""
+        rows = ListingService.page_query(query, limit, cursor).all()
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = ListingService.encode_cursor(rows[-1])
+        return rows, next_cursor
+
     @staticmethod
     def get_listing_by_id(listing_id):
-        return Listing.query.get(listing_id)
+        return ListingService.with_details(Listing.query).filter(Listing.listing_id == listing_id).first()
     
     @staticmethod
     def get_listing_by_vehicle_id(vehicle_id):
@@ -161,13 +299,13 @@ class ListingService:
     
     @staticmethod
     def get_listings_by_seller(seller_id):
-        return Listing.query.filter_by(seller_id=seller_id).order_by(Listing.created_at.desc()).all()
+        return ListingService.with_details(Listing.query).filter_by(seller_id=seller_id).order_by(Listing.created_at.desc()).all()
 
     # --- ADMIN FUNCTIONS ---
     @staticmethod
     def get_pending_listings():
         """(Admin) Lấy các tin đăng đang chờ duyệt."""
-        return Listing.query.filter_by(status='pending').order_by(Listing.created_at.asc()).all()
+        return ListingService.with_details(Listing.query).filter_by(status='pending').order_by(Listing.created_at.asc()).all()
     
     @staticmethod
     def update_listing_status(listing_id, new_status):
@@ -180,12 +318,60 @@ class ListingService:
             
         listing.status = new_status
         db.session.commit()
+        CacheService.invalidate_listing(listing_id)
         return listing, "Status updated successfully."
 
     @staticmethod
     def get_absolutely_all_listings():
         """(Admin) Lấy tất cả tin đăng, không lọc theo trạng thái."""
-        return Listing.query.order_by(Listing.created_at.desc()).all()
+        return ListingService.with_details(Listing.query).order_by(Listing.created_at.desc()).all()
+
+    @staticmethod
+    def build_admin_query(filters: dict):
+        """
+        (Admin) Query tin đăng ở mọi trạng thái, lọc ngay trong SQL.
+        filters: status (có thể nhiều, "available,sold"), listing_type, seller_id, q.
+        Raise ValueError nếu giá trị không hợp lệ.
+        """
+        query = Listing.query
+        if filters.get('status'):
+            statuses = [s.strip() for s in filters['status'].split(',') if s.strip()]
+            invalid = [s for s in statuses if s not in LISTING_STATUSES]
+            if invalid:
+                raise ValueError(f"Invalid status '{invalid[0]}'.")
+            query = query.filter(Listing.status.in_(statuses))
+        listing_type = filters.get('listing_type')
+        if listing_type:
+            if listing_type not in LISTING_TYPES:
+                raise ValueError(f"Invalid listing type '{listing_type}'.")
+            query = query.filter(Listing.listing_type == listing_type)
+        if filters.get('seller_id'):
+            query = query.filter(Listing.seller_id == int(filters['seller_id']))
+        if filters.get('q'):
+            query = SearchService.apply_search(query, filters['q'])
+        return query
+
+    @staticmethod
+    def get_admin_listings_page(filters: dict, page=1, per_page=DEFAULT_PAGE_SIZE, sort='newest'):
+        """
+        (Admin) Một trang tin đăng theo offset, kèm tổng số dòng khớp bộ lọc.
+        Đếm trên query chưa eager load; chỉ trang hiện tại mới load vehicle/battery/images.
+        Trả về (listings, total).
+        """
+        if sort not in ADMIN_SORTS:
+            raise ValueError(f"Invalid sort '{sort}'.")
+        page = max(1, int(page))
+        per_page = ListingService.normalize_page_size(per_page)
+        query = ListingService.build_admin_query(filters)
+        total = query.order_by(None).count()
+        listings = (
+            ListingService.with_details(query)
+            .order_by(*ADMIN_SORTS[sort])
+            .offset((page - 1) * per_page)
+            .limit(per_page)
+            .all()
+        )
+        return listings, total
     
 
     # --- WATCHLIST FUNCTIONS ---
@@ -197,9 +383,19 @@ class ListingService:
         if WatchList.query.filter_by(user_id=user_id, listing_id=listing_id).first():
             return None, "Listing is already in your watchlist."
         
-        new_entry = WatchList(user_id=user_id, listing_id=listing_id)
-        db.session.add(new_entry)
-        db.session.commit()
+        try:
+            new_entry = WatchList(user_id=user_id, listing_id=listing_id)
+            db.session.add(new_entry)
+            Listing.query.filter(Listing.listing_id == listing_id).update(
+                {Listing.watcher_count: Listing.watcher_count + 1}, synchronize_session=False
+            )
+            db.session.commit()
+        except IntegrityError:
+            # Hai request thêm cùng lúc: unique index (user_id, listing_id) chặn bản ghi thứ hai
+            db.session.rollback()
+            return None, "Listing is already in your watchlist."
+        # watcher_count nằm trong dữ liệu cache của tin đăng
+        CacheService.invalidate_listing(listing_id)
         return new_entry, "Added to watchlist."
 
     @staticmethod
@@ -208,7 +404,11 @@ class ListingService:
         if not entry: return False, "Entry not found in your watchlist."
         
         db.session.delete(entry)
+        Listing.query.filter(Listing.listing_id == entry.listing_id, Listing.watcher_count > 0).update(
+            {Listing.watcher_count: Listing.watcher_count - 1}, synchronize_session=False
+        )
         db.session.commit()
+        CacheService.invalidate_listing(entry.listing_id)
         return True, "Removed from watchlist."
 
     @staticmethod
@@ -216,7 +416,53 @@ class ListingService:
         return WatchList.query.get(watchlist_id)
     @staticmethod
     def get_watchlist(user_id):
-        return [
-            ListingService.get_listing_by_id(item.listing_id)
-            for item in WatchList.query.filter_by(user_id=user_id).all()
-        ]
+        return (
+            ListingService.with_details(Listing.query)
+            .join(WatchList, WatchList.listing_id == Listing.listing_id)
+            .filter(WatchList.user_id == user_id)
+            .order_by(WatchList.watchlist_id.asc())
+            .all()
+        )
+
+    @staticmethod
+    def get_watchlist_page(user_id, limit, cursor=None):
+        """
+        Một trang watchlist (keyset theo watchlist_id tăng dần).
+        cursor là watchlist_id cuối của trang trước. Trả về (listings, next_cursor).
+        """
+        query = (
+            ListingService.with_details(Listing.query)
+            .join(WatchList, WatchList.listing_id == Listing.listing_id)
+            .add_columns(WatchList.watchlist_id)
+            .filter(WatchList.user_id == user_id)
+        )
+        if cursor:
+            query = query.filter(WatchList.watchlist_id > int(cursor))
+        rows = query.order_by(WatchList.watchlist_id.asc()).limit(limit + 1).all()
+        next_cursor = str(rows[limit - 1].watchlist_id) if len(rows) > limit else None
+        return [row[0] for row in rows[:limit]], next_cursor
+
+    @staticmethod
+    def backfill_created_at():
+        """
+        Điền created_at cho tin đăng cũ còn NULL (trước khi cột thành NOT NULL) bằng thời điểm
+        sớm nhất đang có, để chúng đứng cuối danh sách mới nhất. Trả về số tin đăng đã cập nhật.
+        """
+        oldest = db.session.query(func.min(Listing.created_at)).scalar() or datetime.now(timezone.utc)
+        count = Listing.query.filter(Listing.created_at.is_(None)).update(
+            {Listing.created_at: oldest}, synchronize_session=False
+        )
+        db.session.commit()
+        return count
+
+    @staticmethod
+    def recount_watchers():
+        """Tính lại watcher_count từ bảng watchlist (backfill/sửa lệch). Trả về số tin đăng đã cập nhật."""
+        watchers = (
+            db.select(func.count(WatchList.watchlist_id))
+            .where(WatchList.listing_id == Listing.listing_id)
+            .scalar_subquery()
+        )
+        count = Listing.query.update({Listing.watcher_count: watchers}, synchronize_session=False)
+        db.session.commit()
+        return count
@@ -0,0 +1,107 @@
+from app import db
+from models.listing import Listing, SEARCH_CONFIG
+from models.vehicle import Vehicle
+from models.battery import Battery
+from sqlalchemy import and_, or_, case, func, select, text
+import re
+import logging
+
+logger = logging.getLogger(__name__)
+
+class SearchService:
+    """
+    Tìm kiếm toàn văn cho tin đăng.
+    - Postgres: search_vector (tsvector, GIN) + pg_trgm (GIN) cho so khớp một phần, xếp hạng bằng ts_rank_cd + similarity.
+    - SQLite: fallback so khớp LIKE trên search_vector dạng văn bản để chạy/kiểm thử cục bộ.
+    Mỗi token cũng có thể khớp hãng/mẫu xe hoặc nhà sản xuất pin (ILIKE, dùng index trigram trên Postgres).
+    """
+
+    @staticmethod
+    def tokenize(q):
+        return re.findall(r'\w+', (q or '').lower())
+
+    @staticmethod
+    def is_postgres():
+        return db.session.get_bind().dialect.name == 'postgresql'
+
+    @staticmethod
+    def _tsquery(tokens):
+        # Mỗi token so khớp tiền tố: "vinf:* & vf8:*"
+        return func.to_tsquery(SEARCH_CONFIG, ' & '.join(f"{t}:*" for t in tokens))
+
+    @staticmethod
+    def _asset_match(token):
+        """Tin đăng có xe (brand/model) hoặc pin (manufacturer) chứa token."""
+        pattern = f"%{token}%"
+        return or_(
+            Listing.vehicle_id.in_(
+                select(Vehicle.vehicle_id).where(or_(Vehicle.brand.ilike(pattern), Vehicle.model.ilike(pattern)))
+            ),
+            Listing.battery_id.in_(
+                select(Battery.battery_id).where(Battery.manufacturer.ilike(pattern))
+            ),
+        )
+
+    @staticmethod
+    def _token_match(token):
+        """Một token khớp nội dung tin đăng (search_vector) hoặc thông tin xe/pin."""
+        if SearchService.is_postgres():
+            text_match = Listing.search_vector.op('@@')(SearchService._tsquery([token]))
+        else:
+            text_match = Listing.search_vector.like(f"%{token}%")
+        return or_(text_match, SearchService._asset_match(token))
+
+    @staticmethod
+    def apply_search(query, q):
+        """Lọc các tin đăng khớp chuỗi tìm kiếm q (mọi token đều phải khớp)."""
+        tokens = SearchService.tokenize(q)
+        if not tokens:
+            return query
+        matched = and_(*[SearchService._token_match(t) for t in tokens])
+        if SearchService.is_postgres():
+            return query.filter(or_(matched, Listing.title.ilike(f"%{q.strip()}%")))
+        return query.filter(matched)
+
+    @staticmethod
+    def apply_relevance_order(query, q):
+        """Sắp xếp theo độ liên quan giảm dần, hòa điểm thì tin mới hơn đứng trước."""
+        tokens = SearchService.tokenize(q)
+        if not tokens:
+            return query.order_by(Listing.created_at.desc(), Listing.listing_id.desc())
+        # Khớp hãng/mẫu/nhà sản xuất cộng điểm theo từng token
+        asset_rank = sum(case((SearchService._asset_match(t), 1), else_=0) for t in tokens)
+        if SearchService.is_postgres():
+            rank = (
+                func.ts_rank_cd(Listing.search_vector, SearchService._tsquery(tokens))
+                + func.similarity(Listing.title, q.strip())
+                + asset_rank
+            )
+        else:
+            rank = sum(case((Listing.search_vector.like(f"%{t}%"), 1), else_=0) for t in tokens)
+            rank = rank + case((func.lower(Listing.title).like(f"%{q.strip().lower()}%"), 1), else_=0) + asset_rank
+        return query.order_by(rank.desc(), Listing.created_at.desc(), Listing.listing_id.desc())
+
+    @staticmethod
+    def ensure_extensions():
+        """Tạo extension pg_trgm (cần có trước khi tạo các index gin_trgm_ops)."""
+        if not SearchService.is_postgres():
+            return
+        db.session.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+        db.session.commit()
+
+    @staticmethod
+    def reindex_all():
+        """Tính lại search_vector cho toàn bộ tin đăng (backfill sau khi thêm cột)."""
+        document = func.coalesce(Listing.title, '') + ' ' + func.coalesce(Listing.description, '')
+        if SearchService.is_postgres():
+            value = func.to_tsvector(SEARCH_CONFIG, document)
+        else:
+            value = func.lower(func.trim(document))
+        try:
+            count = Listing.query.update({Listing.search_vector: value}, synchronize_session=False)
+            db.session.commit()
+            return count
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Lỗi khi reindex search_vector: {e}", exc_info=True)
+            raise
@@ -1,7 +1,9 @@
 from app import db
 from models.vehicle import Vehicle
 from datetime import datetime
+from sqlalchemy.orm import selectinload
 from services.listing_service import ListingService
+from services.cache_service import CacheService
 
 class VehicleService:
     @staticmethod
@@ -32,7 +34,7 @@ class VehicleService:
     @staticmethod
     def get_vehicles_by_user_id(user_id):
         """Lấy tất cả xe trong kho của người dùng."""
-        return Vehicle.query.filter_by(user_id=user_id).order_by(Vehicle.vehicle_id.desc()).all()
+        return Vehicle.query.options(selectinload(Vehicle.listing)).filter_by(user_id=user_id).order_by(Vehicle.vehicle_id.desc()).all()
 
     @staticmethod
     def update_vehicle(vehicle_id, user_id, data):
@@ -47,6 +49,8 @@ class VehicleService:
         vehicle.mileage = data.get('mileage', vehicle.mileage)
         
         db.session.commit()
+        if vehicle.listing:
+            CacheService.invalidate_listing(vehicle.listing.listing_id)
         return vehicle, "Vehicle updated successfully."
 
     @staticmethod
@@ -0,0 +1,33 @@
+import os
+import sys
+
+import pytest
+
+SERVICE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SERVICE_DIR)
+
+# Không dùng Redis khi test: cache fallback sang LRU trong tiến trình
+os.environ.setdefault('REDIS_URL', 'redis://127.0.0.1:1')
+os.environ.setdefault('INTERNAL_API_KEY', 'test-internal-key')
+
+
+@pytest.fixture
+def app():
+    """App với DB riêng cho mỗi test (SQLite trong bộ nhớ, hoặc TEST_DATABASE_URL nếu có)."""
+    os.environ['DATABASE_URL'] = os.getenv('TEST_DATABASE_URL') or 'sqlite://'
+    from app import create_app, db
+    from services.cache_service import CacheService
+
+    app = create_app()
+    app.config['JWT_SECRET_KEY'] = 'test-secret-key-with-enough-length-32b'
+    with app.app_context():
+        db.create_all()
+        CacheService._local.clear()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
@@ -0,0 +1,45 @@
+import os
+
+from app import db
+from models.battery import Battery
+from models.listing import Listing
+from models.listing_image import ListingImage
+from services.image_service import ImageService
+
+
+def _file(folder, name, old=True):
+    path = os.path.join(folder, name)
+    with open(path, 'wb') as f:
+        f.write(b'x')
+    if old:
+        os.utime(path, (0, 0))
+    return path
+
+
+def test_sweep_removes_only_old_unreferenced_files(app, tmp_path):
+    battery = Battery(user_id=2, capacity_kwh=42, health_percent=90, manufacturer='CATL')
+    db.session.add(battery)
+    db.session.flush()
+    listing = Listing(seller_id=2, battery_id=battery.battery_id, listing_type='battery', title='Pin', price=500)
+    db.session.add(listing)
+    db.session.flush()
+    db.session.add(ListingImage(listing_id=listing.listing_id, image_url='/uploads/kept.jpg',
+                                thumbnail_url='/uploads/kept_thumb.jpg'))
+    db.session.commit()
+
+    folder = str(tmp_path)
+    kept = [_file(folder, 'kept.jpg'), _file(folder, 'kept_thumb.jpg'), _file(folder, '.gitkeep')]
+    # Vừa ghi / vừa dùng lại: có thể thuộc một upload chưa commit
+    young = _file(folder, 'young.jpg', old=False)
+    orphans = [_file(folder, 'orphan.jpg'), _file(folder, 'orphan_medium.jpg'), _file(folder, 'tmpabc.part')]
+
+    assert ImageService.sweep_unreferenced(folder) == len(orphans)
+    assert all(os.path.exists(p) for p in kept + [young])
+    assert not any(os.path.exists(p) for p in orphans)
+
+
+def test_remove_unreferenced_leaves_young_files_for_the_sweep(app, tmp_path):
+    folder = str(tmp_path)
+    old, young = _file(folder, 'old.jpg'), _file(folder, 'young.jpg', old=False)
+    ImageService.remove_unreferenced({'/uploads/old.jpg', '/uploads/young.jpg'}, folder)
+    assert not os.path.exists(old) and os.path.exists(young)
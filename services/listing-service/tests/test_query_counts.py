@@ -0,0 +1,144 @@
+from datetime import datetime, timedelta
+
+import pytest
+from flask_jwt_extended import create_access_token
+from sqlalchemy import event
+
+from app import db
+from models.battery import Battery
+from models.listing import Listing
+from models.listing_image import ListingImage
+from models.vehicle import Vehicle
+from models.watchlist import WatchList
+from services.cache_service import CacheService
+
+LISTINGS = 30
+# Số câu SQL tối đa cho một request đọc danh sách, KHÔNG phụ thuộc số dòng:
+# tin đăng + xe/pin (JOIN) và ảnh (selectin); thêm COUNT cho trang admin.
+MAX_STATEMENTS = 3
+
+BUYER_ID = 3
+
+
+@pytest.fixture
+def seeded(app):
+    base = datetime(2025, 1, 1)
+    for i in range(LISTINGS):
+        if i % 2:
+            asset = Vehicle(user_id=1, brand='VinFast', model=f'VF{i % 3}', year=2020 + i % 4, mileage=1000 * i)
+            db.session.add(asset)
+            db.session.flush()
+            listing = Listing(seller_id=1, vehicle_id=asset.vehicle_id, listing_type='vehicle', title=f'Xe điện {i}',
+                              description='xe tốt', price=1000 + i * 100, status='available',
+                              created_at=base + timedelta(hours=i))
+        else:
+            asset = Battery(user_id=2, capacity_kwh=40 + i, health_percent=70 + i, manufacturer='CATL')
+            db.session.add(asset)
+            db.session.flush()
+            listing = Listing(seller_id=2, battery_id=asset.battery_id, listing_type='battery', title=f'Pin {i}',
+                              description='pin tốt', price=500 + i * 50, status='available' if i % 3 else 'pending',
+                              created_at=base + timedelta(hours=i))
+        db.session.add(listing)
+        db.session.flush()
+        db.session.add_all([ListingImage(listing_id=listing.listing_id, image_url=f'/uploads/{i}-{n}.jpg') for n in range(2)])
+        db.session.add(WatchList(user_id=BUYER_ID, listing_id=listing.listing_id))
+    db.session.commit()
+
+
+@pytest.fixture
+def count_statements(app, client):
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+
+    def request_count(url, **kwargs):
+        # Đo request "nguội": không có cache response, không có object sẵn trong session
+        CacheService._local.clear()
+        db.session.expunge_all()
+        statements.clear()
+        response = client.get(url, **kwargs)
+        assert response.status_code == 200, (url, response.get_json())
+        return len(statements), response.get_json()
+
+    yield request_count
+    event.remove(db.engine, 'before_cursor_execute', before_cursor_execute)
+
+
+def _auth(identity, role='member'):
+    token = create_access_token(identity=str(identity), additional_claims={'role': role})
+    return {'Authorization': f'Bearer {token}'}
+
+
+INTERNAL = {'X-Internal-Api-Key': 'test-internal-key'}
+
+
+@pytest.mark.parametrize('url', [
+    '/api/listings',
+    '/api/listings?limit=20',
+    '/api/listings/filter?listing_type=vehicle',
+    '/api/listings/filter?listing_type=battery&limit=5',
+    '/api/listings/filter?q=pin&limit=10',
+    '/api/listings/filter?q=vinfast%20vf1&limit=10',
+    '/api/listings/1',
+])
+def test_public_reads_have_bounded_statements(seeded, count_statements, url):
+    count, _ = count_statements(url)
+    assert count <= MAX_STATEMENTS, url
+
+
+@pytest.mark.parametrize('url', [
+    '/internal/listings',
+    '/internal/listings?seller_id=1',
+    '/internal/listings?page=1&per_page=20',
+    '/internal/listings/pending',
+])
+def test_admin_and_seller_reads_have_bounded_statements(seeded, count_statements, url):
+    count, payload = count_statements(url, headers=INTERNAL)
+    assert payload
+    assert count <= MAX_STATEMENTS, url
+
+
+def test_watchlist_read_has_bounded_statements(seeded, count_statements):
+    count, payload = count_statements('/api/watch-list', headers=_auth(BUYER_ID))
+    assert len(payload) == LISTINGS
+    assert count <= MAX_STATEMENTS
+
+
+def test_statement_count_does_not_grow_with_rows(app, seeded, count_statements):
+    before, _ = count_statements('/api/listings')
+    for i in range(LISTINGS):
+        asset = Vehicle(user_id=1, brand='Tesla', model='Y', year=2024, mileage=i)
+        db.session.add(asset)
+        db.session.flush()
+        db.session.add(Listing(seller_id=1, vehicle_id=asset.vehicle_id, listing_type='vehicle',
+                               title=f'Tesla {i}', price=2000, status='available'))
+    db.session.commit()
+    after, payload = count_statements('/api/listings')
+    assert after == before
+
+
+def test_internal_listings_are_paginated_by_default(seeded, client):
+    payload = client.get('/internal/listings', headers=INTERNAL).get_json()
+    assert payload['total'] == LISTINGS and payload['page'] == 1 and payload['per_page'] == 20
+    assert len(payload['items']) == 20 and payload['pages'] == 2
+
+    capped = client.get('/internal/listings?per_page=100000', headers=INTERNAL).get_json()
+    assert capped['per_page'] == 100 and len(capped['items']) == LISTINGS
+
+    statuses = client.get('/internal/listings?status=available,sold&per_page=100', headers=INTERNAL).get_json()
+    assert statuses['items'] and {l['status'] for l in statuses['items']} == {'available'}
+    assert client.get('/internal/listings?status=available,bogus', headers=INTERNAL).status_code == 400
+
+
+def test_search_matches_brand_model_and_manufacturer(seeded, client):
+    vehicles = client.get('/api/listings/filter?q=vinfast%20vf1').get_json()
+    assert vehicles and {l['title'] for l in vehicles} == {f'Xe điện {i}' for i in range(1, LISTINGS, 2) if i % 3 == 1}
+
+    batteries = client.get('/api/listings/filter?q=catl&listing_type=battery').get_json()
+    assert batteries and all(l['title'].startswith('Pin') for l in batteries)
+
+    ranked = client.get('/api/listings/filter?q=vinfast&limit=5').get_json()
+    assert len(ranked['items']) == 5 and all(l['title'].startswith('Xe điện') for l in ranked['items'])
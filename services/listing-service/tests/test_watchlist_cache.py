@@ -0,0 +1,37 @@
+import pytest
+from flask_jwt_extended import create_access_token
+
+import services.cache_service as cache_service
+from app import db
+from models.battery import Battery
+from models.listing import Listing
+
+BUYER_ID = 3
+
+
+@pytest.fixture
+def listing_id(app, monkeypatch):
+    # Bật cache LRU trong tiến trình để request chi tiết thật sự được cache
+    monkeypatch.setattr(cache_service, 'LOCAL_CACHE_ENABLED', True)
+    battery = Battery(user_id=2, capacity_kwh=42, health_percent=90, manufacturer='CATL')
+    db.session.add(battery)
+    db.session.flush()
+    listing = Listing(seller_id=2, battery_id=battery.battery_id, listing_type='battery', title='Pin 42kWh',
+                      price=500, status='available')
+    db.session.add(listing)
+    db.session.commit()
+    return listing.listing_id
+
+
+def test_watchlist_changes_refresh_cached_watcher_count(client, listing_id):
+    headers = {'Authorization': f"Bearer {create_access_token(identity=str(BUYER_ID), additional_claims={'role': 'member'})}"}
+    detail = f'/api/listings/{listing_id}'
+    assert client.get(detail).get_json()['watcher_count'] == 0
+
+    response = client.post('/api/watch-list', json={'listing_id': listing_id}, headers=headers)
+    assert response.status_code == 200
+    assert client.get(detail).get_json()['watcher_count'] == 1
+
+    response = client.delete(f'/api/watch-list/by-listing/{listing_id}', headers=headers)
+    assert response.status_code == 200
+    assert client.get(detail).get_json()['watcher_count'] == 0
@@ -6,6 +6,8 @@ from flask_migrate import Migrate
 from flask_cors import CORS
 from dotenv import load_dotenv
 from flask_jwt_extended import JWTManager
+import click
+import redis
 
 load_dotenv()
 
@@ -14,6 +16,7 @@ db = SQLAlchemy()
 jwt = JWTManager()
 # Đặt tên bảng migrate riêng biệt cho service này
 migrate = Migrate(version_table='alembic_version_transactions')
+redis_client = None
 
 # Import models của service này
 from models.transaction import Transaction
@@ -21,6 +24,8 @@ from models.payment import Payment
 from models.fee import Fee
 from models.fee_config import FeeConfig
 from models.contract import Contract
+from models.payment_daily_stat import PaymentDailyStat
+from models.momo_webhook_event import MomoWebhookEvent
 
 def create_app(): 
     app = Flask(__name__)
@@ -34,6 +39,18 @@ def create_app():
     db.init_app(app)
     migrate.init_app(app, db)
     jwt.init_app(app)
+
+    global redis_client
+    redis_url = os.getenv("REDIS_URL", "redis://redis:6379")
+    try:
+        client = redis.from_url(redis_url, decode_responses=True, socket_timeout=0.5, socket_connect_timeout=0.5)
+        client.ping()
+        redis_client = client
+        print(">>> Transaction Service: Successfully connected to Redis.")
+    except redis.exceptions.RedisError as e:
+        redis_client = None
+        print(f">>> Transaction Service: Could not connect to Redis, payment status events stay in-process: {e}")
+
     from controllers.transaction_controller import transaction_api
     from controllers.internal_controller import internal_bp
     app.register_blueprint(transaction_api)
@@ -42,6 +59,56 @@ def create_app():
     @app.route('/health', methods=['GET'])
     def health_check():
         return jsonify({"status": "transaction service is running"}), 200
+
+    @app.cli.command("payment-stats-rebuild")
+    def payment_stats_rebuild_command():
+        """Dựng lại bảng tổng hợp payment_daily_stat từ toàn bộ payment (backfill / sửa lệch số liệu)."""
+        from services.payment_stats_service import PaymentStatsService
+
+        count = PaymentStatsService.rebuild()
+        print(f"Đã dựng lại payment_daily_stat: {count} dòng (ngày, trạng thái).")
+
+    @app.cli.command("momo-inbox-worker")
+    @click.option("--once", is_flag=True, help="Chỉ xử lý một lô rồi thoát.")
+    def momo_inbox_worker_command(once):
+        """Worker xử lý inbox webhook MoMo (chạy nền trong container transaction-worker)."""
+        import time
+        from services.momo_inbox_service import MomoInboxService, MOMO_INBOX_POLL_INTERVAL
+
+        print(">>> MoMo inbox worker đang chạy.")
+        while True:
+            result = MomoInboxService.process_pending()
+            if result['claimed']:
+                print(f"MoMo inbox: {result}")
+            if once:
+                return
+            if not result['claimed']:
+                time.sleep(MOMO_INBOX_POLL_INTERVAL)
+
+    @app.cli.command("momo-inbox-replay")
+    @click.argument("event_ids", nargs=-1, type=int)
+    @click.option("--failed", is_flag=True, help="Replay mọi bản ghi đang 'failed'.")
+    def momo_inbox_replay_command(event_ids, failed):
+        """Đưa các IPN MoMo (theo event_id, hoặc mọi bản ghi lỗi với --failed) về hàng đợi xử lý lại."""
+        from services.momo_inbox_service import MomoInboxService
+
+        if failed:
+            print(f"Đã đưa {MomoInboxService.replay_failed()} bản ghi lỗi vào hàng đợi.")
+        for event_id in event_ids:
+            _, message = MomoInboxService.replay(event_id)
+            print(f"{event_id}: {message}")
+
+    @app.cli.command("payment-gateway-fake")
+    @click.option("--port", default=5099, show_default=True, type=int)
+    @click.option("--delay", default=0.0, show_default=True, type=float, help="Giây chờ trước mỗi phản hồi.")
+    @click.option("--fail-rate", default=0.0, show_default=True, type=float, help="Tỉ lệ trả HTTP 503 (0..1).")
+    @click.option("--fail-first", default=0, show_default=True, type=int, help="Số request đầu tiên luôn trả HTTP 503.")
+    def payment_gateway_fake_command(port, delay, fail_rate, fail_first):
+        """Chạy cổng MoMo giả lập; đặt MOMO_ENDPOINT=http://<host>:<port>/v2/gateway/api/create để dùng."""
+        from services.fake_payment_gateway import create_fake_gateway_app
+
+        print(f">>> Fake MoMo gateway: http://0.0.0.0:{port}/v2/gateway/api/create (delay={delay}s, fail_rate={fail_rate})")
+        create_fake_gateway_app(delay=delay, fail_rate=fail_rate, fail_first=fail_first).run(host="0.0.0.0", port=port, threaded=True)
     
     @app.errorhandler(500)
     def handle_internal_server_error(e):
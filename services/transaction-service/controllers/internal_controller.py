@@ -6,9 +6,14 @@ import logging
 from app import db # Import db instance
 from models.payment import Payment
 from models.transaction import Transaction # Cần Transaction để Join
+from sqlalchemy.orm import contains_eager
 from services.transaction_service import TransactionService
+from services.payment_stats_service import PaymentStatsService
+from services.payment_event_service import PaymentEventService
+from services.momo_inbox_service import MomoInboxService
+from services.payment_gateway import latency_histogram
 # Import các serializer cần thiết
-from .transaction_controller import serialize_payment_for_admin # Import serializer admin
+from .transaction_controller import serialize_payment_for_admin, prefetch_payment_users # Import serializer admin
 
 internal_bp = Blueprint('internal_api', __name__, url_prefix='/internal')
 logger = logging.getLogger(__name__)
@@ -47,10 +52,12 @@ def internal_get_all_payments():
             query = query.filter(Payment.payment_status == status)
              
         all_payments = (
-            query.order_by(Payment.created_at.desc())
+            query.options(contains_eager(Payment.transaction))
+            .order_by(Payment.created_at.desc())
             .all()
         ) 
-        return jsonify([serialize_payment_for_admin(p) for p in all_payments]), 200
+        users = prefetch_payment_users(all_payments)
+        return jsonify([serialize_payment_for_admin(p, users) for p in all_payments]), 200
     except Exception as e:
         logger.error(f"Lỗi internal_get_all_payments: {e}", exc_info=True)
         return jsonify(error="Lỗi máy chủ nội bộ khi lấy payments."), 500
@@ -67,8 +74,9 @@ def internal_approve_payment(payment_id):
         if payment.payment_status != 'pending':
             return jsonify(error=f"Payment không ở trạng thái 'pending' (hiện tại: {payment.payment_status})."), 400
 
-        payment.payment_status = 'completed'
+        PaymentStatsService.set_status(payment, 'completed')
         db.session.commit()
+        PaymentEventService.publish(payment.transaction_id, payment.payment_status)
         # Không cần gọi Listing service nữa vì nó đã được gọi khi status chuyển thành 'pending'
         logger.info(f"Internal API: Đã duyệt payment ID {payment_id}.")
         # Trả về thông tin payment đã cập nhật (dùng serializer thường)
@@ -160,3 +168,31 @@ def internal_update_fees():
     except Exception as e:
         logger.error(f"Lỗi internal_update_fees: {e}", exc_info=True)
         return jsonify(error="Lỗi máy chủ nội bộ khi cập nhật phí."), 500
+
+
+@internal_bp.route("/momo-inbox", methods=["GET"])
+@internal_api_key_required()
+def internal_momo_inbox_stats():
+    """Dashboard inbox webhook MoMo: số bản ghi theo trạng thái, thông lượng, độ trễ xử lý và lỗi gần nhất."""
+    try:
+        failed_limit = min(max(int(request.args.get('failed_limit', 20)), 1), 100)
+    except ValueError:
+        return jsonify(error="failed_limit phải là số nguyên"), 400
+    return jsonify(MomoInboxService.get_stats(failed_limit)), 200
+
+
+@internal_bp.route("/momo-inbox/<int:event_id>/replay", methods=["POST"])
+@internal_api_key_required()
+def internal_replay_momo_event(event_id):
+    """Admin đưa một IPN (đã lỗi hoặc đã xử lý) vào hàng đợi để worker xử lý lại."""
+    event, message = MomoInboxService.replay(event_id)
+    if not event:
+        return jsonify(error=message), 400
+    return jsonify(message=message, event=MomoInboxService.serialize(event)), 200
+
+
+@internal_bp.route("/payment-gateway/metrics", methods=["GET"])
+@internal_api_key_required()
+def internal_payment_gateway_metrics():
+    """Histogram độ trễ gọi cổng thanh toán theo provider (của tiến trình worker trả lời request này)."""
+    return jsonify(latency_histogram.snapshot()), 200
@@ -1,4 +1,4 @@
-from flask import Blueprint, jsonify, request, current_app, redirect
+from flask import Blueprint, jsonify, request, current_app, redirect, Response
 from flask_jwt_extended import jwt_required, get_jwt_identity, get_jwt, verify_jwt_in_request
 from functools import wraps
 from app import db
@@ -11,15 +11,19 @@ import os
 import requests   
 import logging
 from services.transaction_service import TransactionService
+from services.payment_stats_service import PaymentStatsService
+from services.user_info_service import UserInfoService
+from services.payment_event_service import PaymentEventService, LONG_POLL_MAX_WAIT
+from services.momo_inbox_service import MomoInboxService
+from services.payment_gateway import PaymentGatewayError
+import time
 from functools import wraps
 from sqlalchemy.orm import joinedload
 from decimal import Decimal 
 
-USER_SERVICE_URL = os.environ.get('USER_SERVICE_URL', 'http://user-service:5000') 
 LISTING_SERVICE_URL = os.environ.get('LISTING_SERVICE_URL', 'http://listing-service:5001')
 REQUEST_TIMEOUT = 1
  
-NIFI_LISTING_UPDATE_URL = os.environ.get('NIFI_LISTING_UPDATE_URL')  
 INTERNAL_API_KEY = os.environ.get('INTERNAL_API_KEY') 
 
 transaction_api = Blueprint('transaction_api', __name__, url_prefix='/api')
@@ -27,31 +31,6 @@ transaction_api = Blueprint('transaction_api', __name__, url_prefix='/api')
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
  
-def _notify_nifi_of_listing_status_change(listing_id, new_status): 
-    if not NIFI_LISTING_UPDATE_URL:
-        logger.error(f"NIFI_LISTING_UPDATE_URL chưa được cấu hình. Bỏ qua việc cập nhật listing {listing_id}.")
-        return 
-    
-    try:
-        payload = {
-            "listing_id": listing_id,
-            "status": new_status
-        }
-         
-        requests.post(
-            NIFI_LISTING_UPDATE_URL, 
-            json=payload, 
-            timeout=0.5  
-        )
-        
-        logger.info(f"Đã gửi yêu cầu cập nhật (status: {new_status}) cho listing {listing_id} đến NiFi thành công.")
-        
-    except requests.exceptions.Timeout:
-        logger.info(f"Yêu cầu đến NiFi cho listing {listing_id} bị timeout (Chấp nhận được).")
-    except requests.exceptions.RequestException as e:
-        logger.error(f"Lỗi khi gửi yêu cầu đến NiFi cho listing {listing_id}: {e}") 
-
- 
 def admin_required():
     def wrapper(fn):
         @wraps(fn)
@@ -97,43 +76,34 @@ def internal_or_user_required():
     return wrapper 
 
 def get_user_info_by_id(user_id: int): 
-    if not user_id:
-        return None
-    url = f"{USER_SERVICE_URL}/api/info/{user_id}"
-    try:
-        response = requests.get(url, timeout=REQUEST_TIMEOUT)
-        if response.status_code == 200:
-            user_data_list = response.json()
-            if user_data_list and isinstance(user_data_list, list) and len(user_data_list) > 0:
-                return user_data_list[0] 
-            else:
-                logger.warning(f"User Service returned empty or invalid list data for user ID {user_id} at {url}")
-                return None
-        elif response.status_code == 404:
-            logger.warning(f"User not found in User Service for ID {user_id} at {url}")
-            return None
-        else:
-            logger.warning(f"User Service returned status {response.status_code} for user ID {user_id} at {url}")
-            return None
-    except requests.exceptions.RequestException as e:
-        logger.error(f"Failed to connect to User Service at {url} for user info: {e}")
-        return None 
-
-def serialize_payment_for_admin(payment): 
+    return UserInfoService.get(user_id)
+
+def prefetch_payment_users(payments):
+    """Tra username của người mua/người bán cho cả danh sách payment bằng một lần gọi user-service."""
+    user_ids = []
+    for payment in payments:
+        if payment.transaction:
+            user_ids.append(payment.transaction.buyer_id)
+            user_ids.append(payment.transaction.seller_id)
+    return UserInfoService.get_many(user_ids)
+
+def serialize_payment_for_admin(payment, users=None): 
+    """users: dict {user_id: info} đã tra sẵn (prefetch_payment_users); không có thì tra từng id."""
     if not payment: return None
+    lookup = users.get if users is not None else get_user_info_by_id
     buyer_username = "N/A"
     seller_username = "N/A"
     buyer_id = "N/A"
     seller_id = "N/A"
     if payment.transaction and payment.transaction.buyer_id:
-        buyer_info = get_user_info_by_id(payment.transaction.buyer_id)
+        buyer_info = lookup(payment.transaction.buyer_id)
         buyer_id = payment.transaction.buyer_id
         if buyer_info and 'username' in buyer_info:
             buyer_username = buyer_info['username']    
         else: 
             buyer_username = f"ID: {payment.transaction.buyer_id}"
     if payment.transaction and payment.transaction.seller_id:
-        seller_info = get_user_info_by_id(payment.transaction.seller_id)
+        seller_info = lookup(payment.transaction.seller_id)
         seller_id = payment.transaction.seller_id
         if seller_info and 'username' in seller_info:
             seller_username = seller_info['username']
@@ -283,20 +253,56 @@ def sign_contract_route(transaction_id):
         "contract": serialize_contract(contract)
     }), 200
 
+def _long_poll_args():
+    """(wait, since) từ query string: ?wait=<giây>&since=<trạng thái client đang thấy>."""
+    wait = max(0.0, min(request.args.get('wait', 0, type=float), LONG_POLL_MAX_WAIT))
+    return wait, request.args.get('since')
+
+def _wait_for_payment_change(q, since, wait, read_status):
+    """
+    Long-poll: trạng thái (read_status()[0]) vẫn là `since` thì trả kết nối DB về pool và chờ sự kiện
+    trên q tới khi trạng thái khác `since` hoặc hết `wait` giây. Trả về kết quả read_status() cuối cùng.
+    Không chờ khi client không gửi `since` hoặc không tìm thấy / không có quyền (read_status()[1] falsy).
+    """
+    result = read_status()
+    if since is None or not result[1]:
+        return result
+    deadline = time.monotonic() + wait
+    while result[0] == since:
+        db.session.close()  # không giữ kết nối DB trong lúc chờ
+        remaining = deadline - time.monotonic()
+        if remaining <= 0 or PaymentEventService.wait(q, remaining) is None:
+            break
+        result = read_status()
+    return result
+
 @transaction_api.route('/transactions/<int:transaction_id>/payment/status', methods=['GET'])
 @jwt_required()
 def get_single_payment_status(transaction_id):  
+    """Chi tiết payment cho người mua/người bán. Hỗ trợ long-poll ?wait=&since=<payment_status>."""
+    wait, since = _long_poll_args()
+    q = PaymentEventService.subscribe(transaction_id) if wait > 0 else None
     try: 
-        payment = (
-            db.session.query(Payment)
-            .options(joinedload(Payment.transaction)) 
-            .filter(Payment.transaction_id == transaction_id)
-            .first()
-        )
+        current_user_id = int(get_jwt_identity())
+
+        def read_status():
+            payment = (
+                db.session.query(Payment)
+                .options(joinedload(Payment.transaction)) 
+                .filter(Payment.transaction_id == transaction_id)
+                .first()
+            )
+            # Không có quyền: trạng thái None để long-poll trả về ngay (403 bên dưới)
+            visible = payment is not None and current_user_id in (payment.transaction.buyer_id, payment.transaction.seller_id)
+            return (payment.payment_status if visible else None), payment
+
+        if q is not None:
+            _, payment = _wait_for_payment_change(q, since, wait, read_status)
+        else:
+            _, payment = read_status()
 
         if not payment:
             return jsonify({"error": "Sản phẩm này chưa thanh toán hoặc giao dịch không tồn tại."}), 404
-        current_user_id = int(get_jwt_identity())
         if payment.transaction.buyer_id != current_user_id and payment.transaction.seller_id != current_user_id:
             return jsonify({"error": "Bạn không có quyền xem trạng thái thanh toán này."}), 403
 
@@ -305,6 +311,9 @@ def get_single_payment_status(transaction_id):
     except Exception as e:
         print(f"!!! Lỗi khi lấy payment status cho user {transaction_id}: {e}")
         return jsonify({"error": "Lỗi máy chủ nội bộ"}), 500
+    finally:
+        if q is not None:
+            PaymentEventService.unsubscribe(transaction_id, q)
 
 @transaction_api.route('/transactions/<int:transaction_id>/payment', methods=['POST'])
 @jwt_required() 
@@ -513,15 +522,16 @@ def confirm_payment_route(transaction_id):
                 notify_url=notify_url 
             )
             try: 
-                payment.payment_status = 'pending'
+                PaymentStatsService.set_status(payment, 'pending', transaction.final_price)
                 transaction.transaction_status = 'paid'
                 listing_id = transaction.listing_id 
                 
                 db.session.commit()  
+                PaymentEventService.publish(transaction_id, payment.payment_status, transaction.transaction_status)
                 logger.info(f"Bank Payment: Xử lý thành công TXN {transaction_id}. Payment -> 'pending'.")
                 
                 if listing_id:
-                    _notify_nifi_of_listing_status_change(listing_id, "sold") 
+                    TransactionService.notify_listing_status_change(listing_id, "sold") 
             
             except Exception as e: 
                 db.session.rollback() 
@@ -534,82 +544,110 @@ def confirm_payment_route(transaction_id):
             "payment_url": payment_url
         }), 200
 
+    except PaymentGatewayError as e:
+        logger.error(f"confirm_payment: Cổng thanh toán lỗi cho TXN {transaction_id}: {e}")
+        return jsonify({"error": "Cổng thanh toán tạm thời không phản hồi, vui lòng thử lại." if e.retryable else str(e)}), 502
     except Exception as e: 
         logger.error(f"Lỗi nghiêm trọng khi confirm_payment cho TXN {transaction_id}: {e}")
         return jsonify({"error": str(e)}), 500
 
 @transaction_api.route('/payments/webhook/momo', methods=['POST'])
 def momo_webhook(): 
-    data = request.get_json()
+    """
+    IPN của MoMo: xác thực chữ ký, lưu vào inbox (bỏ trùng theo orderId + requestId) rồi trả lời ngay.
+    Cập nhật payment/transaction và báo NiFi do worker `flask momo-inbox-worker` thực hiện.
+    """
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({"error": "Missing data"}), 400 
     order_id = data.get('orderId')
     result_code = data.get('resultCode') 
-    if order_id is None or result_code is None: 
+    if order_id is None or result_code is None or not data.get('requestId'): 
         return jsonify({"error": "Missing data"}), 400 
+    if not MomoInboxService.verify_signature(data):
+        logger.warning(f"MoMo webhook: Sai chữ ký cho orderId {order_id}.")
+        return jsonify({"error": "Invalid signature"}), 400
     try:
-        transaction_id_str = order_id.split('-')[0]
+        transaction_id_str = str(order_id).split('-')[0]
         if not transaction_id_str.isdigit():
              return jsonify({"error": "Invalid orderId format"}), 400
         transaction_id = int(transaction_id_str)
+        int(result_code)
     except Exception as e:
         return jsonify({"error": "Invalid orderId"}), 400 
     try:
-        payment = Payment.query.filter_by(transaction_id=transaction_id).first()
+        event, created = MomoInboxService.record(data, transaction_id)
     except Exception as e: 
-        return jsonify({"error": "Database query error"}), 500
-
-    if not payment:
-        return jsonify({"error": "Payment not found"}), 404 
-    if payment.payment_status in ['pending', 'completed']:
-        return jsonify({"status": "ok"}), 200 
-    if payment.payment_status == 'initiated': 
-        if result_code == 0: 
-            try: 
-                payment.payment_status = 'pending' 
-                transaction = Transaction.query.get(payment.transaction_id)
-                if not transaction:
-                    db.session.rollback()
-                    return jsonify({"error": "Dữ liệu nội bộ không nhất quán"}), 500 
-                transaction.transaction_status = 'paid'
-                listing_id = transaction.listing_id 
-                
-                db.session.commit()  
-                if listing_id:
-                    _notify_nifi_of_listing_status_change(listing_id, "sold") 
-                
-            except Exception as e: 
-                db.session.rollback()
-                logger.error(f"Lỗi CSDL khi xử lý webhook Momo: {e}")
-                return jsonify({"error": "Database commit error"}), 500
-        else:
-            payment.payment_status = 'failed'
-            try:
-                db.session.commit()
-            except Exception as e:
-                db.session.rollback()
-                return jsonify({"error": "Database commit error"}), 500
+        db.session.rollback()
+        logger.error(f"MoMo webhook: Lỗi CSDL khi lưu IPN orderId {order_id}: {e}")
+        return jsonify({"error": "Database commit error"}), 500
+    if not created:
+        logger.info(f"MoMo webhook: Bỏ qua IPN trùng orderId {order_id} (event {event.event_id if event else None}).")
     return jsonify({"status": "ok"}), 200 
 
+def _buyer_payment_status(transaction_id, buyer_id):
+    """(payment_status, True) của người mua; chưa có payment -> ('initiated', True); không có quyền -> (None, False)."""
+    status = db.session.query(Payment.payment_status)\
+        .join(Transaction)\
+        .filter(Payment.transaction_id == transaction_id, Transaction.buyer_id == buyer_id)\
+        .scalar() 
+
+    if status is None: 
+        transaction_exists = db.session.query(Transaction.transaction_id)\
+            .filter(Transaction.transaction_id == transaction_id, Transaction.buyer_id == buyer_id)\
+            .count() > 0
+        if not transaction_exists:
+            return None, False
+        return 'initiated', True
+    return status, True
+
 @transaction_api.route('/transactions/<int:transaction_id>/payment-status', methods=['GET'])
 @jwt_required()
 def get_the_payment_status_for_polling(transaction_id):  
+    """
+    Trạng thái thanh toán cho người mua. Long-poll: ?wait=<giây>&since=<trạng thái đang thấy> giữ request
+    tới khi trạng thái đổi (báo qua Redis pub/sub) hoặc hết wait (tối đa LONG_POLL_MAX_WAIT).
+    """
+    wait, since = _long_poll_args()
+    q = PaymentEventService.subscribe(transaction_id) if wait > 0 else None
     try:
         current_user_id = int(get_jwt_identity()) 
-        payment = db.session.query(Payment.payment_status)\
-            .join(Transaction)\
-            .filter(Payment.transaction_id == transaction_id, Transaction.buyer_id == current_user_id)\
-            .scalar() 
-
-        if payment is None: 
-             transaction_exists = db.session.query(Transaction.transaction_id)\
-                .filter(Transaction.transaction_id == transaction_id, Transaction.buyer_id == current_user_id)\
-                .count() > 0
-             if not transaction_exists:
-                 return jsonify({"error": "Không tìm thấy giao dịch hoặc không có quyền truy cập."}), 404
-             else: 
-                 return jsonify({"status": "initiated"}), 200 
-
-        return jsonify({"status": payment}), 200
+        read_status = lambda: _buyer_payment_status(transaction_id, current_user_id)
+        if q is not None:
+            status, found = _wait_for_payment_change(q, since, wait, read_status)
+        else:
+            status, found = read_status()
+
+        if not found:
+            return jsonify({"error": "Không tìm thấy giao dịch hoặc không có quyền truy cập."}), 404
+        return jsonify({"status": status}), 200
 
     except Exception as e:
         print(f"!!! Lỗi khi kiểm tra status polling: {e}")
-        return jsonify({"error": "Lỗi máy chủ nội bộ"}), 500
\ No newline at end of file
+        return jsonify({"error": "Lỗi máy chủ nội bộ"}), 500
+    finally:
+        if q is not None:
+            PaymentEventService.unsubscribe(transaction_id, q)
+
+@transaction_api.route('/transactions/<int:transaction_id>/payment-status/stream', methods=['GET'])
+@jwt_required()
+def stream_payment_status(transaction_id):
+    """Server-Sent Events: 'status' hiện tại rồi mỗi lần trạng thái đổi; đóng khi completed/failed."""
+    current_user_id = int(get_jwt_identity())
+    # Subscribe trước khi đọc DB để không lỡ sự kiện xảy ra giữa hai bước
+    q = PaymentEventService.subscribe(transaction_id)
+    try:
+        status, found = _buyer_payment_status(transaction_id, current_user_id)
+    except Exception:
+        PaymentEventService.unsubscribe(transaction_id, q)
+        raise
+    finally:
+        db.session.close()  # stream không giữ kết nối DB
+    if not found:
+        PaymentEventService.unsubscribe(transaction_id, q)
+        return jsonify({"error": "Không tìm thấy giao dịch hoặc không có quyền truy cập."}), 404
+    return Response(
+        PaymentEventService.stream(transaction_id, q, status),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
@@ -0,0 +1,15 @@
+# Cấu hình gunicorn cho transaction-service.
+# Worker gevent: mỗi request long-poll /payment-status?wait=... hoặc stream SSE /payment-status/stream
+# là một greenlet, nên người mua đang chờ kết quả thanh toán không chiếm hết worker.
+import os
+
+bind = "0.0.0.0:5003"
+worker_class = "gevent"
+workers = int(os.getenv("GUNICORN_WORKERS", 2))
+worker_connections = int(os.getenv("GUNICORN_WORKER_CONNECTIONS", 1000))
+
+
+def post_fork(server, worker):
+    # psycopg2 là thư viện C: cần patch để truy vấn Postgres nhường greenlet khác thay vì chặn cả worker
+    from psycogreen.gevent import patch_psycopg
+    patch_psycopg()
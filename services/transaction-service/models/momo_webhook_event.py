@@ -0,0 +1,38 @@
+from app import db
+from datetime import datetime, timezone
+
+class MomoWebhookEvent(db.Model):
+    """
+    Inbox webhook (IPN) MoMo: webhook chỉ xác thực chữ ký, lưu nguyên payload rồi trả lời ngay;
+    worker (`flask momo-inbox-worker`) xử lý sau. (order_id, request_id) là duy nhất nên MoMo
+    gửi lại cùng một IPN cũng chỉ tạo một bản ghi.
+    """
+    __tablename__ = 'momo_webhook_event'
+    __table_args__ = (
+        db.UniqueConstraint('order_id', 'request_id', name='uq_momo_webhook_event_order_request'),
+    )
+
+    event_id = db.Column(db.Integer, primary_key=True)
+    order_id = db.Column(db.String(100), nullable=False)
+    request_id = db.Column(db.String(100), nullable=False)
+    transaction_id = db.Column(db.Integer, nullable=False, index=True)
+    result_code = db.Column(db.Integer, nullable=False)
+    payload = db.Column(db.JSON, nullable=False)  # body gốc MoMo gửi, dùng khi replay / đối soát
+    status = db.Column(
+        db.Enum('pending', 'processed', 'failed', name='momo_webhook_event_status_enum'),
+        nullable=False,
+        default='pending'
+    )
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime, nullable=False, default=lambda: datetime.now(timezone.utc))
+    last_error = db.Column(db.Text, nullable=True)
+    received_at = db.Column(db.DateTime, nullable=False, default=lambda: datetime.now(timezone.utc))
+    processed_at = db.Column(db.DateTime, nullable=True)
+
+    def __repr__(self):
+        return f"<MomoWebhookEvent {self.event_id} order={self.order_id} status={self.status}>"
+
+
+# Worker lấy các bản ghi đến hạn: WHERE status = 'pending' AND next_attempt_at <= now ORDER BY next_attempt_at
+db.Index('ix_momo_webhook_event_pending', MomoWebhookEvent.next_attempt_at,
+         postgresql_where=db.text("status = 'pending'"))
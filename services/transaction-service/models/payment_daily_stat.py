@@ -0,0 +1,19 @@
+from app import db
+
+class PaymentDailyStat(db.Model):
+    """
+    Bảng tổng hợp theo ngày (ngày tạo payment, UTC) và trạng thái payment.
+    Được cập nhật trong cùng transaction với mọi thay đổi trạng thái payment (PaymentStatsService);
+    dựng lại toàn bộ bằng `flask payment-stats-rebuild`.
+    """
+    __tablename__ = "payment_daily_stat"
+
+    day = db.Column(db.Date, primary_key=True)
+    payment_status = db.Column(db.String(20), primary_key=True)
+    payment_count = db.Column(db.Integer, nullable=False, default=0)
+    # Numeric để cộng dồn +/- nhiều lần không bị sai số dấu phẩy động
+    amount_total = db.Column(db.Numeric(14, 2), nullable=False, default=0)  # = sum(payment.amount)
+    revenue_total = db.Column(db.Numeric(14, 2), nullable=False, default=0)  # = sum(payment.amount - final_price) = phí thu được
+
+    def __repr__(self):
+        return f"<PaymentDailyStat {self.day} {self.payment_status} count={self.payment_count}>"
@@ -0,0 +1,64 @@
+from flask import Flask, jsonify, request
+from services.payment_gateway import momo_signature, MOMO_ACCESS_KEY, MOMO_SECRET_KEY, MOMO_CREATE_SIGNATURE_FIELDS
+import random
+import threading
+import time
+
+
+def create_fake_gateway_app(delay=0.0, fail_rate=0.0, access_key=MOMO_ACCESS_KEY, secret_key=MOMO_SECRET_KEY,
+                            fail_first=0):
+    """
+    Cổng MoMo giả lập cho dev / chạy thử (`flask payment-gateway-fake`, đặt MOMO_ENDPOINT trỏ tới nó).
+    - Kiểm tra chữ ký như MoMo, trả về payUrl trỏ thẳng về redirectUrl (resultCode=0).
+    - `delay`: giây chờ trước khi trả lời (thử timeout); `fail_rate`: tỉ lệ trả HTTP 503 (thử retry);
+      `fail_first`: N request đầu tiên luôn trả HTTP 503 (thử retry một cách xác định).
+    - Cùng requestId gửi lại trả về đúng kết quả lần đầu; GET /stats đếm số request đã nhận.
+    - `app.received`: payload của mọi request đã nhận, theo thứ tự.
+    """
+    app = Flask(__name__)
+    lock = threading.Lock()
+    responses = {}
+    stats = {'received': 0, 'failed': 0, 'duplicates': 0}
+    app.received = []
+
+    @app.route('/v2/gateway/api/create', methods=['POST'])
+    def create():
+        data = request.get_json(silent=True) or {}
+        with lock:
+            stats['received'] += 1
+            app.received.append(data)
+            forced_failure = stats['received'] <= fail_first
+        if delay:
+            time.sleep(delay)
+        if forced_failure or (fail_rate and random.random() < fail_rate):
+            with lock:
+                stats['failed'] += 1
+            return jsonify(resultCode=99, message="Fake gateway: lỗi giả lập"), 503
+
+        expected = momo_signature(data, MOMO_CREATE_SIGNATURE_FIELDS, access_key, secret_key)
+        if data.get('signature') != expected:
+            return jsonify(resultCode=11, message="Sai chữ ký"), 200
+
+        request_id = data.get('requestId')
+        with lock:
+            if request_id in responses:
+                stats['duplicates'] += 1
+                return jsonify(responses[request_id]), 200
+            result = {
+                'partnerCode': data.get('partnerCode'),
+                'orderId': data.get('orderId'),
+                'requestId': request_id,
+                'amount': int(data.get('amount', 0)),
+                'resultCode': 0,
+                'message': "Thành công.",
+                'payUrl': f"{data.get('redirectUrl')}?resultCode=0&orderId={data.get('orderId')}&requestId={request_id}",
+            }
+            responses[request_id] = result
+        return jsonify(result), 200
+
+    @app.route('/stats', methods=['GET'])
+    def get_stats():
+        with lock:
+            return jsonify(dict(stats, unique_requests=len(responses))), 200
+
+    return app
@@ -0,0 +1,280 @@
+from app import db
+from models.momo_webhook_event import MomoWebhookEvent
+from models.payment import Payment
+from models.transaction import Transaction
+from services.payment_stats_service import PaymentStatsService
+from services.payment_event_service import PaymentEventService
+from services.transaction_service import TransactionService
+from services.payment_gateway import get_gateway
+from datetime import datetime, timezone, timedelta
+from sqlalchemy import func, update
+from sqlalchemy.exc import IntegrityError
+import os
+import random
+import logging
+
+logger = logging.getLogger(__name__)
+
+MOMO_INBOX_BATCH_SIZE = int(os.environ.get('MOMO_INBOX_BATCH_SIZE', 50))
+MOMO_INBOX_POLL_INTERVAL = float(os.environ.get('MOMO_INBOX_POLL_INTERVAL', 1))  # giây, khi inbox rỗng
+MOMO_INBOX_MAX_ATTEMPTS = int(os.environ.get('MOMO_INBOX_MAX_ATTEMPTS', 8))
+# Bản ghi đã được một worker nhận sẽ bị "giữ chỗ" trong khoảng này; worker chết giữa chừng
+# thì hết hạn giữ chỗ bản ghi tự đến hạn lại.
+MOMO_INBOX_LEASE_SECONDS = 60
+MOMO_INBOX_BACKOFF_BASE = 2      # giây; 2, 4, 8, ... tối đa MOMO_INBOX_BACKOFF_MAX
+MOMO_INBOX_BACKOFF_MAX = 10 * 60
+
+
+def _backoff(attempts):
+    delay = min(MOMO_INBOX_BACKOFF_BASE * (2 ** (attempts - 1)), MOMO_INBOX_BACKOFF_MAX)
+    return timedelta(seconds=delay * random.uniform(0.8, 1.2))
+
+
+def _as_utc(value):
+    if value is not None and value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+
+class MomoInboxService:
+    """
+    Inbox cho webhook (IPN) MoMo.
+    - verify_signature() + record(): webhook chỉ xác thực, lưu payload (bỏ trùng theo orderId + requestId)
+      rồi trả lời MoMo ngay, không chờ DB nghiệp vụ hay NiFi.
+    - process_pending(): worker nhận một lô bản ghi đến hạn (FOR UPDATE SKIP LOCKED), áp dụng từng
+      bản ghi vào payment/transaction trong CÙNG transaction với việc đánh dấu 'processed';
+      lỗi thì hẹn lại theo backoff, quá MOMO_INBOX_MAX_ATTEMPTS lần thì 'failed'.
+    - replay(): đưa bản ghi về 'pending' để xử lý lại (việc xử lý idempotent theo trạng thái payment).
+    """
+
+    # --- WEBHOOK ---
+    @staticmethod
+    def verify_signature(data):
+        return get_gateway('e-wallet').verify_ipn_signature(data)
+
+    @staticmethod
+    def record(data, transaction_id):
+        """Lưu IPN vào inbox và commit. Trả về (event, created); created=False nếu là bản gửi trùng."""
+        event = MomoWebhookEvent(
+            order_id=str(data['orderId']),
+            request_id=str(data['requestId']),
+            transaction_id=transaction_id,
+            result_code=int(data['resultCode']),
+            payload=data,
+        )
+        db.session.add(event)
+        try:
+            db.session.commit()
+            return event, True
+        except IntegrityError:
+            db.session.rollback()
+            existing = MomoWebhookEvent.query.filter_by(
+                order_id=str(data['orderId']), request_id=str(data['requestId'])
+            ).first()
+            return existing, False
+
+    # --- WORKER ---
+    @staticmethod
+    def claim_due(limit=MOMO_INBOX_BATCH_SIZE):
+        """Nhận tối đa `limit` bản ghi đến hạn và giữ chỗ chúng MOMO_INBOX_LEASE_SECONDS. Trả về list event_id."""
+        now = datetime.now(timezone.utc)
+        try:
+            events = (
+                MomoWebhookEvent.query
+                .filter(MomoWebhookEvent.status == 'pending', MomoWebhookEvent.next_attempt_at <= now)
+                .order_by(MomoWebhookEvent.next_attempt_at.asc())
+                .limit(limit)
+                .with_for_update(skip_locked=True)
+                .all()
+            )
+            claimed = []
+            for event in events:
+                event.next_attempt_at = now + timedelta(seconds=MOMO_INBOX_LEASE_SECONDS)
+                claimed.append(event.event_id)
+            db.session.commit()
+            return claimed
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"MoMo inbox: Lỗi khi nhận lô bản ghi cần xử lý: {e}", exc_info=True)
+            return []
+
+    @staticmethod
+    def apply(event):
+        """
+        Áp dụng một IPN vào payment/transaction (không commit). Trả về (listing_id cần báo 'sold' hoặc None,
+        (transaction_id, payment_status, transaction_status) cần publish hoặc None).
+        IPN đến sau khi payment đã 'pending'/'completed'/'failed' thì bỏ qua.
+        """
+        payment = (
+            Payment.query.filter_by(transaction_id=event.transaction_id)
+            .with_for_update()
+            .first()
+        )
+        if not payment:
+            raise LookupError(f"Không tìm thấy payment của giao dịch {event.transaction_id}")
+        if payment.payment_status != 'initiated':
+            return None, None
+
+        if event.result_code == 0:
+            transaction = db.session.get(Transaction, payment.transaction_id)
+            if not transaction:
+                raise LookupError(f"Dữ liệu nội bộ không nhất quán: thiếu giao dịch {payment.transaction_id}")
+            PaymentStatsService.set_status(payment, 'pending', transaction.final_price)
+            transaction.transaction_status = 'paid'
+            return transaction.listing_id, (transaction.transaction_id, 'pending', 'paid')
+
+        PaymentStatsService.set_status(payment, 'failed')
+        return None, (payment.transaction_id, 'failed', None)
+
+    @staticmethod
+    def process(event_id):
+        """Xử lý một bản ghi đã nhận. Trả về (ok, error)."""
+        try:
+            event = db.session.get(MomoWebhookEvent, event_id)
+            if event is None or event.status != 'pending':
+                db.session.rollback()
+                return True, None
+            listing_id, published = MomoInboxService.apply(event)
+            event.status = 'processed'
+            event.attempts = event.attempts + 1
+            event.processed_at = datetime.now(timezone.utc)
+            event.last_error = None
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            return False, str(e)[:500]
+
+        if published:
+            PaymentEventService.publish(*published)
+        if listing_id:
+            TransactionService.notify_listing_status_change(listing_id, "sold")
+        return True, None
+
+    @staticmethod
+    def process_pending(limit=MOMO_INBOX_BATCH_SIZE):
+        """Xử lý một lô bản ghi đến hạn. Trả về dict {'claimed', 'processed', 'retrying', 'failed'}."""
+        result = {'claimed': 0, 'processed': 0, 'retrying': 0, 'failed': 0}
+        event_ids = MomoInboxService.claim_due(limit)
+        result['claimed'] = len(event_ids)
+        for event_id in event_ids:
+            ok, error = MomoInboxService.process(event_id)
+            if ok:
+                result['processed'] += 1
+                continue
+            try:
+                attempts = db.session.query(MomoWebhookEvent.attempts).filter(
+                    MomoWebhookEvent.event_id == event_id
+                ).scalar() + 1
+                give_up = attempts >= MOMO_INBOX_MAX_ATTEMPTS
+                db.session.execute(
+                    update(MomoWebhookEvent)
+                    .where(MomoWebhookEvent.event_id == event_id)
+                    .values(
+                        status='failed' if give_up else 'pending',
+                        attempts=attempts,
+                        next_attempt_at=datetime.now(timezone.utc) + _backoff(attempts),
+                        last_error=error
+                    )
+                    .execution_options(synchronize_session=False)
+                )
+                db.session.commit()
+                result['failed' if give_up else 'retrying'] += 1
+                logger.warning(f"MoMo inbox: Xử lý bản ghi {event_id} thất bại (lần {attempts}): {error}")
+            except Exception as e:
+                # Không ghi được kết quả: hết hạn giữ chỗ bản ghi sẽ được xử lý lại
+                db.session.rollback()
+                logger.error(f"MoMo inbox: Lỗi khi ghi kết quả xử lý bản ghi {event_id}: {e}", exc_info=True)
+        return result
+
+    # --- REPLAY / DASHBOARD ---
+    @staticmethod
+    def replay(event_id):
+        """Đưa một bản ghi ('failed' hoặc 'processed') về hàng đợi để worker xử lý lại."""
+        event = db.session.get(MomoWebhookEvent, event_id)
+        if not event:
+            return None, "Không tìm thấy bản ghi webhook."
+        if event.status == 'pending':
+            return None, "Bản ghi đang chờ xử lý, không cần replay."
+        try:
+            event.status = 'pending'
+            event.attempts = 0
+            event.next_attempt_at = datetime.now(timezone.utc)
+            db.session.commit()
+            return event, "Đã đưa bản ghi vào hàng đợi xử lý lại."
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"MoMo inbox: Lỗi khi replay bản ghi {event_id}: {e}", exc_info=True)
+            return None, f"Lỗi khi replay bản ghi: {e}"
+
+    @staticmethod
+    def replay_failed():
+        """Đưa mọi bản ghi 'failed' về hàng đợi. Trả về số bản ghi."""
+        try:
+            count = db.session.execute(
+                update(MomoWebhookEvent)
+                .where(MomoWebhookEvent.status == 'failed')
+                .values(status='pending', attempts=0, next_attempt_at=datetime.now(timezone.utc))
+                .execution_options(synchronize_session=False)
+            ).rowcount
+            db.session.commit()
+            return count
+        except Exception:
+            db.session.rollback()
+            raise
+
+    @staticmethod
+    def get_stats(failed_limit=20):
+        """Số bản ghi theo trạng thái, thông lượng 5 phút / 1 giờ gần nhất, độ trễ xử lý và các lỗi gần nhất."""
+        now = datetime.now(timezone.utc)
+        counts = dict(
+            db.session.query(MomoWebhookEvent.status, func.count(MomoWebhookEvent.event_id))
+            .group_by(MomoWebhookEvent.status).all()
+        )
+
+        def count_since(column, since):
+            return db.session.query(func.count(MomoWebhookEvent.event_id)).filter(column >= since).scalar()
+
+        oldest_pending = _as_utc(
+            db.session.query(func.min(MomoWebhookEvent.received_at))
+            .filter(MomoWebhookEvent.status == 'pending').scalar()
+        )
+        recent = (
+            db.session.query(MomoWebhookEvent.received_at, MomoWebhookEvent.processed_at)
+            .filter(MomoWebhookEvent.processed_at >= now - timedelta(hours=1))
+            .order_by(MomoWebhookEvent.processed_at.desc())
+            .limit(1000).all()
+        )
+        latencies = [(_as_utc(done) - _as_utc(received)).total_seconds() for received, done in recent]
+        failed = (
+            MomoWebhookEvent.query.filter(MomoWebhookEvent.status == 'failed')
+            .order_by(MomoWebhookEvent.event_id.desc()).limit(failed_limit).all()
+        )
+        return {
+            'pending': counts.get('pending', 0),
+            'processed': counts.get('processed', 0),
+            'failed': counts.get('failed', 0),
+            'received_last_5m': count_since(MomoWebhookEvent.received_at, now - timedelta(minutes=5)),
+            'processed_last_5m': count_since(MomoWebhookEvent.processed_at, now - timedelta(minutes=5)),
+            'received_last_1h': count_since(MomoWebhookEvent.received_at, now - timedelta(hours=1)),
+            'processed_last_1h': count_since(MomoWebhookEvent.processed_at, now - timedelta(hours=1)),
+            'avg_processing_latency_seconds': round(sum(latencies) / len(latencies), 3) if latencies else None,
+            'max_processing_latency_seconds': round(max(latencies), 3) if latencies else None,
+            'oldest_pending_age_seconds': round((now - oldest_pending).total_seconds(), 1) if oldest_pending else None,
+            'recent_failures': [MomoInboxService.serialize(e) for e in failed],
+        }
+
+    @staticmethod
+    def serialize(event):
+        return {
+            'event_id': event.event_id,
+            'order_id': event.order_id,
+            'request_id': event.request_id,
+            'transaction_id': event.transaction_id,
+            'result_code': event.result_code,
+            'status': event.status,
+            'attempts': event.attempts,
+            'next_attempt_at': event.next_attempt_at.isoformat() if event.next_attempt_at else None,
+            'last_error': event.last_error,
+            'received_at': event.received_at.isoformat() if event.received_at else None,
+            'processed_at': event.processed_at.isoformat() if event.processed_at else None,
+        }
@@ -0,0 +1,158 @@
+from collections import defaultdict
+import json
+import os
+import queue
+import threading
+import time
+import logging
+import redis
+
+logger = logging.getLogger(__name__)
+
+CHANNEL_PREFIX = 'payment-events'
+HEARTBEAT_SECONDS = int(os.getenv('PAYMENT_STREAM_HEARTBEAT', 15))
+LONG_POLL_MAX_WAIT = int(os.getenv('PAYMENT_LONG_POLL_MAX_WAIT', 25))  # giây; < proxy_read_timeout của nginx (60s)
+# Trạng thái không còn đổi nữa theo luồng người mua: stream đóng sau khi gửi
+FINAL_PAYMENT_STATUSES = ('completed', 'failed')
+SUBSCRIBER_QUEUE_SIZE = 10
+RECONNECT_DELAY = 2
+
+
+def _channel(transaction_id):
+    return f"{CHANNEL_PREFIX}:{transaction_id}"
+
+
+class PaymentEventService:
+    """
+    Báo thay đổi trạng thái thanh toán của một giao dịch qua Redis pub/sub, thay cho việc
+    frontend poll /payment-status liên tục.
+    Mỗi tiến trình chỉ giữ MỘT kết nối psubscribe 'payment-events:*' (một thread nền) và fan-out
+    tới các hàng đợi nhỏ của từng request đang chờ (long-poll hoặc SSE). Người chờ không giữ
+    kết nối DB: chỉ đọc DB một lần lúc bắt đầu và một lần khi được báo có thay đổi.
+    Không có Redis: sự kiện được phát trực tiếp trong tiến trình (chỉ dùng khi dev).
+    """
+    _subscribers = defaultdict(set)
+    _lock = threading.Lock()
+    _listener = None
+
+    @staticmethod
+    def _redis():
+        from app import redis_client
+        return redis_client
+
+    # --- PUBLISH ---
+    @staticmethod
+    def publish(transaction_id, payment_status, transaction_status=None):
+        """Gọi SAU khi commit. Lỗi Redis chỉ được log, không làm hỏng nghiệp vụ thanh toán."""
+        message = json.dumps({
+            'transaction_id': transaction_id,
+            'status': payment_status,
+            'transaction_status': transaction_status,
+        })
+        client = PaymentEventService._redis()
+        if client is None:
+            PaymentEventService._dispatch(transaction_id, message)
+            return
+        try:
+            client.publish(_channel(transaction_id), message)
+        except redis.exceptions.RedisError as e:
+            logger.warning(f"Không publish được trạng thái thanh toán của giao dịch {transaction_id}: {e}")
+
+    # --- SUBSCRIBE ---
+    @staticmethod
+    def subscribe(transaction_id):
+        PaymentEventService._ensure_listener()
+        q = queue.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        with PaymentEventService._lock:
+            PaymentEventService._subscribers[transaction_id].add(q)
+        return q
+
+    @staticmethod
+    def unsubscribe(transaction_id, q):
+        with PaymentEventService._lock:
+            subscribers = PaymentEventService._subscribers.get(transaction_id)
+            if subscribers is not None:
+                subscribers.discard(q)
+                if not subscribers:
+                    del PaymentEventService._subscribers[transaction_id]
+
+    @staticmethod
+    def wait(q, timeout):
+        """Chờ sự kiện kế tiếp trên hàng đợi đã subscribe. Trả về dict sự kiện hoặc None khi hết giờ."""
+        try:
+            return json.loads(q.get(timeout=timeout))
+        except queue.Empty:
+            return None
+
+    @staticmethod
+    def _dispatch(transaction_id, message):
+        with PaymentEventService._lock:
+            subscribers = list(PaymentEventService._subscribers.get(transaction_id, ()))
+        for q in subscribers:
+            try:
+                q.put_nowait(message)
+            except queue.Full:
+                # Client đọc chậm: bỏ sự kiện cũ nhất, giữ sự kiện mới nhất
+                try:
+                    q.get_nowait()
+                    q.put_nowait(message)
+                except (queue.Empty, queue.Full):
+                    pass
+
+    @staticmethod
+    def _ensure_listener():
+        if PaymentEventService._redis() is None:
+            return
+        with PaymentEventService._lock:
+            listener = PaymentEventService._listener
+            if listener is not None and listener.is_alive():
+                return
+            listener = threading.Thread(target=PaymentEventService._listen, name='payment-events', daemon=True)
+            PaymentEventService._listener = listener
+        listener.start()
+
+    @staticmethod
+    def _listen():
+        redis_url = os.getenv("REDIS_URL", "redis://redis:6379")
+        while True:
+            try:
+                # Kết nối riêng không có socket_timeout: pubsub chờ chặn lâu dài
+                pubsub = redis.from_url(redis_url, decode_responses=True).pubsub(ignore_subscribe_messages=True)
+                pubsub.psubscribe(f"{CHANNEL_PREFIX}:*")
+                for item in pubsub.listen():
+                    try:
+                        transaction_id = int(item['channel'].rsplit(':', 1)[1])
+                    except (KeyError, ValueError):
+                        continue
+                    PaymentEventService._dispatch(transaction_id, item['data'])
+            except redis.exceptions.RedisError as e:
+                logger.warning(f"Mất kết nối pub/sub trạng thái thanh toán, thử lại sau {RECONNECT_DELAY}s: {e}")
+                time.sleep(RECONNECT_DELAY)
+
+    # --- SSE ---
+    @staticmethod
+    def stream(transaction_id, q, initial_status):
+        """
+        Generator SSE trên hàng đợi đã subscribe: gửi 'status' hiện tại rồi mỗi lần trạng thái đổi;
+        comment keep-alive mỗi HEARTBEAT_SECONDS. Đóng stream khi trạng thái đã là completed/failed.
+        """
+        try:
+            yield "retry: 3000\n\n"
+            yield PaymentEventService._format({'transaction_id': transaction_id, 'status': initial_status})
+            if initial_status in FINAL_PAYMENT_STATUSES:
+                return
+            while True:
+                event = PaymentEventService.wait(q, HEARTBEAT_SECONDS)
+                if event is None:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield PaymentEventService._format(event)
+                # status None: giao dịch đã bị hủy (payment bị xóa)
+                if event.get('status') in FINAL_PAYMENT_STATUSES or event.get('status') is None:
+                    return
+        finally:
+            PaymentEventService.unsubscribe(transaction_id, q)
+
+    @staticmethod
+    def _format(data):
+        return f"event: status\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
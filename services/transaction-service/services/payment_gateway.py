@@ -0,0 +1,236 @@
+from abc import ABC, abstractmethod
+from requests.adapters import HTTPAdapter
+import hmac
+import hashlib
+import os
+import random
+import threading
+import time
+import uuid
+import logging
+import requests
+
+logger = logging.getLogger(__name__)
+
+# Mặc định là endpoint / khóa sandbox công khai của MoMo; môi trường thật phải đặt qua biến môi trường.
+# Trỏ MOMO_ENDPOINT tới `flask payment-gateway-fake` để chạy thử không cần MoMo.
+MOMO_ENDPOINT = os.environ.get('MOMO_ENDPOINT', 'https://test-payment.momo.vn/v2/gateway/api/create')
+MOMO_PARTNER_CODE = os.environ.get('MOMO_PARTNER_CODE', 'MOMO')
+MOMO_ACCESS_KEY = os.environ.get('MOMO_ACCESS_KEY', 'F8BBA842ECF85')
+MOMO_SECRET_KEY = os.environ.get('MOMO_SECRET_KEY', 'K951B6PE1waDMi640xX08PD3vg6EkVlz')
+
+GATEWAY_CONNECT_TIMEOUT = float(os.environ.get('PAYMENT_GATEWAY_CONNECT_TIMEOUT', 3))
+GATEWAY_READ_TIMEOUT = float(os.environ.get('PAYMENT_GATEWAY_READ_TIMEOUT', 10))
+GATEWAY_MAX_RETRIES = int(os.environ.get('PAYMENT_GATEWAY_MAX_RETRIES', 2))  # số lần thử lại, ngoài lần đầu
+GATEWAY_BACKOFF_BASE = 0.3  # giây; 0.3, 0.6, 1.2, ...
+GATEWAY_POOL_SIZE = int(os.environ.get('PAYMENT_GATEWAY_POOL_SIZE', 10))
+
+# Ngưỡng (giây) của histogram độ trễ gọi cổng thanh toán
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+# Chữ ký yêu cầu tạo thanh toán và chữ ký IPN của MoMo (API v2): các trường theo đúng thứ tự này
+MOMO_CREATE_SIGNATURE_FIELDS = (
+    'amount', 'extraData', 'ipnUrl', 'orderId', 'orderInfo', 'partnerCode',
+    'redirectUrl', 'requestId', 'requestType',
+)
+MOMO_IPN_SIGNATURE_FIELDS = (
+    'amount', 'extraData', 'message', 'orderId', 'orderInfo', 'orderType', 'partnerCode',
+    'payType', 'requestId', 'responseTime', 'resultCode', 'transId',
+)
+
+
+def momo_signature(data, fields, access_key=MOMO_ACCESS_KEY, secret_key=MOMO_SECRET_KEY):
+    raw_signature = f"accessKey={access_key}&" + "&".join(f"{field}={data.get(field, '')}" for field in fields)
+    return hmac.new(secret_key.encode('utf-8'), raw_signature.encode('utf-8'), hashlib.sha256).hexdigest()
+
+
+class PaymentGatewayError(Exception):
+    """Cổng thanh toán từ chối yêu cầu hoặc không liên lạc được sau khi đã thử lại."""
+
+    def __init__(self, provider, message, retryable=False):
+        super().__init__(f"Lỗi {provider}: {message}")
+        self.provider = provider
+        self.retryable = retryable
+
+
+class _LatencyHistogram:
+    """Histogram độ trễ theo provider trong tiến trình (đếm tích lũy theo LATENCY_BUCKETS)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._data = {}
+
+    def observe(self, provider, seconds, outcome):
+        with self._lock:
+            stats = self._data.setdefault(provider, {
+                'buckets': [0] * (len(LATENCY_BUCKETS) + 1),
+                'count': 0,
+                'sum': 0.0,
+                'outcomes': {},
+            })
+            index = next((i for i, bound in enumerate(LATENCY_BUCKETS) if seconds <= bound), len(LATENCY_BUCKETS))
+            stats['buckets'][index] += 1
+            stats['count'] += 1
+            stats['sum'] += seconds
+            stats['outcomes'][outcome] = stats['outcomes'].get(outcome, 0) + 1
+
+    def snapshot(self):
+        with self._lock:
+            result = {}
+            for provider, stats in self._data.items():
+                cumulative, buckets = 0, {}
+                for bound, count in zip([str(b) for b in LATENCY_BUCKETS] + ['+Inf'], stats['buckets']):
+                    cumulative += count
+                    buckets[bound] = cumulative
+                result[provider] = {
+                    'count': stats['count'],
+                    'sum_seconds': round(stats['sum'], 4),
+                    'avg_seconds': round(stats['sum'] / stats['count'], 4) if stats['count'] else None,
+                    'buckets': buckets,
+                    'outcomes': dict(stats['outcomes']),
+                }
+            return result
+
+
+latency_histogram = _LatencyHistogram()
+
+
+class PaymentGatewayClient(ABC):
+    """
+    Client chung cho các cổng thanh toán.
+    - Một requests.Session dùng chung cho mỗi provider (giữ kết nối keep-alive / TLS).
+    - Timeout (connect, read) tường minh cho mọi request.
+    - Thử lại có giới hạn (GATEWAY_MAX_RETRIES, backoff) khi lỗi mạng / timeout / HTTP 5xx; payload
+      giữ nguyên giữa các lần thử (cùng requestId) để phía cổng nhận ra bản gửi lại.
+    - Ghi độ trễ mỗi lần gọi vào histogram theo provider (GET /internal/payment-gateway/metrics).
+    Lớp con cài đặt create_payment().
+    """
+    provider = None
+
+    def __init__(self, timeout=None, max_retries=None):
+        self.timeout = timeout or (GATEWAY_CONNECT_TIMEOUT, GATEWAY_READ_TIMEOUT)
+        self.max_retries = GATEWAY_MAX_RETRIES if max_retries is None else max_retries
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=GATEWAY_POOL_SIZE)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    @abstractmethod
+    def create_payment(self, order_id, amount, order_info, return_url, notify_url):
+        """Trả về URL để chuyển người mua tới trang thanh toán."""
+
+    def _timed(self, outcome_of, fn):
+        started = time.perf_counter()
+        outcome = 'error'
+        try:
+            result = fn()
+            outcome = outcome_of(result)
+            return result
+        except Exception as e:
+            outcome = type(e).__name__
+            raise
+        finally:
+            latency_histogram.observe(self.provider, time.perf_counter() - started, outcome)
+
+    def _post_json(self, url, payload):
+        """POST JSON với timeout + thử lại. Trả về (status_code, body dict)."""
+        attempt = 0
+        while True:
+            try:
+                response = self._timed(
+                    lambda r: f"http_{r.status_code // 100}xx",
+                    lambda: self.session.post(url, json=payload, timeout=self.timeout)
+                )
+                if response.status_code < 500 or attempt >= self.max_retries:
+                    try:
+                        return response.status_code, response.json()
+                    except ValueError:
+                        raise PaymentGatewayError(self.provider, f"phản hồi không phải JSON (HTTP {response.status_code})")
+                reason = f"HTTP {response.status_code}"
+            except requests.exceptions.RequestException as e:
+                if attempt >= self.max_retries:
+                    raise PaymentGatewayError(self.provider, f"không liên lạc được cổng thanh toán: {e}", retryable=True)
+                reason = type(e).__name__
+            attempt += 1
+            delay = GATEWAY_BACKOFF_BASE * (2 ** (attempt - 1)) * random.uniform(0.8, 1.2)
+            logger.warning(f"{self.provider}: {reason}, thử lại lần {attempt}/{self.max_retries} sau {delay:.2f}s.")
+            time.sleep(delay)
+
+
+class MomoGateway(PaymentGatewayClient):
+    provider = 'momo'
+
+    def __init__(self, endpoint=MOMO_ENDPOINT, partner_code=MOMO_PARTNER_CODE,
+                 access_key=MOMO_ACCESS_KEY, secret_key=MOMO_SECRET_KEY, **kwargs):
+        super().__init__(**kwargs)
+        self.endpoint = endpoint
+        self.partner_code = partner_code
+        self.access_key = access_key
+        self.secret_key = secret_key
+
+    def create_payment(self, order_id, amount, order_info, return_url, notify_url):
+        data = {
+            "partnerCode": self.partner_code,
+            "orderId": f"{order_id}-{int(time.time())}",
+            # Sinh MỘT lần cho mỗi thanh toán; các lần thử lại gửi cùng requestId
+            "requestId": str(uuid.uuid4()),
+            "amount": str(int(amount)),
+            "orderInfo": order_info,
+            "redirectUrl": return_url,
+            "ipnUrl": notify_url,
+            "extraData": "",
+            "requestType": "captureWallet",
+        }
+        data["signature"] = momo_signature(data, MOMO_CREATE_SIGNATURE_FIELDS, self.access_key, self.secret_key)
+
+        status_code, result = self._post_json(self.endpoint, data)
+        logger.info(
+            f"MoMo create: orderId={data['orderId']} requestId={data['requestId']} "
+            f"HTTP {status_code} resultCode={result.get('resultCode')}"
+        )
+        if status_code == 200 and result.get("resultCode") == 0 and result.get("payUrl"):
+            return result["payUrl"]
+        raise PaymentGatewayError(
+            self.provider,
+            f"resultCode={result.get('resultCode')} message={result.get('message')} (HTTP {status_code})",
+            retryable=status_code >= 500
+        )
+
+    def verify_ipn_signature(self, data):
+        signature = data.get('signature')
+        if not signature:
+            return False
+        expected = momo_signature(data, MOMO_IPN_SIGNATURE_FIELDS, self.access_key, self.secret_key)
+        return hmac.compare_digest(expected, str(signature))
+
+
+class VietinbankMockGateway(PaymentGatewayClient):
+    """Cổng ngân hàng giả lập: trả về ngay URL kết quả thành công (chưa tích hợp ngân hàng thật)."""
+    provider = 'vietinbank'
+
+    def create_payment(self, order_id, amount, order_info, return_url, notify_url):
+        def build():
+            message = "Thanh toan Ngan hang Thanh cong (Mock)"
+            return f"{return_url}?resultCode=0&message={message}&orderId={order_id}-{int(time.time())}&amount={int(amount)}"
+        return self._timed(lambda _: 'ok', build)
+
+
+_gateways = {}
+_gateways_lock = threading.Lock()
+_GATEWAY_CLASSES = {
+    'e-wallet': MomoGateway,
+    'bank': VietinbankMockGateway,
+}
+
+
+def get_gateway(payment_method):
+    """Client dùng chung (một session/pool mỗi provider) theo phương thức thanh toán."""
+    with _gateways_lock:
+        gateway = _gateways.get(payment_method)
+        if gateway is None:
+            gateway_class = _GATEWAY_CLASSES.get(payment_method)
+            if gateway_class is None:
+                raise PaymentGatewayError(payment_method, "phương thức thanh toán không được hỗ trợ")
+            gateway = gateway_class()
+            _gateways[payment_method] = gateway
+        return gateway
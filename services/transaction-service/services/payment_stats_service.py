@@ -0,0 +1,118 @@
+from models.payment import Payment
+from models.transaction import Transaction
+from models.payment_daily_stat import PaymentDailyStat
+from app import db
+from sqlalchemy import func, Date
+from sqlalchemy.dialects import postgresql, sqlite
+from decimal import Decimal
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def _money(value):
+    """payment.amount / final_price là Float: đổi sang Decimal 2 chữ số trước khi cộng dồn."""
+    return Decimal(str(value or 0)).quantize(Decimal('0.01'))
+
+
+def _upsert():
+    dialect = sqlite if db.engine.dialect.name == 'sqlite' else postgresql
+    return dialect.insert(PaymentDailyStat)
+
+
+class PaymentStatsService:
+    """
+    Duy trì bảng payment_daily_stat theo kiểu cộng dồn: mỗi lần payment được tạo / đổi trạng thái /
+    bị xóa thì chuyển nó từ ô (ngày, trạng thái cũ) sang ô (ngày, trạng thái mới).
+    Caller gọi TRƯỚC khi commit để số liệu thay đổi cùng transaction với payment.
+    Dashboard chỉ đọc O(số ngày) dòng thay vì quét toàn bộ payment.
+    """
+
+    @staticmethod
+    def record(payment, old_status, new_status, final_price=None):
+        """old_status=None: payment mới tạo; new_status=None: payment bị xóa. Không commit."""
+        if old_status == new_status:
+            return
+        if payment.created_at is None:
+            db.session.flush([payment])
+        day = payment.created_at.date()
+        if final_price is None:
+            final_price = db.session.query(Transaction.final_price).filter(
+                Transaction.transaction_id == payment.transaction_id
+            ).scalar() or 0
+        amount = _money(payment.amount)
+        revenue = amount - _money(final_price)
+        if old_status:
+            PaymentStatsService._apply(day, old_status, -1, -amount, -revenue)
+        if new_status:
+            PaymentStatsService._apply(day, new_status, 1, amount, revenue)
+
+    @staticmethod
+    def set_status(payment, new_status, final_price=None):
+        """Đổi trạng thái payment và cập nhật bảng tổng hợp tương ứng (không commit)."""
+        old_status = payment.payment_status
+        payment.payment_status = new_status
+        PaymentStatsService.record(payment, old_status, new_status, final_price)
+
+    @staticmethod
+    def _apply(day, status, count, amount, revenue):
+        stmt = _upsert().values(
+            day=day, payment_status=status,
+            payment_count=count, amount_total=amount, revenue_total=revenue
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[PaymentDailyStat.day, PaymentDailyStat.payment_status],
+            set_={
+                'payment_count': PaymentDailyStat.payment_count + stmt.excluded.payment_count,
+                'amount_total': PaymentDailyStat.amount_total + stmt.excluded.amount_total,
+                'revenue_total': PaymentDailyStat.revenue_total + stmt.excluded.revenue_total,
+            }
+        )
+        db.session.execute(stmt)
+
+    @staticmethod
+    def rebuild():
+        """Dựng lại toàn bộ bảng tổng hợp từ payment (backfill / sửa lệch). Trả về số dòng đã tạo."""
+        day = func.date(Payment.created_at, type_=Date)
+        rows = db.session.query(
+            day.label('day'),
+            Payment.payment_status,
+            func.count(Payment.payment_id),
+            func.coalesce(func.sum(Payment.amount), 0),
+            func.coalesce(func.sum(Payment.amount - Transaction.final_price), 0)
+        ).join(
+            Transaction, Payment.transaction_id == Transaction.transaction_id
+        ).group_by(day, Payment.payment_status).all()
+        try:
+            PaymentDailyStat.query.delete()
+            for row_day, status, count, amount, revenue in rows:
+                db.session.add(PaymentDailyStat(
+                    day=row_day, payment_status=status,
+                    payment_count=count, amount_total=_money(amount), revenue_total=_money(revenue)
+                ))
+            db.session.commit()
+            logger.info(f"Đã dựng lại payment_daily_stat: {len(rows)} dòng.")
+            return len(rows)
+        except Exception:
+            db.session.rollback()
+            raise
+
+    @staticmethod
+    def totals_by_status():
+        """{payment_status: (count, amount_total, revenue_total)} trên toàn bộ các ngày."""
+        rows = db.session.query(
+            PaymentDailyStat.payment_status,
+            func.coalesce(func.sum(PaymentDailyStat.payment_count), 0),
+            func.coalesce(func.sum(PaymentDailyStat.amount_total), 0),
+            func.coalesce(func.sum(PaymentDailyStat.revenue_total), 0)
+        ).group_by(PaymentDailyStat.payment_status).all()
+        return {status: (count, amount, revenue) for status, count, amount, revenue in rows}
+
+    @staticmethod
+    def daily_amounts(status, since_day):
+        """[(day, amount_total)] của một trạng thái từ since_day, tăng dần theo ngày."""
+        return db.session.query(PaymentDailyStat.day, PaymentDailyStat.amount_total).filter(
+            PaymentDailyStat.payment_status == status,
+            PaymentDailyStat.day >= since_day,
+            PaymentDailyStat.payment_count > 0
+        ).order_by(PaymentDailyStat.day.asc()).all()
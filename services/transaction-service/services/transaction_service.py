@@ -3,20 +3,20 @@ from models.payment import Payment
 from models.fee import Fee
 from models.fee_config import FeeConfig
 from models.contract import Contract
+from services.payment_stats_service import PaymentStatsService
+from services.payment_event_service import PaymentEventService
+from services.payment_gateway import get_gateway
 from app import db
 from decimal import Decimal 
+import os
 import requests
-import time
-import hmac
-import hashlib
-import json
-import uuid
 import logging  
-from sqlalchemy import func, cast, Date
 from datetime import datetime, timezone, timedelta 
 
 logger = logging.getLogger(__name__)  
 
+NIFI_LISTING_UPDATE_URL = os.environ.get('NIFI_LISTING_UPDATE_URL')
+
 class TransactionService:
     @staticmethod
     def get_transaction_by_seller_id(seller_id):
@@ -175,7 +175,9 @@ class TransactionService:
             payment_status=payment_status
         )
         db.session.add(new_payment)
+        PaymentStatsService.record(new_payment, None, new_payment.payment_status, transaction.final_price)
         db.session.commit()
+        PaymentEventService.publish(transaction_id, new_payment.payment_status, transaction.transaction_status)
         return new_payment, "Thanh toán đã được khởi tạo thành công."
 
 
@@ -193,7 +195,7 @@ class TransactionService:
             
             transaction.transaction_status = 'paid'
             if payment:
-                payment.payment_status = 'completed'
+                PaymentStatsService.set_status(payment, 'completed', transaction.final_price)
             
             try:
                 fee_rate = Decimal('0.025') 
@@ -211,7 +213,7 @@ class TransactionService:
 
         elif new_status == 'failed':
             if payment:
-                payment.payment_status = 'failed' 
+                PaymentStatsService.set_status(payment, 'failed', transaction.final_price)
             message = "Thanh toán thất bại."
         
         elif new_status == 'pending': 
@@ -226,6 +228,8 @@ class TransactionService:
             message = f"Transaction status đã được cập nhật thành {new_status}."
 
         db.session.commit()
+        if payment and new_status in ('paid', 'failed'):
+            PaymentEventService.publish(transaction_id, payment.payment_status, transaction.transaction_status)
         return transaction, message
 
     @staticmethod
@@ -235,120 +239,70 @@ class TransactionService:
             payment = Payment.query.filter_by(transaction_id=transaction_id).first()
             if payment.payment_status in ['pending', 'completed']:
                 return False, "Không thể hủy giao dịch đã thanh toán." 
+            for p in Payment.query.filter_by(transaction_id=transaction_id).all():
+                PaymentStatsService.record(p, p.payment_status, None, transaction.final_price)
             Payment.query.filter_by(transaction_id=transaction_id).delete()
             Contract.query.filter_by(transaction_id=transaction_id).delete()
             Fee.query.filter_by(transaction_id=transaction_id).delete()
 
             db.session.delete(transaction)
             db.session.commit()
+            PaymentEventService.publish(transaction_id, None)  # payment đã bị xóa
             return True, "Giao dịch đã được hủy."
         return False, "Transaction không tìm thấy."
 
 
 
     @staticmethod
-    def call_momo_api(order_id, amount, order_info, return_url, notify_url):
-        endpoint = "https://test-payment.momo.vn/v2/gateway/api/create"
-        partnerCode = "MOMO"
-        accessKey = "F8BBA842ECF85"
-        secretKey = "K951B6PE1waDMi640xX08PD3vg6EkVlz"
-
-        requestId = str(uuid.uuid4())
-        orderId = f"{order_id}-{int(time.time())}"
-        extraData = ""
-        requestType = "captureWallet"   
-        amount_int = int(amount)
-        ipnUrl = notify_url
- 
-        raw_signature = (
-            f"accessKey={accessKey}"
-            f"&amount={amount_int}"
-            f"&extraData={extraData}"
-            f"&ipnUrl={ipnUrl}"
-            f"&orderId={orderId}"
-            f"&orderInfo={order_info}"
-            f"&partnerCode={partnerCode}"
-            f"&redirectUrl={return_url}"
-            f"&requestId={requestId}"
-            f"&requestType={requestType}"
-        )
+    def notify_listing_status_change(listing_id, new_status):
+        """Báo NiFi cập nhật trạng thái listing (best-effort: lỗi/timeout chỉ được log)."""
+        if not NIFI_LISTING_UPDATE_URL:
+            logger.error(f"NIFI_LISTING_UPDATE_URL chưa được cấu hình. Bỏ qua việc cập nhật listing {listing_id}.")
+            return 
 
-        signature = hmac.new(
-            secretKey.encode('utf-8'),
-            raw_signature.encode('utf-8'),
-            hashlib.sha256
-        ).hexdigest() 
-        data = {
-            "partnerCode": partnerCode,
-            "orderId": orderId,
-            "requestId": requestId,
-            "amount": str(int(amount)),
-            "orderInfo": order_info,
-            "redirectUrl": return_url,
-            "ipnUrl": ipnUrl,
-            "extraData": extraData,
-            "requestType": requestType,
-            "signature": signature
-        }
-
-        headers = {'Content-Type': 'application/json'} 
-        response = requests.post(endpoint, json=data, headers=headers)
         try:
-            result = response.json()
-        except Exception as e:
-            print("ERROR parsing JSON:", e)
-            print("Raw response text:", response.text)
-            raise 
-        print("\n--- MoMo API DEBUG ---")
-        print("Payload:", json.dumps(data, ensure_ascii=False, indent=2))
-        print("Raw signature:", raw_signature)
-        print("Signature:", signature)
-        print("Response:", json.dumps(result, ensure_ascii=False, indent=2))
-        print("----------------------\n")
-
-        if response.status_code == 200 and result.get("resultCode") == 0:
-            return result["payUrl"]
-        else:
-            raise Exception(f"🛑 Lỗi MoMo: {json.dumps(result, ensure_ascii=False)}, code: {response.status_code}, Raw signature: {raw_signature}, Signature: {signature}")
+            payload = {
+                "listing_id": listing_id,
+                "status": new_status
+            }
+
+            requests.post(
+                NIFI_LISTING_UPDATE_URL, 
+                json=payload, 
+                timeout=0.5  
+            )
+
+            logger.info(f"Đã gửi yêu cầu cập nhật (status: {new_status}) cho listing {listing_id} đến NiFi thành công.")
+
+        except requests.exceptions.Timeout:
+            logger.info(f"Yêu cầu đến NiFi cho listing {listing_id} bị timeout (Chấp nhận được).")
+        except requests.exceptions.RequestException as e:
+            logger.error(f"Lỗi khi gửi yêu cầu đến NiFi cho listing {listing_id}: {e}") 
+
+    @staticmethod
+    def call_momo_api(order_id, amount, order_info, return_url, notify_url):
+        """Tạo thanh toán MoMo, trả về payUrl. Lỗi -> PaymentGatewayError."""
+        return get_gateway('e-wallet').create_payment(order_id, amount, order_info, return_url, notify_url)
+
     @staticmethod
     def call_vietinbank_api(order_id, amount, order_info, return_url, notify_url): 
-        resultCode = 0
-        message = "Thanh toan Ngan hang Thanh cong (Mock)"  
-        orderId = f"{order_id}-{int(time.time())}"  
-        amount_int = int(amount)
-        fake_success_url = f"{return_url}?resultCode={resultCode}&message={message}&orderId={orderId}&amount={amount_int}"
-        return fake_success_url 
+        return get_gateway('bank').create_payment(order_id, amount, order_info, return_url, notify_url)
     
     @staticmethod
     def get_kpi_statistics():
         """
         Tính toán các chỉ số KPI chính (Tổng doanh thu, Tổng giao dịch, Chờ duyệt).
+        Đọc từ bảng tổng hợp payment_daily_stat (O(số ngày)) thay vì quét toàn bộ payment.
         """
         try:
-            total_revenue = db.session.query(
-            func.coalesce(func.sum(Payment.amount - Transaction.final_price), 0)
-            ).join(
-                Transaction, Payment.transaction_id == Transaction.transaction_id
-            ).filter(
-                Payment.payment_status == 'completed'
-            ).scalar()
-
-            total_transactions = db.session.query(
-                func.count(Payment.payment_id)
-            ).filter(
-                Payment.payment_status == 'completed'
-            ).scalar()
-
-            pending_payments = db.session.query(
-                func.count(Payment.payment_id)
-            ).filter(
-                Payment.payment_status == 'pending'
-            ).scalar()
+            totals = PaymentStatsService.totals_by_status()
+            completed_count, _, completed_revenue = totals.get('completed', (0, 0, 0))
+            pending_count = totals.get('pending', (0, 0, 0))[0]
 
             return {
-                "total_revenue": float(total_revenue),
-                "total_transactions": total_transactions,
-                "pending_payments": pending_payments
+                "total_revenue": float(completed_revenue),
+                "total_transactions": int(completed_count),
+                "pending_payments": int(pending_count)
             }, None
 
         except Exception as e:
@@ -359,26 +313,16 @@ class TransactionService:
     @staticmethod
     def get_revenue_trend():
         """
-        Lấy xu hướng doanh thu (đã 'completed') trong 30 ngày gần nhất.
+        Lấy xu hướng doanh thu (đã 'completed') trong 30 ngày gần nhất, đọc từ payment_daily_stat.
         """
         try:
-            thirty_days_ago = datetime.now(timezone.utc) - timedelta(days=30)
-
-            trend_data = db.session.query(
-                cast(Payment.created_at, Date).label('date'),
-                func.sum(Payment.amount).label('total')
-            ).filter(
-                Payment.payment_status == 'completed',
-                Payment.created_at >= thirty_days_ago
-            ).group_by(
-                cast(Payment.created_at, Date)
-            ).order_by(
-                cast(Payment.created_at, Date).asc()
-            ).all()
+            thirty_days_ago = (datetime.now(timezone.utc) - timedelta(days=30)).date()
+
+            trend_data = PaymentStatsService.daily_amounts('completed', thirty_days_ago)
 
             trend_list = [
-                {"date": row.date.isoformat(), "total": float(row.total)}
-                for row in trend_data
+                {"date": day.isoformat(), "total": float(total)}
+                for day, total in trend_data
             ]
 
             return trend_list, None
@@ -0,0 +1,97 @@
+from requests.adapters import HTTPAdapter
+import os
+import threading
+import time
+import logging
+import requests
+
+logger = logging.getLogger(__name__)
+
+USER_SERVICE_URL = os.environ.get('USER_SERVICE_URL', 'http://user-service:5000')
+INTERNAL_API_KEY = os.environ.get('INTERNAL_API_KEY')
+REQUEST_TIMEOUT = (1, 3)  # (connect, read)
+USER_INFO_CACHE_TTL = int(os.getenv('USER_INFO_CACHE_TTL', 60))  # giây
+# User không tồn tại / lỗi: cache ngắn để không gọi lại liên tục nhưng sớm thấy dữ liệu mới
+USER_INFO_NEGATIVE_TTL = 5
+USER_INFO_CACHE_MAX_ENTRIES = int(os.getenv('USER_INFO_CACHE_MAX_ENTRIES', 10000))
+USER_INFO_BATCH_SIZE = 1000  # = MAX_BULK_USERS của user-service
+
+_session = requests.Session()
+_session.mount('http://', HTTPAdapter(pool_connections=1, pool_maxsize=4))
+
+_MISSING = object()
+
+
+class UserInfoService:
+    """
+    Tra thông tin user (user_id, username) từ user-service.
+    - Cache TTL theo user_id trong tiến trình (USER_INFO_CACHE_TTL).
+    - get_many(): gom các id chưa có trong cache rồi gọi MỘT request POST /internal/users/info
+      (mỗi lô tối đa USER_INFO_BATCH_SIZE id) thay vì một GET /api/info/<id> cho từng id.
+    """
+    _cache = {}
+    _lock = threading.Lock()
+
+    @staticmethod
+    def get(user_id):
+        if not user_id:
+            return None
+        return UserInfoService.get_many([user_id]).get(user_id)
+
+    @staticmethod
+    def get_many(user_ids):
+        """Trả về dict {user_id: {'user_id', 'username'} hoặc None}."""
+        results = {}
+        missing = []
+        for user_id in dict.fromkeys(u for u in user_ids if u):
+            cached = UserInfoService._cache_get(user_id)
+            if cached is _MISSING:
+                missing.append(user_id)
+            else:
+                results[user_id] = cached
+        for start in range(0, len(missing), USER_INFO_BATCH_SIZE):
+            chunk = missing[start:start + USER_INFO_BATCH_SIZE]
+            found = UserInfoService._fetch(chunk)
+            for user_id in chunk:
+                info = found.get(user_id)
+                UserInfoService._cache_set(user_id, info)
+                results[user_id] = info
+        return results
+
+    @staticmethod
+    def _fetch(user_ids):
+        url = f"{USER_SERVICE_URL}/internal/users/info"
+        try:
+            response = _session.post(
+                url,
+                json={'user_ids': user_ids},
+                headers={'X-Internal-Api-Key': INTERNAL_API_KEY},
+                timeout=REQUEST_TIMEOUT
+            )
+            if response.status_code == 200:
+                return {info['user_id']: info for info in response.json() if info}
+            logger.warning(f"User Service returned status {response.status_code} for {len(user_ids)} user IDs at {url}")
+        except (requests.exceptions.RequestException, ValueError) as e:
+            logger.error(f"Failed to connect to User Service at {url} for user info: {e}")
+        return {}
+
+    @staticmethod
+    def _cache_get(user_id):
+        with UserInfoService._lock:
+            entry = UserInfoService._cache.get(user_id)
+            if entry is None:
+                return _MISSING
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del UserInfoService._cache[user_id]
+                return _MISSING
+            return value
+
+    @staticmethod
+    def _cache_set(user_id, value):
+        ttl = USER_INFO_CACHE_TTL if value is not None else USER_INFO_NEGATIVE_TTL
+        with UserInfoService._lock:
+            if len(UserInfoService._cache) >= USER_INFO_CACHE_MAX_ENTRIES:
+                # Đơn giản: bỏ bản ghi cũ nhất theo thứ tự chèn
+                UserInfoService._cache.pop(next(iter(UserInfoService._cache)))
+            UserInfoService._cache[user_id] = (time.monotonic() + ttl, value)
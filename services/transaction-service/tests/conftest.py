@@ -0,0 +1,32 @@
+import os
+import sys
+import threading
+
+import pytest
+from werkzeug.serving import make_server
+
+SERVICE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SERVICE_DIR)
+
+
+@pytest.fixture
+def serve():
+    """Chạy một WSGI app trên thread riêng (127.0.0.1, port ngẫu nhiên); trả về base URL."""
+    servers = []
+
+    def start(wsgi_app):
+        server = make_server('127.0.0.1', 0, wsgi_app, threaded=True)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return f"http://127.0.0.1:{server.server_port}"
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+@pytest.fixture(autouse=True)
+def fast_backoff(monkeypatch):
+    import services.payment_gateway as payment_gateway
+    monkeypatch.setattr(payment_gateway, 'GATEWAY_BACKOFF_BASE', 0.01)
@@ -0,0 +1,88 @@
+import socket
+
+import pytest
+from werkzeug.wrappers import Response
+
+from services.fake_payment_gateway import create_fake_gateway_app
+from services.payment_gateway import (
+    MomoGateway, PaymentGatewayError, MOMO_CREATE_SIGNATURE_FIELDS, momo_signature
+)
+
+CREATE_PATH = '/v2/gateway/api/create'
+ACCESS_KEY = 'test-access'
+SECRET_KEY = 'test-secret'
+
+
+def _gateway(endpoint, **kwargs):
+    kwargs.setdefault('timeout', (0.5, 0.5))
+    return MomoGateway(endpoint=endpoint, access_key=ACCESS_KEY, secret_key=SECRET_KEY, **kwargs)
+
+
+def _pay(gateway):
+    return gateway.create_payment(42, 150000, 'Thanh toan don 42', 'http://shop/return', 'http://shop/ipn')
+
+
+def _fake(serve, **kwargs):
+    fake = create_fake_gateway_app(access_key=ACCESS_KEY, secret_key=SECRET_KEY, **kwargs)
+    return fake, serve(fake) + CREATE_PATH
+
+
+def test_create_payment_returns_pay_url(serve):
+    fake, endpoint = _fake(serve)
+    pay_url = _pay(_gateway(endpoint))
+    assert pay_url.startswith('http://shop/return?resultCode=0')
+    data = fake.received[0]
+    assert data['signature'] == momo_signature(data, MOMO_CREATE_SIGNATURE_FIELDS, ACCESS_KEY, SECRET_KEY)
+
+
+def test_5xx_is_retried_with_same_request_id_and_signature(serve):
+    fake, endpoint = _fake(serve, fail_first=2)
+    assert _pay(_gateway(endpoint, max_retries=2))
+    assert len(fake.received) == 3
+    assert len({d['requestId'] for d in fake.received}) == 1
+    assert len({d['signature'] for d in fake.received}) == 1
+
+
+def test_5xx_after_all_retries_raises_retryable(serve):
+    fake, endpoint = _fake(serve, fail_first=10)
+    with pytest.raises(PaymentGatewayError) as e:
+        _pay(_gateway(endpoint, max_retries=1))
+    assert e.value.retryable
+    assert len(fake.received) == 2
+
+
+def test_read_timeout_is_retried_then_raises(serve):
+    fake, endpoint = _fake(serve, delay=1.0)
+    with pytest.raises(PaymentGatewayError) as e:
+        _pay(_gateway(endpoint, timeout=(0.5, 0.2), max_retries=1))
+    assert e.value.retryable and 'không liên lạc được' in str(e.value)
+    assert len(fake.received) == 2
+
+
+def test_connect_failure_raises_retryable():
+    # Port vừa được giải phóng: không có gì lắng nghe -> lỗi kết nối ngay
+    with socket.socket() as probe:
+        probe.bind(('127.0.0.1', 0))
+        free_port = probe.getsockname()[1]
+    with pytest.raises(PaymentGatewayError) as e:
+        _pay(_gateway(f"http://127.0.0.1:{free_port}{CREATE_PATH}", max_retries=1))
+    assert e.value.retryable
+
+
+def test_non_json_response_raises(serve):
+    def html_error(environ, start_response):
+        return Response('<html>Bad Gateway</html>', status=200, content_type='text/html')(environ, start_response)
+
+    endpoint = serve(html_error) + CREATE_PATH
+    with pytest.raises(PaymentGatewayError) as e:
+        _pay(_gateway(endpoint, max_retries=0))
+    assert 'không phải JSON' in str(e.value)
+
+
+def test_rejected_signature_is_not_retried(serve):
+    fake = create_fake_gateway_app(access_key=ACCESS_KEY, secret_key='other-secret')
+    endpoint = serve(fake) + CREATE_PATH
+    with pytest.raises(PaymentGatewayError) as e:
+        _pay(_gateway(endpoint, max_retries=2))
+    assert not e.value.retryable and 'resultCode=11' in str(e.value)
+    assert len(fake.received) == 1
@@ -8,6 +8,8 @@ import logging
 
 internal_bp = Blueprint('internal_api', __name__, url_prefix='/internal')  
 logger = logging.getLogger(__name__)  
+
+MAX_BULK_USERS = 1000
  
 def internal_api_key_required():
     def wrapper(fn):
@@ -47,6 +49,27 @@ def internal_get_all_users():
             
     return jsonify([serialize_user(u) for u in users]), 200
 
+@internal_bp.route("/users/info", methods=["POST"])
+@internal_api_key_required()
+def internal_get_users_info():
+    """
+    Tra username của nhiều user trong một request (tối đa MAX_BULK_USERS ID).
+    Body: {"user_ids": [1, 2, 3]}. Trả về list serialize_info, chỉ gồm các user tồn tại.
+    """
+    data = request.get_json(silent=True) or {}
+    user_ids = data.get('user_ids')
+    if not isinstance(user_ids, list):
+        return jsonify(error="Missing 'user_ids' list in request body"), 400
+    try:
+        user_ids = {int(user_id) for user_id in user_ids}
+    except (TypeError, ValueError):
+        return jsonify(error="'user_ids' must be a list of integers"), 400
+    if len(user_ids) > MAX_BULK_USERS:
+        return jsonify(error=f"Too many user_ids (max {MAX_BULK_USERS})"), 413
+
+    users = UserLogic.get_users_by_ids(list(user_ids))
+    return jsonify([serialize_info(u) for u in users]), 200
+
 @internal_bp.route("/users/<int:user_id>/bank", methods = ["GET"])
 @internal_api_key_required()
 def internal_get_account_bank(user_id):
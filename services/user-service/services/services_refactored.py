@@ -86,6 +86,13 @@ class UserService:
     def get_user_by_id(user_id):
         return User.query.get(user_id)
 
+    @staticmethod
+    def get_users_by_ids(user_ids):
+        """Lấy nhiều user trong một truy vấn (dùng cho các service khác tra username hàng loạt)."""
+        if not user_ids:
+            return []
+        return User.query.filter(User.user_id.in_(user_ids)).all()
+
     @staticmethod
     def get_all_users():
         return User.query.all()